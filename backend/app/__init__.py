@@ -90,6 +90,19 @@ def create_app(config_name=None):
         app.logger.error(f'Internal error: {error}')
         return jsonify({'error': 'Internal Server Error', 'message': 'An unexpected error occurred'}), 500
     
+    @app.errorhandler(503)
+    def service_unavailable(error):
+        from flask import jsonify
+        response = jsonify({'error': 'Service Unavailable', 'message': error.description})
+        if getattr(error, 'retry_after', None) is not None:
+            response.headers['Retry-After'] = str(error.retry_after)
+        return response, 503
+    
+    @app.errorhandler(504)
+    def gateway_timeout(error):
+        from flask import jsonify
+        return jsonify({'error': 'Gateway Timeout', 'message': error.description}), 504
+    
     @app.errorhandler(Exception)
     def handle_exception(error):
         from flask import jsonify
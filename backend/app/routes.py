@@ -4,26 +4,41 @@ This module defines all the HTTP endpoints for the chatbot backend,
 including conversation handling, session management, and log downloads.
 """
 
+import asyncio
+import itertools
 import json
 import os
-import tempfile
 from datetime import datetime
 
 from flask import (
     Blueprint,
+    Response,
     abort,
-    after_this_request,
+    has_request_context,
     jsonify,
     render_template,
     request,
     send_from_directory,
     session,
 )
+from werkzeug.exceptions import ServiceUnavailable
 
 from auth.authmanager import requires_auth
+from chatbot.async_chatbot import AsyncChatbot
+from chatbot.bulkhead import AdmissionRejected, bulkhead
 from chatbot.chatbot import Chatbot
+from chatbot.circuit_breaker import circuit_breaker
+from chatbot.coalescer import request_coalescer
+from chatbot.deadline import Deadline, DeadlineExceeded
+from chatbot.fallback import fallback_responder
+from chatbot.hedging import request_hedger
+from chatbot.response_cache import response_cache
+from chatbot.semantic_cache import semantic_cache
+from chatbot.token_budget import token_budget
 from logger.custom_logger import Logger
 from logger.session_logger import session_logger
+from logger.session_store import iter_export_csv
+from logger.write_behind import log_writer
 from validators import InputValidator
 from config import current_config
 
@@ -31,6 +46,171 @@ from config import current_config
 main_bp = Blueprint("main_bp", __name__)
 
 
+def _parse_chat_request(deadline=None):
+    """Parse and validate the JSON body of a chat request.
+    
+    Args:
+        deadline (Deadline, optional): Request deadline, checked once
+            validation is done.
+    
+    Returns:
+        tuple: (user_message, chatbot_type, risk_score, conversation_context).
+        
+    Raises:
+        400: Invalid JSON or missing required parameters.
+        504: Deadline passed during validation.
+    """
+    try:
+        data = request.get_json()
+    except Exception:
+        abort(400, description="Invalid JSON payload.")
+
+    user_message = data.get("message")
+    if user_message is None:
+        abort(400, description="Missing 'message' parameter.")
+    
+    # Sanitize user message
+    user_message = InputValidator.sanitize_string(user_message)
+
+    chatbot_type = data.get("chatbot_type")
+    if chatbot_type is None:
+        abort(400, description="Missing 'chatbot_type' parameter.")
+
+    # Validate chatbot type
+    if not InputValidator.validate_chatbot_type(chatbot_type):
+        abort(400, description="Invalid chatbot type provided.")
+
+    # Validate and convert risk_score
+    risk_score = InputValidator.validate_risk_score(data.get("risk_score"))
+    
+    # Validate and sanitize conversation context
+    conversation_context = InputValidator.validate_conversation_context(
+        data.get("conversation_context", {})
+    )
+
+    if deadline is not None and deadline.expired:
+        abort(504, description="The request took too long to process. Please try again.")
+
+    return user_message, chatbot_type, risk_score, conversation_context
+
+
+def _parse_export_filters():
+    """Parse the optional export filters of a session download request.
+    
+    Query parameters: chatbot_type, since and until (YYYY-MM-DD or
+    YYYY-MM-DD HH:MM:SS; a date-only until covers the whole day) and
+    min_risk_score.
+    
+    Returns:
+        dict: Keyword arguments for export_all_sessions_to_csv.
+        
+    Raises:
+        400: Invalid filter value.
+    """
+    filters = {}
+    
+    chatbot_type = request.args.get("chatbot_type")
+    if chatbot_type:
+        if not InputValidator.validate_chatbot_type(chatbot_type):
+            abort(400, description="Invalid chatbot type provided.")
+        filters["chatbot_type"] = chatbot_type
+    
+    date_format = current_config().LOG_DATE_FORMAT
+    for name in ("since", "until"):
+        value = request.args.get(name)
+        if not value:
+            continue
+        try:
+            moment = datetime.strptime(value, date_format)
+        except ValueError:
+            try:
+                moment = datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                abort(400, description=f"'{name}' must be YYYY-MM-DD or YYYY-MM-DD HH:MM:SS.")
+            if name == "until":
+                moment = moment.replace(hour=23, minute=59, second=59)
+        filters[name] = moment.strftime(date_format)
+    
+    min_risk_score = request.args.get("min_risk_score")
+    if min_risk_score:
+        try:
+            filters["min_risk_score"] = int(min_risk_score)
+        except ValueError:
+            abort(400, description="'min_risk_score' must be an integer.")
+    
+    return filters
+
+
+def _stream_sessions_csv(download_name):
+    """Stream the all-sessions export as a CSV attachment.
+    
+    Rows come from a streaming merge of the session logs and are sent as
+    they are produced, so the first bytes go out without waiting for the
+    whole export and nothing is buffered in memory or a temporary file.
+    
+    Raises:
+        400: Invalid filter value.
+        404: No session data found.
+    """
+    rows = session_logger.iter_all_sessions(**_parse_export_filters())
+    first = next(rows, None)
+    if first is None:
+        abort(404, description="No session data found")
+    
+    return Response(
+        iter_export_csv(itertools.chain([first], rows)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={download_name}"},
+    )
+
+
+def _get_session_id(user_ip):
+    """Return the current chat session ID, creating a new session if needed.
+    
+    A session that was ended in the meantime (e.g. by the idle reaper) is
+    replaced by a new one, so its turns are not dropped.
+    """
+    config = current_config()
+    if "session_id" not in session or not session_logger.is_active(session["session_id"]):
+        session["session_id"] = session_logger.create_session(user_ip)
+        session.permanent = config.SESSION_PERMANENT
+    return session["session_id"]
+
+
+def _log_session_turn(session_id, chatbot_type, user_message, bot_response, user_ip,
+                      risk_score=None, conversation_context=None):
+    """Log a chat turn to its session and return the ID it was logged under.
+    
+    If the session was ended after it was resolved (e.g. by the idle reaper
+    while the reply was generated), the turn is logged to a new session
+    instead of being dropped, and the client's session cookie moves to it
+    when the response headers have not been sent yet.
+    """
+    turn = (chatbot_type, user_message, bot_response, user_ip, risk_score, conversation_context)
+    if session_logger.log_conversation(session_id, *turn):
+        return session_id
+
+    session_id = session_logger.create_session(user_ip)
+    session_logger.log_conversation(session_id, *turn)
+    if has_request_context():
+        session["session_id"] = session_id
+        session.permanent = current_config().SESSION_PERMANENT
+    return session_id
+
+
+def _elapsed_ms(deadline):
+    """Milliseconds spent on the request so far, for the conversation log."""
+    return round(deadline.elapsed() * 1000)
+
+
+def _sse_event(data, event=None):
+    """Format a dict as a Server-Sent Events message."""
+    message = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    if event:
+        message = f"event: {event}\n" + message
+    return message
+
+
 @main_bp.route("/", methods=["GET", "POST"])
 def home():
     """Handle main chatbot interaction endpoint.
@@ -49,43 +229,26 @@ def home():
         
     Raises:
         400: Invalid JSON or missing required parameters.
+        503: Upstream API unavailable or overloaded.
+        504: REQUEST_TIMEOUT passed before a response was ready.
     """
     if request.method == "POST":
-        try:
-            data = request.get_json()
-        except Exception:
-            abort(400, description="Invalid JSON payload.")
-
-        user_message = data.get("message")
-        if user_message is None:
-            abort(400, description="Missing 'message' parameter.")
-        
-        # Sanitize user message
-        user_message = InputValidator.sanitize_string(user_message)
-
-        chatbot_type = data.get("chatbot_type")
-        if chatbot_type is None:
-            abort(400, description="Missing 'chatbot_type' parameter.")
-
-        # Validate chatbot type
-        if not InputValidator.validate_chatbot_type(chatbot_type):
-            abort(400, description="Invalid chatbot type provided.")
-
-        # Validate and convert risk_score
-        risk_score = InputValidator.validate_risk_score(data.get("risk_score"))
-        
-        # Validate and sanitize conversation context
-        conversation_context = InputValidator.validate_conversation_context(
-            data.get("conversation_context", {})
-        )
+        # Hard upper bound on how long this worker spends on the turn
+        deadline = Deadline(current_config().REQUEST_TIMEOUT)
+        user_message, chatbot_type, risk_score, conversation_context = _parse_chat_request(deadline)
 
         # Get chatbot response (passing risk_score if available)
         try:
             bot_response = Chatbot.get_response(
-                chatbot_type, user_message, risk_score, None, conversation_context
+                chatbot_type, user_message, risk_score, None, conversation_context, deadline=deadline
             )
         except ValueError as e:
             abort(400, description=str(e))
+        except DeadlineExceeded as e:
+            abort(504, description=str(e))
+        except AdmissionRejected as e:
+            # Shed load quickly and tell the client when to retry
+            raise ServiceUnavailable(description=str(e), retry_after=e.retry_after)
         except RuntimeError as e:
             abort(503, description=str(e))
         except Exception as e:
@@ -96,28 +259,169 @@ def home():
                 abort(500, description="An unexpected error occurred")
 
         # Get or create session
-        config = current_config()
         user_ip = request.remote_addr or "Unknown"
-        if "session_id" not in session:
-            session["session_id"] = session_logger.create_session(user_ip)
-            session.permanent = config.SESSION_PERMANENT
+        session_id = _get_session_id(user_ip)
         
         # Log to both traditional logger and session logger
-        Logger.log_conversation(chatbot_type, user_message, bot_response, user_ip)
-        session_logger.log_conversation(
-            session["session_id"], chatbot_type, user_message, bot_response, user_ip,
+        Logger.log_conversation(
+            chatbot_type, user_message, bot_response, user_ip, elapsed_ms=_elapsed_ms(deadline)
+        )
+        session_id = _log_session_turn(
+            session_id, chatbot_type, user_message, bot_response, user_ip,
             risk_score, conversation_context
         )
 
         return jsonify({
             "bot_response": bot_response,
-            "session_id": session["session_id"]
+            "session_id": session_id
         })
 
     # GET request response
     return jsonify({"message": "Hello world! from Flask backend"})
 
 
+@main_bp.route("/chat/async", methods=["POST"])
+async def chat_async():
+    """Async variant of the ``/`` chat endpoint built on AsyncOpenAI.
+    
+    Under the ASGI entry point (``asgi.py``) this view also serves ``POST /``
+    and runs natively on the event loop; disk logging is moved to worker
+    threads so the loop is never blocked. Under WSGI it still works, but
+    Flask runs it to completion on its own event loop on the request thread,
+    so upstream connections are opened per request instead of pooled.
+    
+    Expected POST data:
+        Same as ``/``.
+        
+    Returns:
+        JSON response with bot_response and session_id.
+        
+    Raises:
+        400: Invalid JSON or missing required parameters.
+        503: Upstream API unavailable.
+        504: REQUEST_TIMEOUT passed before a response was ready.
+    """
+    deadline = Deadline(current_config().REQUEST_TIMEOUT)
+    user_message, chatbot_type, risk_score, conversation_context = _parse_chat_request(deadline)
+
+    try:
+        bot_response = await AsyncChatbot.get_response(
+            chatbot_type, user_message, risk_score, None, conversation_context, deadline=deadline
+        )
+    except ValueError as e:
+        abort(400, description=str(e))
+    except DeadlineExceeded as e:
+        abort(504, description=str(e))
+    except AdmissionRejected as e:
+        # Shed load quickly and tell the client when to retry
+        raise ServiceUnavailable(description=str(e), retry_after=e.retry_after)
+    except RuntimeError as e:
+        abort(503, description=str(e))
+    except Exception as e:
+        config = current_config()
+        if config.DEBUG:
+            abort(500, description=f"Unexpected error: {str(e)}")
+        else:
+            abort(500, description="An unexpected error occurred")
+
+    # Session files and logs are written off the event loop
+    user_ip = request.remote_addr or "Unknown"
+    session_id = await asyncio.to_thread(_get_session_id, user_ip)
+    
+    await asyncio.to_thread(
+        Logger.log_conversation, chatbot_type, user_message, bot_response, user_ip,
+        elapsed_ms=_elapsed_ms(deadline)
+    )
+    session_id = await asyncio.to_thread(
+        _log_session_turn,
+        session_id, chatbot_type, user_message, bot_response, user_ip,
+        risk_score, conversation_context
+    )
+
+    return jsonify({
+        "bot_response": bot_response,
+        "session_id": session_id
+    })
+
+
+@main_bp.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Stream the chatbot response as Server-Sent Events.
+    
+    Accepts the same POST data as ``/``. Emits one ``data`` event per text
+    chunk (``{"delta": ...}``), then a ``done`` event with the assembled
+    ``bot_response`` and ``session_id``. Upstream failures after the stream
+    has started are reported as an ``error`` event.
+    
+    Returns:
+        text/event-stream response.
+        
+    Raises:
+        400: Invalid JSON or missing required parameters.
+        503: Upstream API unavailable before streaming started.
+        504: RESPONSE_TIMEOUT passed before streaming started.
+    """
+    # Streams get the longer response budget rather than the request one
+    deadline = Deadline(current_config().RESPONSE_TIMEOUT)
+    user_message, chatbot_type, risk_score, conversation_context = _parse_chat_request(deadline)
+
+    # Session must be resolved before the upstream stream (and its bulkhead slot) is opened
+    user_ip = request.remote_addr or "Unknown"
+    session_id = _get_session_id(user_ip)
+
+    try:
+        chunks = Chatbot.stream_response(
+            chatbot_type, user_message, risk_score, None, conversation_context, deadline=deadline
+        )
+    except ValueError as e:
+        abort(400, description=str(e))
+    except DeadlineExceeded as e:
+        abort(504, description=str(e))
+    except AdmissionRejected as e:
+        # Shed load quickly and tell the client when to retry
+        raise ServiceUnavailable(description=str(e), retry_after=e.retry_after)
+    except RuntimeError as e:
+        abort(503, description=str(e))
+    except Exception as e:
+        config = current_config()
+        if config.DEBUG:
+            abort(500, description=f"Unexpected error: {str(e)}")
+        else:
+            abort(500, description="An unexpected error occurred")
+
+    def generate():
+        parts = []
+        try:
+            for delta in chunks:
+                parts.append(delta)
+                yield _sse_event({"delta": delta})
+        except RuntimeError as e:
+            yield _sse_event({"error": str(e)}, event="error")
+            return
+
+        # Log the assembled response once generation is complete
+        bot_response = "".join(parts).strip()
+        Logger.log_conversation(
+            chatbot_type, user_message, bot_response, user_ip, elapsed_ms=_elapsed_ms(deadline)
+        )
+        logged_session_id = _log_session_turn(
+            session_id, chatbot_type, user_message, bot_response, user_ip,
+            risk_score, conversation_context
+        )
+        yield _sse_event({"bot_response": bot_response, "session_id": logged_session_id}, event="done")
+
+    response = Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Frees the upstream stream and bulkhead slot even if the body is never iterated
+    close = getattr(chunks, "close", None)
+    if close:
+        response.call_on_close(close)
+    return response
+
+
 @main_bp.route("/download_logs")
 @requires_auth
 def download_logs():
@@ -141,6 +445,9 @@ def download_logs():
 def download_session(session_id):
     """Download CSV file for a specific session.
     
+    Stores that keep a CSV file per session send it directly; the SQLite
+    store's turns are streamed from the database without a file on disk.
+    
     Args:
         session_id: The UUID of the session to download.
         
@@ -150,30 +457,71 @@ def download_session(session_id):
     Raises:
         404: Session not found.
     """
+    download_name = f"session_{session_id}.csv"
     csv_path = session_logger.get_session_csv_path(session_id)
-    if not csv_path:
-        abort(404, description="Session not found")
-    
-    directory = os.path.dirname(csv_path)
-    filename = os.path.basename(csv_path)
+    if csv_path:
+        directory = os.path.dirname(csv_path)
+        filename = os.path.basename(csv_path)
+        
+        return send_from_directory(
+            directory, filename, 
+            as_attachment=True,
+            download_name=download_name
+        )
     
-    return send_from_directory(
-        directory, filename, 
-        as_attachment=True,
-        download_name=f"session_{session_id}.csv"
+    chunks = session_logger.iter_session_csv(session_id)
+    if chunks is None:
+        abort(404, description="Session not found")
+    return Response(
+        chunks,
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={download_name}"},
     )
 
 
 @main_bp.route("/sessions")
 @requires_auth
 def list_sessions():
-    """List all available sessions organized by status.
+    """List sessions from the session manifest, one page at a time.
+    
+    Query parameters: status (active or completed), the export filters
+    (chatbot_type, min_risk_score, and since/until on the start time),
+    sort (start_time, end_time, last_activity, turns, risk_score or bytes),
+    order (asc or desc, default desc), limit, and cursor from the previous
+    page's next_cursor.
     
     Returns:
-        JSON with active and completed session lists.
+        JSON with the page of session records, next_cursor and total.
+        
+    Raises:
+        400: Invalid parameter or cursor.
     """
-    sessions = session_logger.get_all_sessions()
-    return jsonify(sessions)
+    config = current_config()
+    query = _parse_export_filters()
+    
+    status = request.args.get("status")
+    if status:
+        if status not in ("active", "completed"):
+            abort(400, description="'status' must be 'active' or 'completed'.")
+        query["status"] = status
+    
+    order = request.args.get("order", "desc")
+    if order not in ("asc", "desc"):
+        abort(400, description="'order' must be 'asc' or 'desc'.")
+    query["descending"] = order == "desc"
+    
+    try:
+        limit = int(request.args.get("limit", config.SESSIONS_PAGE_SIZE))
+    except ValueError:
+        abort(400, description="'limit' must be an integer.")
+    query["limit"] = max(1, min(limit, config.SESSIONS_MAX_PAGE_SIZE))
+    
+    try:
+        page = session_logger.list_sessions(sort=request.args.get("sort", "start_time"),
+                                            cursor=request.args.get("cursor"), **query)
+    except ValueError as e:
+        abort(400, description=str(e))
+    return jsonify(page)
 
 
 @main_bp.route("/download_all_sessions")
@@ -181,44 +529,18 @@ def list_sessions():
 def download_all_sessions():
     """Download all sessions data in a single consolidated CSV file.
     
-    Combines all active and completed sessions into one CSV file,
-    sorted by timestamp.
+    Combines all active and completed sessions into one CSV stream,
+    sorted by timestamp. Optional query parameters chatbot_type, since,
+    until and min_risk_score narrow the export.
     
     Returns:
         CSV file download with all session data.
         
     Raises:
+        400: Invalid filter value.
         404: No session data found.
     """
-    # Create temporary file for the consolidated CSV
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as tmp:
-        tmp_path = tmp.name
-    
-    # Export all sessions to the temporary file
-    count = session_logger.export_all_sessions_to_csv(tmp_path)
-    
-    if count == 0:
-        os.unlink(tmp_path)
-        abort(404, description="No session data found")
-    
-    # Send the file
-    directory = os.path.dirname(tmp_path)
-    filename = os.path.basename(tmp_path)
-    
-    @after_this_request
-    def remove_file(response):  # pyright: ignore[reportUnusedFunction]
-        """Clean up temporary file after sending response."""
-        try:
-            os.unlink(tmp_path)
-        except Exception:
-            pass
-        return response
-    
-    return send_from_directory(
-        directory, filename, 
-        as_attachment=True,
-        download_name=f"all_sessions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    )
+    return _stream_sessions_csv(f"all_sessions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
 
 
 @main_bp.route("/session_management")
@@ -232,48 +554,133 @@ def session_management():
     return render_template("sessions.html")
 
 
+@main_bp.route("/admin/bulkhead")
+@requires_auth
+def bulkhead_status():
+    """Show admission control metrics for upstream OpenAI calls.
+    
+    Returns:
+        JSON with per-chatbot-type adaptive limits, in-flight calls, queue
+        depth, wait times and rejection counts.
+    """
+    return jsonify(bulkhead.get_stats())
+
+
+@main_bp.route("/admin/cache")
+@requires_auth
+def cache_status():
+    """Show response cache and request coalescing metrics.
+    
+    Returns:
+        JSON with hit rates, sizes and evictions of the exact and semantic
+        response caches, and how many calls were collapsed into shared
+        upstream requests.
+    """
+    return jsonify({
+        "response_cache": response_cache.get_stats(),
+        "semantic_cache": semantic_cache.get_stats(),
+        "coalescer": request_coalescer.get_stats(),
+    })
+
+
+@main_bp.route("/admin/hedging")
+@requires_auth
+def hedging_status():
+    """Show request hedging metrics for upstream OpenAI calls.
+    
+    Returns:
+        JSON with the hedge rate, hedge wins, remaining budget and the
+        current percentile-derived hedge delay.
+    """
+    return jsonify(request_hedger.get_stats())
+
+
+@main_bp.route("/admin/log_writer")
+@requires_auth
+def log_writer_status():
+    """Show write-behind metrics for conversation and session logs.
+    
+    Returns:
+        JSON with queue depth, written and dropped entries, batch sizes,
+        fsync mode and count, and write errors.
+    """
+    return jsonify(log_writer.get_stats())
+
+
+@main_bp.route("/admin/session_logger")
+@requires_auth
+def session_logger_status():
+    """Show in-memory session metrics for this worker.
+    
+    Returns:
+        JSON with resident sessions, turns and approximate bytes, LRU
+        evictions and reloads, and idle-session reaper counts.
+    """
+    return jsonify(session_logger.get_stats())
+
+
+@main_bp.route("/admin/token_budget")
+@requires_auth
+def token_budget_status():
+    """Show output token caps and reported usage for recent upstream turns.
+    
+    Returns:
+        JSON with per-chatbot-type turn counts, average cap and completion
+        tokens, truncated replies and p50/p95 latency.
+    """
+    return jsonify(token_budget.get_stats())
+
+
+@main_bp.route("/admin/circuit_breaker", methods=["GET", "POST"])
+@requires_auth
+def circuit_breaker_status():
+    """Show or change the OpenAI circuit breaker state.
+    
+    GET: Returns the breaker state, recent error rate and latency, and
+    fallback answer counts.
+    POST: Applies an action to the breaker.
+    
+    Expected POST data:
+        action (str): "reset" to close the breaker, "open" to force it open.
+        
+    Returns:
+        JSON with breaker and fallback statistics.
+        
+    Raises:
+        400: Unknown action.
+    """
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        action = data.get("action")
+        if action == "reset":
+            circuit_breaker.reset()
+        elif action == "open":
+            circuit_breaker.force_open()
+        else:
+            abort(400, description="action must be 'reset' or 'open'")
+
+    return jsonify({
+        "circuit_breaker": circuit_breaker.get_stats(),
+        "fallback": fallback_responder.get_stats(),
+    })
+
+
 @main_bp.route("/download")
 def download_data():
     """Public endpoint to download all session data as CSV.
     
     This is a simplified endpoint that doesn't require authentication,
     allowing users to download all session data by visiting the URL directly.
+    Accepts the same filters as /download_all_sessions.
     
     Returns:
         CSV file download with all session data.
         
     Raises:
+        400: Invalid filter value.
         404: No session data found.
     """
-    # Create temporary file for the consolidated CSV
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as tmp:
-        tmp_path = tmp.name
-    
-    # Export all sessions to the temporary file
-    count = session_logger.export_all_sessions_to_csv(tmp_path)
-    
-    if count == 0:
-        os.unlink(tmp_path)
-        abort(404, description="No session data found")
-    
-    # Send the file
-    directory = os.path.dirname(tmp_path)
-    filename = os.path.basename(tmp_path)
-    
-    @after_this_request
-    def remove_file(response):  # pyright: ignore[reportUnusedFunction]
-        """Clean up temporary file after sending response."""
-        try:
-            os.unlink(tmp_path)
-        except Exception:
-            pass
-        return response
-    
-    return send_from_directory(
-        directory, filename, 
-        as_attachment=True,
-        download_name=f"apt_session_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    )
+    return _stream_sessions_csv(f"apt_session_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
 
 @main_bp.route("/api/get_assessment_step", methods=["POST"])
 def get_assessment_step():
@@ -0,0 +1,118 @@
+"""
+ASGI entry point for the APT Chat Bot
+=====================================
+Serves the same Flask application as ``main.py``, but chat turns run as
+native coroutines on the event loop (via ``AsyncChatbot``) instead of
+holding a WSGI worker thread for the whole OpenAI round trip. ``POST /`` is
+dispatched to the async ``chat_async`` view; async views are run natively;
+every other route falls back to the regular Flask app in a thread pool.
+
+Run with:
+    python asgi.py
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+import inspect
+import io
+
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from config import current_config
+
+
+class AsyncChatDispatcher:
+    """ASGI application that runs coroutine views natively and defers the rest to WSGI."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi_app = WsgiToAsgi(flask_app)
+        # Async replacements for sync endpoints: (method, endpoint) -> async endpoint
+        self.async_overrides = {("POST", "main_bp.home"): "main_bp.chat_async"}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.wsgi_app(scope, receive, send)
+
+        endpoint = self._match_async_endpoint(scope)
+        if endpoint is None:
+            return await self.wsgi_app(scope, receive, send)
+
+        body = await self._read_body(receive)
+        instance = WsgiToAsgiInstance(self.flask_app)
+        instance.scope = scope
+        environ = instance.build_environ(scope, io.BytesIO(body))
+        response = await self._dispatch(environ, endpoint)
+
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": [
+                (name.lower().encode("latin1"), value.encode("latin1"))
+                for name, value in response.headers.items()
+            ],
+        })
+        await send({"type": "http.response.body", "body": response.get_data()})
+
+    def _match_async_endpoint(self, scope):
+        """Return the async endpoint that should serve this request, if any."""
+        adapter = self.flask_app.url_map.bind(
+            "", path_info=scope["path"], url_scheme=scope.get("scheme", "http")
+        )
+        try:
+            endpoint, _ = adapter.match(scope["path"], method=scope["method"])
+        except HTTPException:
+            return None
+
+        endpoint = self.async_overrides.get((scope["method"], endpoint), endpoint)
+        view = self.flask_app.view_functions.get(endpoint)
+        if view is not None and inspect.iscoroutinefunction(view):
+            return endpoint
+        return None
+
+    @staticmethod
+    async def _read_body(receive):
+        """Collect the full request body from the ASGI receive channel."""
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        return b"".join(chunks)
+
+    async def _dispatch(self, environ, endpoint):
+        """Run an async view inside a Flask request context, mirroring full_dispatch_request."""
+        app = self.flask_app
+        ctx = app.request_context(environ)
+        ctx.push()
+        error = None
+        try:
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    view = app.view_functions[endpoint]
+                    rv = await view(**(ctx.request.view_args or {}))
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            return app.finalize_request(rv)
+        except Exception as e:
+            error = e
+            return app.handle_exception(e)
+        finally:
+            ctx.pop(error)
+
+
+app = AsyncChatDispatcher(create_app())
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    config = current_config()
+    uvicorn.run(
+        "asgi:app",
+        host=config.HOST,
+        port=config.PORT,
+        workers=config.WORKERS,
+    )
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent chat-turn throughput, sync WSGI path vs async ASGI path
+
+Both paths run in-process against a local stub LLM server with a fixed
+latency. The sync path drives the Flask app from a fixed pool of threads
+(standing in for WSGI worker capacity); the async path drives the ASGI app
+from a single event loop.
+
+Usage:
+    python benchmarks/bench_async_chat.py --turns 400 --latency 0.2 --sync-workers 8 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ.setdefault('OPENAI_API_KEY', 'bench-key')
+os.environ.setdefault('OPENAI_MAX_RETRIES', '0')
+os.environ.setdefault('LOG_TO_CONSOLE', 'False')
+os.environ.setdefault('RESPONSE_CACHE_ENABLED', 'False')
+os.environ.setdefault('REQUEST_COALESCING_ENABLED', 'False')
+os.environ.setdefault('BULKHEAD_ENABLED', 'False')
+
+from benchmarks.stub_llm_server import StubLLMServer  # noqa: E402
+
+CHAT_PAYLOAD = {"message": "What counts as one standard drink?", "chatbot_type": "ai"}
+
+
+def summarize(name, latencies, elapsed):
+    """Print and return throughput and latency percentiles for one run."""
+    latencies = sorted(latencies)
+    result = {
+        "path": name,
+        "turns": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "turns_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+    print(f"{name:>6}: {result['turns_per_s']:>8} turns/s  "
+          f"p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  "
+          f"({result['turns']} turns in {result['elapsed_s']} s)")
+    return result
+
+
+def run_sync(flask_app, turns, workers):
+    """Drive POST / through the Flask app from a fixed-size thread pool."""
+    def worker(count):
+        client = flask_app.test_client()
+        latencies = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = client.post('/', json=CHAT_PAYLOAD)
+            assert response.status_code == 200, response.get_data(as_text=True)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    per_worker = [turns // workers + (1 if i < turns % workers else 0) for i in range(workers)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(worker, per_worker))
+    elapsed = time.perf_counter() - start
+    return summarize("sync", [lat for lats in results for lat in lats], elapsed)
+
+
+async def _asgi_post(asgi_app, path, payload):
+    """Send one JSON POST through an ASGI app and return the status code."""
+    body = json.dumps(payload).encode()
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = {}
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    scope = {
+        "type": "http", "http_version": "1.1", "scheme": "http",
+        "method": "POST", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 8000),
+    }
+    await asgi_app(scope, receive, send)
+    return status.get("code")
+
+
+def run_async(asgi_app, turns, concurrency):
+    """Drive POST / through the ASGI app from a single event loop."""
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one_turn():
+            async with semaphore:
+                start = time.perf_counter()
+                code = await _asgi_post(asgi_app, '/', CHAT_PAYLOAD)
+                assert code == 200, code
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_turn() for _ in range(turns)))
+        return latencies, time.perf_counter() - start
+
+    latencies, elapsed = asyncio.run(main())
+    return summarize("async", latencies, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub LLM latency in seconds")
+    parser.add_argument("--sync-workers", type=int, default=8, help="threads serving the sync path")
+    parser.add_argument("--concurrency", type=int, default=200, help="in-flight turns on the async path")
+    parser.add_argument("--stub-url", help="use an already running stub server instead of starting one")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    server = None
+    if args.stub_url:
+        os.environ['OPENAI_BASE_URL'] = args.stub_url
+    else:
+        server = StubLLMServer(latency=args.latency).start()
+        os.environ['OPENAI_BASE_URL'] = server.base_url
+
+    from config import Config
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Keep benchmark session logs out of the real log directory
+        Config.LOG_DIR = Path(tmpdir) / "logs"
+        Config.SESSION_LOG_DIR = Config.LOG_DIR / "session_logs"
+        Config.ACTIVE_SESSION_DIR = Config.SESSION_LOG_DIR / "active"
+        Config.COMPLETED_SESSION_DIR = Config.SESSION_LOG_DIR / "completed"
+
+        from asgi import app as asgi_app
+
+        print(f"Stub latency {args.latency * 1000:.0f} ms, {args.turns} turns")
+        results = [
+            run_sync(asgi_app.flask_app, args.turns, args.sync_workers),
+            run_async(asgi_app, args.turns, args.concurrency),
+        ]
+
+    if server:
+        server.shutdown()
+    speedup = results[1]["turns_per_s"] / results[0]["turns_per_s"]
+    print(f"async/sync throughput: {speedup:.1f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
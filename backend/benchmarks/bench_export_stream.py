@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Benchmark: peak memory and time to first byte of the all-sessions export
+
+Writes --sessions session CSVs (--turns turns each, half of them completed)
+into a temporary log directory, then downloads /download_all_sessions in a
+fresh process per mode and reports the time to the first and last byte and
+the peak RSS of that process:
+
+  buffered  the previous export: read every row into a list, sort it, write
+            a temporary file, then send it
+  stream    the streaming k-way merge behind the current route
+
+--workers runs the stream mode once per SESSION_EXPORT_WORKERS value
+(0 = in-process merge, N = process pool) for a scaling comparison. The
+reported RSS is the serving process only, not the pool processes.
+
+Usage:
+    python benchmarks/bench_export_stream.py --sessions 100000
+    python benchmarks/bench_export_stream.py --sessions 10000 --modes stream --output export.json
+    python benchmarks/bench_export_stream.py --modes stream --workers 0 1 2 4 8
+"""
+import argparse
+import base64
+import csv
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ.setdefault('LOG_TO_CONSOLE', 'False')
+
+from config import Config  # noqa: E402
+from logger.session_store import EXPORT_CSV_FIELDS, SESSION_CSV_FIELDS  # noqa: E402
+
+BOT_REPLY = ("That's a great question! A standard drink is about 14 grams of alcohol, so pacing "
+             "yourself with water in between and eating beforehand really helps. ")
+
+
+def _use_log_dir(path):
+    """Point the session log directories at path."""
+    Config.LOG_DIR = Path(path)
+    Config.SESSION_LOG_DIR = Config.LOG_DIR / "session_logs"
+    Config.ACTIVE_SESSION_DIR = Config.SESSION_LOG_DIR / "active"
+    Config.COMPLETED_SESSION_DIR = Config.SESSION_LOG_DIR / "completed"
+    Config.ACTIVE_SESSION_DIR.mkdir(parents=True, exist_ok=True)
+    Config.COMPLETED_SESSION_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def generate(sessions, turns, seed=7):
+    """Write session CSVs with overlapping lifetimes, as the logger would have."""
+    rng = random.Random(seed)
+    start = datetime(2024, 5, 1, 9, 0, 0)
+    for n in range(sessions):
+        folder = Config.COMPLETED_SESSION_DIR if n % 2 else Config.ACTIVE_SESSION_DIR
+        moment = start + timedelta(seconds=n * 3 + rng.randint(0, 600))
+        with open(folder / f"session-{n:07d}.csv", "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=SESSION_CSV_FIELDS)
+            writer.writeheader()
+            for i in range(turns):
+                moment += timedelta(seconds=rng.randint(5, 120))
+                context = {"party_scenario": rng.randint(1, 3), "chat_history": [BOT_REPLY] * i}
+                writer.writerow({
+                    "timestamp": moment.strftime(Config.LOG_DATE_FORMAT),
+                    "conversation_number": i + 1,
+                    "chatbot_type": rng.choice(["ai", "doctor", "student"]),
+                    "user_message": f"How many drinks is too many? ({n}/{i})",
+                    "bot_response": BOT_REPLY,
+                    "user_ip": "192.168.xxx.xxx",
+                    "risk_score": rng.randint(0, 20),
+                    "scenario": context["party_scenario"],
+                    "assessment_answers": "",
+                    "chat_history": json.dumps(context["chat_history"]),
+                    "full_context": json.dumps(context),
+                })
+
+
+def buffered_export(output_path):
+    """The export as it was before streaming: collect, sort, then write a file."""
+    all_data = []
+    for status, folder in (("active", Config.ACTIVE_SESSION_DIR), ("completed", Config.COMPLETED_SESSION_DIR)):
+        for file in os.listdir(folder):
+            if file.endswith(".csv"):
+                with open(folder / file, "r", encoding="utf-8-sig") as f:
+                    for row in csv.DictReader(f):
+                        row["session_id"] = file[:-4]
+                        row["session_status"] = status
+                        all_data.append(row)
+    all_data.sort(key=lambda x: x.get("timestamp", ""))
+    with open(output_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=EXPORT_CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(all_data)
+    return len(all_data)
+
+
+def measure(mode, data_dir, workers):
+    """Run one download in this process and return its timings and memory."""
+    _use_log_dir(data_dir)
+    Config.SESSION_EXPORT_WORKERS = workers
+    Config.SESSION_EXPORT_PARALLEL_MIN_SESSIONS = 0  # time the pool whatever the data size
+    from app import create_app
+
+    client = create_app('testing').test_client()
+    auth = {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin').decode()}
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    size = 0
+    started = time.perf_counter()
+    if mode == "buffered":
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as tmp:
+            tmp_path = tmp.name
+        try:
+            buffered_export(tmp_path)
+            with open(tmp_path, "rb") as f:
+                first_byte = None
+                for chunk in iter(lambda: f.read(65536), b""):
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                    size += len(chunk)
+        finally:
+            os.unlink(tmp_path)
+    else:
+        response = client.get('/download_all_sessions', headers=auth, buffered=False)
+        assert response.status_code == 200, response.status_code
+        first_byte = None
+        for chunk in response.iter_encoded():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+        response.close()
+    last_byte = time.perf_counter() - started
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "mode": mode,
+        "workers": workers,
+        "ttfb_s": round(first_byte, 3),
+        "total_s": round(last_byte, 3),
+        "bytes": size,
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "rss_growth_mb": round((peak_kb - baseline_kb) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--modes", nargs="+", choices=["buffered", "stream"], default=["buffered", "stream"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0],
+                        help="SESSION_EXPORT_WORKERS values for the stream mode")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--child", choices=["buffered", "stream"], help=argparse.SUPPRESS)
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.data, args.workers[0])))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _use_log_dir(tmpdir)
+        started = time.perf_counter()
+        generate(args.sessions, args.turns)
+        print(f"generated {args.sessions} sessions x {args.turns} turns in {time.perf_counter() - started:.1f}s")
+
+        runs = [(mode, workers) for mode in args.modes
+                for workers in (args.workers if mode == "stream" else [0])]
+        for mode, workers in runs:
+            # A fresh process per run, so peak RSS is not inherited
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", mode, "--data", tmpdir,
+                 "--workers", str(workers)],
+                capture_output=True, text=True, check=True,
+            )
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{mode:>9} x{workers}: first byte {result['ttfb_s']:>8.3f}s  last byte {result['total_s']:>8.3f}s  "
+                  f"peak RSS {result['peak_rss_mb']:>8.1f} MB (+{result['rss_growth_mb']} MB)  "
+                  f"{result['bytes'] / 1e6:.1f} MB sent")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"sessions": args.sessions, "turns": args.turns, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Benchmark: micro-benchmarks for the validator and logger hot paths
+
+Times InputValidator.sanitize_string (message sizes up to
+MAX_MESSAGE_LENGTH plus adversarial inputs), Logger.mask_ip,
+SessionLogger.log_conversation for the Nth turn of a session, and
+SessionLogger.export_all_sessions_to_csv over N sessions.
+
+Each benchmark is calibrated pytest-benchmark style: a round repeats the
+call until it takes at least --min-time, and per-call statistics are taken
+over --rounds rounds. Benchmarks that need fresh state run one call per
+round. Results are written as JSON (--output) in the same layout as
+pytest-benchmark, and --compare prints the change against an earlier file.
+
+Usage:
+    python benchmarks/bench_hot_paths.py --output hot_paths.json
+    python benchmarks/bench_hot_paths.py --filter sanitize --compare hot_paths.json
+    python benchmarks/bench_hot_paths.py --session-turns 1 50 --export-sizes 1000
+    python benchmarks/bench_hot_paths.py --filter export --session-store sqlite
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ.setdefault('LOG_TO_CONSOLE', 'False')
+
+from config import Config, current_config  # noqa: E402
+from logger.custom_logger import Logger  # noqa: E402
+from logger.session_logger import SessionLogger  # noqa: E402
+from logger.write_behind import log_writer  # noqa: E402
+from validators import InputValidator  # noqa: E402
+
+WORDS = ("i went to a party last weekend and my friends kept offering me shots "
+         "how many drinks is too many if i want to stay safe and get home okay").split()
+BOT_REPLY = ("That's a great question! A standard drink is about 14 grams of alcohol, so pacing "
+             "yourself with water in between and eating beforehand really helps. ") * 4
+
+
+def realistic_message(size, rng):
+    """Plain chat text of about size characters."""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def adversarial_messages(size):
+    """Inputs that stress the sanitizer's regexes and unescaping."""
+    return {
+        "unclosed_tags": "<" * size,
+        "tag_soup": ("<b onclick=alert(1)>x</b>" * (size // 24 + 1))[:size],
+        "entities": ("&lt;script&gt;" * (size // 14 + 1))[:size],
+        "event_handlers": (("onmouseover" + "a" * 60 + " = ") * (size // 75 + 1))[:size],
+        "sql": ("' or 1=1 -- union select * from users; drop table x; " * (size // 54 + 1))[:size],
+        "whitespace": (" \t\n" * (size // 3 + 1))[:size],
+        "control_chars": ("\x01\x7f‮\x9f" * (size // 4 + 1))[:size],
+    }
+
+
+def measure(fn, rounds, min_time, setup=None):
+    """Time fn and return per-call statistics in seconds.
+
+    Without setup, each round calls fn enough times to last min_time; with
+    setup, every round calls fn once on the arguments setup() returns.
+    """
+    iterations = 1
+    if setup is None:
+        while True:
+            started = time.perf_counter()
+            for _ in range(iterations):
+                fn()
+            if time.perf_counter() - started >= min_time or iterations >= 1 << 20:
+                break
+            iterations *= 2
+
+    samples = []
+    for _ in range(rounds):
+        args = setup() if setup is not None else ()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn(*args)
+        samples.append((time.perf_counter() - started) / iterations)
+
+    mean = statistics.mean(samples)
+    return {
+        "min": min(samples),
+        "max": max(samples),
+        "mean": mean,
+        "median": statistics.median(samples),
+        "stddev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "rounds": rounds,
+        "iterations": iterations,
+        "ops": 1.0 / mean if mean else 0.0,
+    }
+
+
+class Suite:
+    """Collects benchmark results and prints them as they finish."""
+
+    def __init__(self, name_filter, rounds, min_time):
+        self.name_filter = name_filter
+        self.rounds = rounds
+        self.min_time = min_time
+        self.benchmarks = []
+
+    def wants(self, name):
+        return not self.name_filter or self.name_filter in name
+
+    def run(self, group, name, fn, params=None, setup=None, rounds=None):
+        if not self.wants(name):
+            return
+        stats = measure(fn, rounds or self.rounds, self.min_time, setup)
+        self.benchmarks.append({"group": group, "name": name, "params": params or {}, "stats": stats})
+        print(f"{name:<52} median {stats['median'] * 1e6:>12.1f} us  "
+              f"min {stats['min'] * 1e6:>12.1f} us  {stats['ops']:>12.1f} ops/s")
+
+
+def bench_sanitize(suite, sizes):
+    rng = random.Random(7)
+    max_length = current_config().MAX_MESSAGE_LENGTH
+    for size in sizes:
+        text = realistic_message(size, rng)
+        suite.run("sanitize_string", f"sanitize_string[text-{size}]",
+                  lambda text=text: InputValidator.sanitize_string(text), {"size": size})
+    for kind, text in adversarial_messages(max_length).items():
+        suite.run("sanitize_string", f"sanitize_string[{kind}-{max_length}]",
+                  lambda text=text: InputValidator.sanitize_string(text), {"size": len(text), "input": kind})
+
+
+def bench_mask_ip(suite):
+    for kind, ip in {"private": "192.168.12.34", "public": "8.8.4.4",
+                     "ipv6": "2001:db8::ff00:42:8329", "unknown": "Unknown"}.items():
+        suite.run("mask_ip", f"mask_ip[{kind}]", lambda ip=ip: Logger.mask_ip(ip), {"input": kind})
+
+
+def _use_log_dir(path):
+    """Point the session log directories at path."""
+    Config.LOG_DIR = Path(path)
+    Config.SESSION_LOG_DIR = Config.LOG_DIR / "session_logs"
+    Config.ACTIVE_SESSION_DIR = Config.SESSION_LOG_DIR / "active"
+    Config.COMPLETED_SESSION_DIR = Config.SESSION_LOG_DIR / "completed"
+    Config.ACTIVE_SESSION_DIR.mkdir(parents=True, exist_ok=True)
+    Config.COMPLETED_SESSION_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def _log_turn(logger, session_id, i):
+    logger.log_conversation(session_id, "ai", f"question {i}: " + WORDS[i % len(WORDS)] * 5,
+                            BOT_REPLY, "192.168.xxx.xxx", risk_score=i % 10,
+                            conversation_context={"party_scenario": 1})
+
+
+def bench_log_conversation(suite, turn_counts, rounds):
+    """Cost of logging turn N of a session that already holds N - 1 turns."""
+    for turns in turn_counts:
+        name = f"log_conversation[turn-{turns}]"
+        if not suite.wants(name):
+            continue
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _use_log_dir(tmpdir)
+            logger = SessionLogger()
+
+            def setup():
+                session_id = logger.create_session("192.168.xxx.xxx")
+                for i in range(turns - 1):
+                    _log_turn(logger, session_id, i)
+                return (session_id,)
+
+            suite.run("log_conversation", name,
+                      lambda session_id: _log_turn(logger, session_id, turns - 1),
+                      {"turns": turns}, setup=setup, rounds=rounds)
+            log_writer.flush()
+
+
+def bench_export(suite, session_counts, turns_per_session, rounds):
+    """Cost of exporting every session to one CSV."""
+    for sessions in session_counts:
+        name = f"export_all_sessions_to_csv[sessions-{sessions}]"
+        if not suite.wants(name):
+            continue
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _use_log_dir(tmpdir)
+            logger = SessionLogger()
+            for s in range(sessions):
+                session_id = logger.create_session("192.168.xxx.xxx")
+                for i in range(turns_per_session):
+                    _log_turn(logger, session_id, i)
+                # Half the sessions are finished, as on a live deployment
+                if s % 2:
+                    logger.end_session(session_id)
+            output = os.path.join(tmpdir, "export.csv")
+            suite.run("export_all_sessions_to_csv", name,
+                      lambda: logger.export_all_sessions_to_csv(output),
+                      {"sessions": sessions, "turns_per_session": turns_per_session}, rounds=rounds)
+
+
+def compare(benchmarks, previous_path):
+    """Print the median change of each benchmark against an earlier results file."""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {b["name"]: b["stats"] for b in json.load(f)["benchmarks"]}
+    print(f"\nCompared with {previous_path}:")
+    for bench in benchmarks:
+        before = previous.get(bench["name"])
+        if before is None:
+            continue
+        ratio = bench["stats"]["median"] / before["median"] if before["median"] else float("inf")
+        print(f"{bench['name']:<52} {before['median'] * 1e6:>12.1f} -> "
+              f"{bench['stats']['median'] * 1e6:>12.1f} us  ({ratio:.2f}x)")
+
+
+def main():
+    max_length = current_config().MAX_MESSAGE_LENGTH
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 512, max_length],
+                        help="sanitize_string message sizes")
+    parser.add_argument("--session-turns", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--export-sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="sessions on disk for the export benchmark")
+    parser.add_argument("--export-turns", type=int, default=5, help="turns per exported session")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--slow-rounds", type=int, default=3, help="rounds for session benchmarks")
+    parser.add_argument("--min-time", type=float, default=0.02, help="seconds per calibrated round")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--compare", help="earlier --output file to compare against")
+    parser.add_argument("--session-store", choices=["csv", "sqlite"], help="override SESSION_STORE")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.session_store:
+        Config.SESSION_STORE = args.session_store
+        Config.SESSION_DB_PATH = ""  # inside each benchmark's temporary log dir
+
+    suite = Suite(args.filter, args.rounds, args.min_time)
+    bench_sanitize(suite, args.sizes)
+    bench_mask_ip(suite)
+    bench_log_conversation(suite, args.session_turns, args.slow_rounds)
+    bench_export(suite, args.export_sizes, args.export_turns, args.slow_rounds)
+
+    if args.compare:
+        compare(suite.benchmarks, args.compare)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "machine_info": {
+                    "python_version": platform.python_version(),
+                    "platform": platform.platform(),
+                    "processor": platform.processor(),
+                },
+                "datetime": datetime.now().isoformat(),
+                "benchmarks": suite.benchmarks,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
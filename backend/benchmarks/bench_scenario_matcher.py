@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark: scenario grading, nested keyword scans vs the compiled automaton
+
+The baseline is the original handler logic (a substring scan per keyword per
+category on every message). The compiled path is chatbot.scenarios.Scenario,
+which matches every keyword in one pass over the message. Synthetic scenarios
+are generated at increasing keyword counts, alongside the shipped registry.
+
+Usage:
+    python benchmarks/bench_scenario_matcher.py --messages 2000 --keywords 20 200 2000
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ.setdefault('OPENAI_API_KEY', 'bench-key')
+
+from chatbot.scenarios import Scenario, scenario_registry  # noqa: E402
+
+
+def nested_scan(scenario, message):
+    """The original per-handler matcher."""
+    text = message.lower()
+    for category in scenario.categories:
+        if any(keyword in text for keyword in category["keywords"]):
+            return category["feedback"]
+    return scenario.hint
+
+
+def synthetic_scenario(keyword_count, categories, rng):
+    """Build a scenario with keyword_count random two-word keywords."""
+    def word():
+        return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8)))
+
+    keywords = [f"{word()} {word()}" for _ in range(keyword_count)]
+    data = {
+        "name": f"synthetic-{keyword_count}",
+        "hint": "hint",
+        "categories": [
+            {"id": str(i), "keywords": keywords[i::categories], "feedback": f"feedback {i}"}
+            for i in range(categories)
+        ],
+    }
+    return Scenario(data["name"], data), keywords
+
+
+def make_messages(keywords, count, rng):
+    """Mostly non-matching chat-length messages, a quarter containing a keyword."""
+    filler = "honestly i am not sure what to say to that right now but thanks for asking".split()
+    messages = []
+    for i in range(count):
+        words = rng.sample(filler, 10)
+        if i % 4 == 0:
+            words.insert(rng.randint(0, len(words)), rng.choice(keywords))
+        messages.append(" ".join(words))
+    return messages
+
+
+def time_matcher(fn, scenario, messages):
+    start = time.perf_counter()
+    for message in messages:
+        fn(scenario, message)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def run_case(name, scenario, messages):
+    """Time both matchers on one scenario and check they agree."""
+    assert all(nested_scan(scenario, m) == scenario.respond(m) for m in messages)
+    keyword_count = sum(len(c["keywords"]) for c in scenario.categories)
+    baseline = time_matcher(nested_scan, scenario, messages)
+    compiled = time_matcher(lambda s, m: s.respond(m), scenario, messages)
+    result = {
+        "scenario": name,
+        "keywords": keyword_count,
+        "nested_us": round(baseline, 2),
+        "compiled_us": round(compiled, 2),
+        "speedup": round(baseline / compiled, 2),
+    }
+    print(f"{name:>16}: {keyword_count:>6} keywords  nested {result['nested_us']:>9} us  "
+          f"compiled {result['compiled_us']:>7} us  ({result['speedup']}x)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--keywords", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    for scenario in scenario_registry.scenarios.values():
+        keywords = [k for c in scenario.categories for k in c["keywords"]]
+        results.append(run_case(scenario.name, scenario, make_messages(keywords, args.messages, rng)))
+    for keyword_count in args.keywords:
+        scenario, keywords = synthetic_scenario(keyword_count, args.categories, rng)
+        results.append(run_case(scenario.name, scenario, make_messages(keywords, args.messages, rng)))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark: semantic cache lookup latency at 10k and 100k cached entries
+
+Fills one persona index with synthetic student questions, then times
+near-duplicate lookups (paraphrased queries) against it.
+
+Usage:
+    python benchmarks/bench_semantic_cache.py --sizes 10000 100000 --queries 1000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_ENV', 'testing')
+
+from config import current_config  # noqa: E402
+from chatbot.semantic_cache import SemanticCache  # noqa: E402
+
+SUBJECTS = ["one drink", "a standard drink", "binge drinking", "a hangover", "peer pressure",
+            "a designated driver", "blood alcohol", "shots", "beer", "wine", "a party", "my friends"]
+TEMPLATES = ["what is {}", "how much is {}", "can you explain {}", "why does {} matter",
+             "how do i deal with {}", "is {} dangerous", "tell me about {}", "what counts as {}"]
+
+
+def synthetic_message(rng, i):
+    """Build a unique, realistic-looking question."""
+    template = rng.choice(TEMPLATES)
+    subject = rng.choice(SUBJECTS)
+    return f"{template.format(subject)} when i am {18 + i % 3} at event {i}"
+
+
+def run(size, queries, seed=7):
+    """Fill an index with `size` entries and time `queries` lookups."""
+    rng = random.Random(seed)
+    config = current_config()
+    config.SEMANTIC_CACHE_MAX_ENTRIES = size
+    cache = SemanticCache()
+
+    messages = [synthetic_message(rng, i) for i in range(size)]
+    start = time.perf_counter()
+    for message in messages:
+        cache.set("bench", message, "cached answer")
+    fill_s = time.perf_counter() - start
+
+    latencies = []
+    hits = 0
+    for _ in range(queries):
+        # Paraphrase an existing entry: change case and drop a word
+        words = rng.choice(messages).upper().split()
+        del words[rng.randrange(len(words))]
+        start = time.perf_counter()
+        if cache.get("bench", " ".join(words)) is not None:
+            hits += 1
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    result = {
+        "entries": size,
+        "dim": cache.vectorizer.dim,
+        "matrix_mb": round(cache._indexes["bench"].vectors.nbytes / 1e6, 1),
+        "fill_per_s": round(size / fill_s),
+        "lookup_p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "lookup_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+        "lookup_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+        "hit_rate": round(hits / queries, 3),
+    }
+    print(f"{size:>7} entries ({result['matrix_mb']} MB): "
+          f"p50 {result['lookup_p50_ms']} ms  p95 {result['lookup_p95_ms']} ms  "
+          f"p99 {result['lookup_p99_ms']} ms  hit rate {result['hit_rate']}  "
+          f"(fill {result['fill_per_s']}/s)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = [run(size, args.queries) for size in args.sizes]
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
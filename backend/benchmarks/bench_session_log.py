@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-turn cost of SessionLogger.log_conversation as a session grows
+
+Logs --turns turns into one session, timing every call, and prints the
+median per-turn cost over buckets of the session (turns 1-10, 11-100, ...).
+With append-only CSV writes the cost should stay flat; a full rewrite per
+turn shows up as linear growth. Write-behind is turned off so every call
+includes its disk write; pass --write-behind to time only the enqueue a
+request pays.
+
+Usage:
+    python benchmarks/bench_session_log.py --turns 1000 --sessions 3
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ.setdefault('LOG_TO_CONSOLE', 'False')
+
+from config import Config  # noqa: E402
+from logger.session_logger import SessionLogger  # noqa: E402
+from logger.write_behind import log_writer  # noqa: E402
+
+BOT_REPLY = ("That's a great question! A standard drink is about 14 grams of alcohol, so pacing "
+             "yourself with water in between and eating beforehand really helps. ") * 4
+
+
+def buckets(turns):
+    """Turn ranges 1-10, 11-100, 101-1000, ... up to turns."""
+    ranges, low, high = [], 1, 10
+    while low <= turns:
+        ranges.append((low, min(high, turns)))
+        low, high = high + 1, high * 10
+    return ranges
+
+
+def run(turns, sessions, write_behind=False):
+    """Return per-turn latencies (seconds), indexed by turn number - 1, over all sessions."""
+    latencies = [[] for _ in range(turns)]
+    Config.LOG_WRITE_BEHIND_ENABLED = write_behind
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Config.LOG_DIR = Path(tmpdir)
+        Config.SESSION_LOG_DIR = Config.LOG_DIR / "session_logs"
+        Config.ACTIVE_SESSION_DIR = Config.SESSION_LOG_DIR / "active"
+        Config.COMPLETED_SESSION_DIR = Config.SESSION_LOG_DIR / "completed"
+        Config.ACTIVE_SESSION_DIR.mkdir(parents=True)
+        Config.COMPLETED_SESSION_DIR.mkdir(parents=True)
+
+        logger = SessionLogger()
+        for _ in range(sessions):
+            session_id = logger.create_session("192.168.xxx.xxx")
+            for i in range(turns):
+                started = time.perf_counter()
+                logger.log_conversation(session_id, "ai", f"How many drinks is too many? ({i})",
+                                        BOT_REPLY, "192.168.xxx.xxx", risk_score=3,
+                                        conversation_context={"party_scenario": 1})
+                latencies[i].append(time.perf_counter() - started)
+        log_writer.flush()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--turns", type=int, default=1000, help="turns per session")
+    parser.add_argument("--sessions", type=int, default=3, help="sessions to average over")
+    parser.add_argument("--write-behind", action="store_true",
+                        help="queue writes on the background writer (times the enqueue, not the disk write)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    latencies = run(args.turns, args.sessions, args.write_behind)
+    results = []
+    for low, high in buckets(args.turns):
+        samples = [lat for turn in latencies[low - 1:high] for lat in turn]
+        result = {
+            "turns": f"{low}-{high}",
+            "median_us": round(statistics.median(samples) * 1e6, 1),
+            "p95_us": round(sorted(samples)[int(len(samples) * 0.95) - 1] * 1e6, 1),
+        }
+        results.append(result)
+        print(f"turns {result['turns']:>10}: median {result['median_us']:>10} us  p95 {result['p95_us']:>10} us")
+
+    growth = results[-1]["median_us"] / results[0]["median_us"]
+    print(f"last/first bucket median: {growth:.2f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"buckets": results, "growth": round(growth, 2)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory held per 1,000 active sessions by SessionLogger
+
+Opens --sessions sessions and logs --turns turns into each (with the chat
+history and assessment answers the frontend sends), then reports how much
+the process RSS grew, per 1,000 active sessions, in a fresh process per mode:
+
+  dicts    the previous representation: every turn kept in memory as the
+           dict of 11 CSV fields, JSON payloads included
+  compact  the current ActiveSession record (turn count and lock; turn contents
+           live in the session store)
+
+Usage:
+    python benchmarks/bench_session_memory.py --sessions 1000 --turns 10
+    python benchmarks/bench_session_memory.py --sessions 5000 --output memory.json
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ.setdefault('LOG_TO_CONSOLE', 'False')
+
+from config import Config  # noqa: E402
+
+BOT_REPLY = ("That's a great question! A standard drink is about 14 grams of alcohol, so pacing "
+             "yourself with water in between and eating beforehand really helps. ")
+ANSWERS = {f"q{n}": {"answer": "2-3 times a month", "score": n % 4} for n in range(10)}
+
+
+def _use_log_dir(path):
+    """Point the session log directories at path."""
+    Config.LOG_DIR = Path(path)
+    Config.SESSION_LOG_DIR = Config.LOG_DIR / "session_logs"
+    Config.ACTIVE_SESSION_DIR = Config.SESSION_LOG_DIR / "active"
+    Config.COMPLETED_SESSION_DIR = Config.SESSION_LOG_DIR / "completed"
+    Config.ACTIVE_SESSION_DIR.mkdir(parents=True, exist_ok=True)
+    Config.COMPLETED_SESSION_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def current_rss_kb():
+    """Resident set size of this process now (Linux), else the peak so far."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(mode, sessions, turns, data_dir):
+    """Open the sessions in this process and return the memory they hold."""
+    _use_log_dir(data_dir)
+    Config.SESSION_MAX_RESIDENT = 0  # keep every session resident
+    Config.SESSION_IDLE_TIMEOUT = 0
+    from logger.session_logger import SessionLogger
+    from logger.write_behind import log_writer
+
+    logger = SessionLogger()
+    rows = defaultdict(list)
+    if mode == "dicts":
+        # Keep the row dicts the store is handed, as the logger used to
+        append_turn = logger.store.append_turn
+
+        def keep_rows(session_id, entry):
+            rows[session_id].append(entry)
+            return append_turn(session_id, entry)
+        logger.store.append_turn = keep_rows
+
+    # Warm up imports, the writer thread and the manifest before the baseline
+    logger.log_conversation(logger.create_session("192.168.xxx.xxx"), "ai", "warm up", BOT_REPLY, "192.168.xxx.xxx")
+    log_writer.flush()
+    rows.clear()
+    gc.collect()
+    baseline_kb = current_rss_kb()
+
+    started = time.perf_counter()
+    for n in range(sessions):
+        session_id = logger.create_session("192.168.xxx.xxx")
+        history = []
+        for i in range(turns):
+            message = f"How many drinks is too many? ({n}/{i})"
+            logger.log_conversation(session_id, "ai", message, BOT_REPLY, "192.168.xxx.xxx", risk_score=i % 20,
+                                    conversation_context={"party_scenario": 1, "assessment_answers": ANSWERS,
+                                                          "chat_history": list(history)})
+            history += [{"role": "user", "content": message}, {"role": "assistant", "content": BOT_REPLY}]
+        if n % 500 == 499:
+            log_writer.flush()  # as the writer thread would keep up on a live server
+    log_writer.flush()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+
+    growth_kb = current_rss_kb() - baseline_kb
+    resident_bytes = logger.get_stats()["resident_bytes"] + sum(
+        sys.getsizeof(turns) + sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+                                   for row in turns)
+        for turns in rows.values())
+    return {
+        "mode": mode,
+        "sessions": sessions,
+        "turns": turns,
+        "rss_growth_mb": round(growth_kb / 1024, 1),
+        "rss_per_1000_sessions_mb": round(growth_kb / 1024 / sessions * 1000, 2),
+        "resident_bytes": resident_bytes,
+        "seconds": round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sessions", type=int, default=1000, help="active sessions to open")
+    parser.add_argument("--turns", type=int, default=10, help="turns per session")
+    parser.add_argument("--modes", nargs="+", choices=["dicts", "compact"], default=["dicts", "compact"])
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--child", choices=["dicts", "compact"], help=argparse.SUPPRESS)
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.sessions, args.turns, args.data)))
+        return
+
+    results = []
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # A fresh process per mode, so memory is not inherited
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", mode, "--data", tmpdir,
+                 "--sessions", str(args.sessions), "--turns", str(args.turns)],
+                capture_output=True, text=True, check=True,
+            )
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{mode:>8}: RSS +{result['rss_growth_mb']:>8.1f} MB  "
+              f"{result['rss_per_1000_sessions_mb']:>8.2f} MB per 1,000 sessions  "
+              f"resident_bytes {result['resident_bytes']:>12,}  ({result['seconds']}s)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"sessions": args.sessions, "turns": args.turns, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
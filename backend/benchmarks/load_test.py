@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Load test: per-route throughput and latency for the Flask app over HTTP
+
+Serves create_app() from a threaded WSGI server (or targets --url) with the
+LLM replaced by the local stub server. Virtual users walk the option graph
+in assessment_data.json via /api/get_assessment_step, summing option scores
+into a risk score, then hold a few chat turns on POST / in the same cookie
+session. Meanwhile admin readers poll /sessions and /download, as the
+session management page does while students are chatting. The response
+caches and request coalescing are off, so every chat turn measures a full
+upstream round trip.
+
+Reports throughput and p50/p95/p99 per route, each the median over
+--repeat runs. With --check the run fails (exit code 1) when a route's p95
+or throughput is more than --tolerance worse than the stored baseline (p95
+also by more than --min-delta-ms), or its error rate grew. Baselines depend
+on the machine; record one with --save-baseline before comparing.
+
+Usage:
+    python benchmarks/load_test.py --users 80 --concurrency 10 --chat-turns 3
+    python benchmarks/load_test.py --save-baseline
+    python benchmarks/load_test.py --check --tolerance 0.3
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ.setdefault('OPENAI_API_KEY', 'bench-key')
+os.environ.setdefault('OPENAI_MAX_RETRIES', '0')
+os.environ.setdefault('LOG_TO_CONSOLE', 'False')
+# Every chat turn must reach the stub: the message set is small and repeats
+os.environ.setdefault('RESPONSE_CACHE_ENABLED', 'False')
+os.environ.setdefault('SEMANTIC_CACHE_ENABLED', 'False')
+os.environ.setdefault('REQUEST_COALESCING_ENABLED', 'False')
+
+from benchmarks.stub_llm_server import StubLLMServer  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "load_test.json"
+CHATBOT_TYPES = ["ai", "student", "doctor"]
+CHAT_MESSAGES = [
+    "What counts as one standard drink?",
+    "How can I say no to drinks at a party without feeling awkward?",
+    "Is it safe to drink if I have an exam tomorrow?",
+    "My friend drank way too much last night, what should I have done?",
+    "Why do I feel so anxious the day after drinking?",
+    "How long does alcohol stay in my system?",
+]
+
+
+class RouteStats:
+    """Thread-safe latency and status samples per route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route, latency, ok):
+        with self._lock:
+            self.latencies[route].append(latency)
+            if not ok:
+                self.errors[route] += 1
+
+    def summarize(self, elapsed):
+        """Return {route: metrics} for the whole run."""
+        results = {}
+        for route, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            results[route] = {
+                "requests": len(latencies),
+                "errors": self.errors[route],
+                "error_rate": round(self.errors[route] / len(latencies), 4),
+                "throughput_rps": round(len(latencies) / elapsed, 1),
+                "p50_ms": round(statistics.median(latencies) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            }
+        return results
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, -(-len(sorted_values) * pct // 100) - 1)
+    return sorted_values[int(index)]
+
+
+class VirtualUser:
+    """One browser: its own cookie session, walking the assessment then chatting."""
+
+    def __init__(self, base_url, stats, steps, rng):
+        self.base_url = base_url
+        self.stats = stats
+        self.steps = steps
+        self.rng = rng
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def request(self, route, path=None, payload=None, headers=None):
+        """Send one request, record its latency, and return (status, body)."""
+        body = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(self.base_url + (path or route), data=body, headers=headers or {})
+        if body is not None:
+            req.add_header("Content-Type", "application/json")
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                status, data = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, data = e.code, e.read()
+        except OSError:
+            status, data = 0, b""
+        self.stats.record(route, time.perf_counter() - started, 200 <= status < 400)
+        return status, data
+
+    def walk_assessment(self, max_steps=40):
+        """Follow random options from step "0" until the walk ends; returns the risk score."""
+        step_key, score = "0", 0
+        for _ in range(max_steps):
+            status, data = self.request("/api/get_assessment_step", payload={"stepKey": step_key})
+            if status != 200:
+                break
+            options = json.loads(data).get("options") or []
+            if not options:
+                break
+            option = self.rng.choice(options)
+            score += option.get("score", 0)
+            if option.get("end") or option.get("next") not in self.steps:
+                break
+            step_key = option["next"]
+        return score
+
+    def chat(self, turns, risk_score):
+        chatbot_type = self.rng.choice(CHATBOT_TYPES)
+        for _ in range(turns):
+            self.request("/", payload={
+                "message": self.rng.choice(CHAT_MESSAGES),
+                "chatbot_type": chatbot_type,
+                "risk_score": risk_score,
+            })
+
+
+def run_load(base_url, users, concurrency, chat_turns, admin_readers, admin_auth, seed, warmup_users=0):
+    """Run the traffic mix and return (per-route results, elapsed seconds).
+
+    The first warmup_users sessions run before timing starts, so one-off
+    costs (client creation, lazy loading) do not land in the percentiles.
+    """
+    from config import current_config
+    with open(current_config().ASSESSMENT_DATA_FILE, "r", encoding="utf-8") as f:
+        steps = json.load(f)
+
+    for i in range(warmup_users):
+        user = VirtualUser(base_url, RouteStats(), steps, random.Random(seed - i - 1))
+        user.chat(chat_turns, user.walk_assessment())
+
+    stats = RouteStats()
+    first_chat = threading.Event()
+    done = threading.Event()
+
+    def user_session(i):
+        user = VirtualUser(base_url, stats, steps, random.Random(seed * 100003 + i))
+        risk_score = user.walk_assessment()
+        user.chat(chat_turns, risk_score)
+        first_chat.set()
+
+    def admin_reader(i):
+        reader = VirtualUser(base_url, stats, steps, random.Random(seed + i))
+        headers = {"Authorization": "Basic " + base64.b64encode(admin_auth.encode()).decode()}
+        # /download is a 404 until some session has been logged
+        while not first_chat.wait(0.05):
+            if done.is_set():
+                return
+        while not done.is_set():
+            reader.request("/sessions", headers=headers)
+            reader.request("/download")
+            time.sleep(0.02)
+
+    started = time.perf_counter()
+    readers = [threading.Thread(target=admin_reader, args=(i,), daemon=True) for i in range(admin_readers)]
+    for thread in readers:
+        thread.start()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(user_session, range(users)))
+    done.set()
+    for thread in readers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return stats.summarize(elapsed), elapsed
+
+
+def median_results(runs):
+    """Combine per-route results of repeated runs, taking the median of each metric."""
+    routes = sorted({route for run in runs for route in run})
+    combined = {}
+    for route in routes:
+        samples = [run[route] for run in runs if route in run]
+        combined[route] = {
+            key: round(statistics.median(sample[key] for sample in samples), 4 if key == "error_rate" else 1)
+            for key in samples[0]
+        }
+    return combined
+
+
+def compare(results, baseline, tolerance, min_delta_ms=0.0):
+    """Return a list of regression messages (empty when within tolerance)."""
+    regressions = []
+    for route, base in baseline.get("routes", {}).items():
+        current = results.get(route)
+        if current is None:
+            regressions.append(f"{route}: no requests in this run")
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance) and \
+                current["p95_ms"] - base["p95_ms"] > min_delta_ms:
+            regressions.append(f"{route}: p95 {current['p95_ms']} ms > baseline {base['p95_ms']} ms")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{route}: {current['throughput_rps']} req/s < baseline {base['throughput_rps']} req/s"
+            )
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{route}: error rate {current['error_rate']} > baseline {base['error_rate']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=80, help="virtual users (assessment walk + chat)")
+    parser.add_argument("--concurrency", type=int, default=10, help="users active at once")
+    parser.add_argument("--chat-turns", type=int, default=3, help="chat turns per user")
+    parser.add_argument("--admin-readers", type=int, default=2, help="threads polling /sessions and /download")
+    parser.add_argument("--latency", type=float, default=0.1, help="stub LLM time to first token in seconds")
+    parser.add_argument("--repeat", type=int, default=3, help="runs to take the median over")
+    parser.add_argument("--warmup-users", type=int, default=2, help="untimed sessions run first")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--url", help="load an already running app instead of serving create_app()")
+    parser.add_argument("--stub-url", help="use an already running stub server instead of starting one")
+    parser.add_argument("--admin", default="admin:admin", help="user:password for /sessions")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="baseline JSON file")
+    parser.add_argument("--check", action="store_true", help="fail if results regress beyond the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative regression")
+    parser.add_argument("--min-delta-ms", type=float, default=25.0, help="ignore smaller p95 increases")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    stub = None
+    if args.stub_url:
+        os.environ['OPENAI_BASE_URL'] = args.stub_url
+    elif not args.url:
+        stub = StubLLMServer(latency=args.latency, seed=args.seed).start()
+        os.environ['OPENAI_BASE_URL'] = stub.base_url
+
+    from config import Config
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server = None
+        base_url = args.url
+        if not base_url:
+            from werkzeug.serving import WSGIRequestHandler, make_server
+
+            class QuietHandler(WSGIRequestHandler):
+                def log_request(self, *args, **kwargs):
+                    pass
+
+            # Keep load-test session logs out of the real log directory
+            Config.LOG_DIR = Path(tmpdir) / "logs"
+            Config.SESSION_LOG_DIR = Config.LOG_DIR / "session_logs"
+            Config.ACTIVE_SESSION_DIR = Config.SESSION_LOG_DIR / "active"
+            Config.COMPLETED_SESSION_DIR = Config.SESSION_LOG_DIR / "completed"
+
+            from app import create_app
+            server = make_server("127.0.0.1", 0, create_app(), threaded=True, request_handler=QuietHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_port}"
+
+        print(f"{args.users} users x {args.chat_turns} chat turns, concurrency {args.concurrency}, "
+              f"stub latency {args.latency * 1000:.0f} ms")
+        runs = []
+        for i in range(args.repeat):
+            run, elapsed = run_load(base_url, args.users, args.concurrency, args.chat_turns,
+                                    args.admin_readers, args.admin, args.seed, args.warmup_users)
+            print(f"Run {i + 1}: {sum(r['requests'] for r in run.values())} requests in {elapsed:.2f} s")
+            runs.append(run)
+        results = median_results(runs)
+        if server:
+            server.shutdown()
+            from logger.write_behind import log_writer
+            log_writer.flush()
+    if stub:
+        stub.shutdown()
+
+    print(f"{'route':<26}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, r in results.items():
+        print(f"{route:<26}{r['requests']:>9}{r['errors']:>8}{r['throughput_rps']:>9}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
+
+    report = {
+        "params": {key: getattr(args, key) for key in ("users", "concurrency", "chat_turns", "admin_readers",
+                                                       "latency", "seed", "warmup_users", "repeat")},
+        "routes": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        Path(args.baseline).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.check:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != report["params"]:
+            print("Warning: baseline was recorded with different parameters")
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("❌ Performance regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"✅ Within {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
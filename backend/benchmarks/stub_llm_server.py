@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stub server for benchmarks
+
+Speaks POST /v1/chat/completions, both plain and streamed (SSE), so the
+real Chatbot / AsyncChatbot code path can be measured without network
+access. Point the backend at it with OPENAI_BASE_URL.
+
+Each request waits a time-to-first-token drawn from a latency
+distribution, then produces a deterministic reply (the same messages
+always get the same text) at a configurable token rate. A fraction of
+requests can be answered with 429 (with Retry-After) or 500 instead.
+
+Usage:
+    python benchmarks/stub_llm_server.py --port 8765 --latency 0.3 --distribution lognormal --jitter 0.5
+    python benchmarks/stub_llm_server.py --tokens-per-second 50 --rate-limit-rate 0.05 --error-rate 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python main.py
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Word pool the deterministic replies are built from
+REPLY_WORDS = (
+    "a standard drink is about ten grams of alcohol so it helps to count drinks "
+    "pace yourself with water between rounds eat before you go out and plan a safe "
+    "way home if you are worried about a friend stay with them and call for help "
+    "low risk drinking means no more than two drinks on any day and some alcohol free days"
+).split()
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+def deterministic_reply(messages, max_tokens, reply_tokens):
+    """Build the reply words for a conversation; returns (words, finish_reason)."""
+    digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).digest()
+    rng = random.Random(digest)
+    words = [rng.choice(REPLY_WORDS) for _ in range(reply_tokens)]
+    words[0] = words[0].capitalize()
+    if max_tokens is not None and max_tokens < len(words):
+        return words[:max_tokens], "length"
+    words[-1] += "."
+    return words, "stop"
+
+
+def count_prompt_tokens(messages):
+    """Rough prompt size: whitespace-separated words plus a few per message."""
+    return sum(len(str(m.get("content", "")).split()) + 4 for m in messages)
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Answers chat completion requests the way the OpenAI API would."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_error(404, "Unknown endpoint", "invalid_request_error")
+            return
+        try:
+            request = json.loads(raw or b"{}")
+        except ValueError:
+            self._send_error(400, "Request body is not valid JSON", "invalid_request_error")
+            return
+
+        server = self.server
+        outcome = server.draw_outcome()
+        time.sleep(server.draw_latency())
+        if outcome == "rate_limited":
+            self._send_error(429, "Rate limit reached (stub)", "rate_limit_error",
+                             code="rate_limit_exceeded",
+                             headers={"Retry-After": str(server.retry_after)})
+            return
+        if outcome == "error":
+            self._send_error(500, "The server had an error (stub)", "server_error")
+            return
+
+        messages = request.get("messages", [])
+        words, finish_reason = deterministic_reply(
+            messages, request.get("max_tokens"), server.reply_tokens
+        )
+        usage = {
+            "prompt_tokens": count_prompt_tokens(messages),
+            "completion_tokens": len(words),
+            "total_tokens": count_prompt_tokens(messages) + len(words),
+        }
+        model = request.get("model", "stub")
+
+        if request.get("stream"):
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            self._stream(model, words, finish_reason, usage if include_usage else None)
+            server.count("streamed")
+        else:
+            server.sleep_tokens(len(words))
+            self._send_json(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": usage,
+            })
+            server.count("completed")
+
+    def _stream(self, model, words, finish_reason, usage):
+        """Send the reply as server-sent events, one word per chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        created = int(time.time())
+
+        def chunk(choices, **extra):
+            return {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created,
+                    "model": model, "choices": choices, **extra}
+
+        self._write_event(chunk([{"index": 0, "delta": {"role": "assistant", "content": ""},
+                                  "finish_reason": None}]))
+        for i, word in enumerate(words):
+            self.server.sleep_tokens(1)
+            content = word if i == 0 else " " + word
+            self._write_event(chunk([{"index": 0, "delta": {"content": content}, "finish_reason": None}]))
+        self._write_event(chunk([{"index": 0, "delta": {}, "finish_reason": finish_reason}]))
+        if usage is not None:
+            self._write_event(chunk([], usage=usage))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, payload):
+        self._write_chunk(b"data: " + json.dumps(payload).encode() + b"\n\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, error_type, code=None, headers=None):
+        self.server.count("rate_limited" if status == 429 else "errors")
+        self._send_json(status, {"error": {"message": message, "type": error_type,
+                                           "param": None, "code": code}}, headers)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """Threaded stub server; use start() to serve from a background thread.
+
+    Args:
+        latency: Time to first token in seconds (the median for lognormal,
+            the mean for exponential).
+        distribution: One of fixed, uniform, exponential or lognormal.
+        jitter: Spread of the distribution: +/- seconds for uniform, sigma
+            for lognormal; ignored otherwise.
+        tokens_per_second: Generation speed after the first token; 0 sends
+            the whole reply at once.
+        reply_tokens: Words per reply before max_tokens truncation.
+        rate_limit_rate: Fraction of requests answered with 429.
+        error_rate: Fraction of requests answered with 500.
+        retry_after: Retry-After seconds sent with 429s.
+        seed: Seed for latency and error draws, for repeatable runs.
+
+    The injection settings are plain attributes and may be changed while
+    the server is running.
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, distribution="fixed", jitter=0.0,
+                 tokens_per_second=0.0, reply_tokens=40, rate_limit_rate=0.0, error_rate=0.0,
+                 retry_after=1, seed=None):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        super().__init__((host, port), StubLLMHandler)
+        self.latency = latency
+        self.distribution = distribution
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"completed": 0, "streamed": 0, "rate_limited": 0, "errors": 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def draw_latency(self):
+        """Time to first token for one request."""
+        with self._lock:
+            if self.distribution == "uniform":
+                delay = self._rng.uniform(self.latency - self.jitter, self.latency + self.jitter)
+            elif self.distribution == "exponential":
+                delay = self._rng.expovariate(1.0 / self.latency) if self.latency > 0 else 0.0
+            elif self.distribution == "lognormal":
+                delay = self._rng.lognormvariate(math.log(self.latency), self.jitter) if self.latency > 0 else 0.0
+            else:
+                delay = self.latency
+        return max(0.0, delay)
+
+    def draw_outcome(self):
+        """Decide whether a request succeeds, is rate limited or fails."""
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            return "rate_limited"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error"
+        return "ok"
+
+    def sleep_tokens(self, count):
+        if self.tokens_per_second > 0:
+            time.sleep(count / self.tokens_per_second)
+
+    def count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="time to first token in seconds")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="+/- seconds for uniform, sigma for lognormal")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="0 = reply at once")
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 500")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = StubLLMServer(
+        args.host, args.port, latency=args.latency, distribution=args.distribution, jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens,
+        rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate,
+        retry_after=args.retry_after, seed=args.seed,
+    )
+    print(f"Stub LLM server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import asyncio
+import itertools
+import time
+
+from config import current_config
+from chatbot.bulkhead import bulkhead
+from chatbot.chatbot import Chatbot
+from chatbot.circuit_breaker import circuit_breaker
+from chatbot.client_pool import AsyncOpenAIClientPool
+from chatbot.coalescer import request_coalescer
+from chatbot.deadline import UPSTREAM_TIMEOUT_STAGE, DeadlineExceeded
+from chatbot.hedging import request_hedger
+
+
+class AsyncChatbot:
+    """Async counterpart of Chatbot for the ASGI serving path.
+
+    Shares persona prompts, scenario handling, error mapping and the circuit
+    breaker with Chatbot, but awaits the upstream call on AsyncOpenAI so a
+    single process can keep many chat turns in flight without holding a
+    thread per turn.
+    """
+
+    @classmethod
+    async def get_response(cls, chatbot_type, user_message, risk_score=None, api_key=None, conversation_context=None,
+                           deadline=None):
+        """
+        Process the user message using the specified chatbot type and return the response.
+        """
+        scenario_response = Chatbot._get_scenario_response(user_message, conversation_context)
+        if scenario_response is not None:
+            return scenario_response
+
+        api_key = Chatbot._resolve_api_key(api_key)
+        client = AsyncOpenAIClientPool.get_client(api_key)
+        request_params = Chatbot._build_request_params(chatbot_type, user_message)
+
+        cached = Chatbot._cached_response(user_message, request_params)
+        if cached is not None:
+            return cached
+
+        async def fetch():
+            # Fail fast with a local answer while OpenAI is degraded
+            if not circuit_breaker.allow_request():
+                return Chatbot._fallback_response(chatbot_type, user_message, request_params)
+            content = await cls._guarded_complete(client, request_params, chatbot_type, deadline)
+            Chatbot._cache_response(user_message, request_params, content)
+            return content
+
+        # Identical concurrent questions share one upstream request
+        return await request_coalescer.call_async(Chatbot._request_key(user_message, request_params), fetch)
+
+    @classmethod
+    async def _guarded_complete(cls, client, request_params, chatbot_type, deadline=None):
+        """Run _complete inside the bulkhead, reporting the outcome to the breaker and AIMD limit."""
+        async with await bulkhead.admit_async(chatbot_type, Chatbot._queue_timeout(deadline)) as permit:
+            started = time.perf_counter()
+            try:
+                response, sent = await request_hedger.call_async(lambda: cls._send(client, request_params, deadline))
+                content = Chatbot._finish(chatbot_type, request_params, response, sent)
+            except DeadlineExceeded as e:
+                # A hung upstream that used up the deadline still counts against the breaker
+                if e.stage == UPSTREAM_TIMEOUT_STAGE:
+                    circuit_breaker.record_failure(time.perf_counter() - started)
+                raise
+            except RuntimeError as e:
+                if Chatbot._is_upstream_failure(e):
+                    circuit_breaker.record_failure(time.perf_counter() - started)
+                permit.throttled = Chatbot._is_rate_limited(e)
+                raise
+            circuit_breaker.record_success(time.perf_counter() - started)
+            permit.succeeded = True
+            return content
+
+    @classmethod
+    async def _complete(cls, client, request_params, chatbot_type=None, deadline=None):
+        """Send one chat completion request and return the stripped content."""
+        response, sent = await cls._send(client, request_params, deadline)
+        return Chatbot._finish(chatbot_type, request_params, response, sent)
+
+    @classmethod
+    async def _send(cls, client, request_params, deadline=None):
+        """Send one chat completion request; returns the response and when it was sent."""
+        try:
+            sent = time.perf_counter()
+            return await cls._create_completion(client, request_params, deadline), sent
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            raise Chatbot._api_error(e) from e
+
+    @classmethod
+    async def _create_completion(cls, client, request_params, deadline=None):
+        """Call the API, retrying transient errors within the deadline (see Chatbot._create_completion)."""
+        if deadline is None:
+            return await client.chat.completions.create(**request_params)
+
+        config = current_config()
+        for attempt in itertools.count():
+            timeout = deadline.timeout(config.OPENAI_TIMEOUT)
+            try:
+                # wait_for also cancels the attempt if the connection stalls past the budget
+                return await asyncio.wait_for(
+                    client.with_options(timeout=timeout, max_retries=0).chat.completions.create(**request_params),
+                    timeout,
+                )
+            except Exception as e:
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                if timed_out and deadline.expired:
+                    raise DeadlineExceeded(UPSTREAM_TIMEOUT_STAGE, deadline.budget) from e
+                # Only the per-attempt OPENAI_TIMEOUT cap ran out: a transient upstream failure
+                backoff = Chatbot._retry_backoff(attempt)
+                if (attempt >= config.OPENAI_MAX_RETRIES or not (timed_out or Chatbot._is_retryable(e))
+                        or deadline.remaining() <= backoff):
+                    raise
+                await asyncio.sleep(backoff)
@@ -0,0 +1,275 @@
+"""
+Bulkhead admission control with adaptive (AIMD) limits for upstream LLM calls
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+from config import current_config
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a chat turn cannot get an upstream slot in time."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """A queued caller; woken with a slot already handed to it."""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class _Lane:
+    """Concurrency limit, in-flight count and FIFO wait queue for one chatbot type."""
+
+    def __init__(self, max_limit: int, min_limit: int):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.waiters = deque()
+        self.stats = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_full": 0,
+            "rejected_timeout": 0,
+            "throttled": 0,
+            "max_queue_depth": 0,
+            "total_wait_s": 0.0,
+            "max_wait_s": 0.0,
+        }
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < math.floor(self.limit)
+
+
+class Permit:
+    """A held upstream slot; release it once the call has finished.
+
+    Set ``succeeded`` or ``throttled`` (or pass them to release()) to report
+    the call's outcome: only successes grow the adaptive limit and 429s
+    shrink it; any other outcome leaves it unchanged.
+    """
+
+    def __init__(self, bulkhead: "Bulkhead", chatbot_type: str):
+        self._bulkhead = bulkhead
+        self.chatbot_type = chatbot_type
+        self.throttled = False
+        self.succeeded = False
+        self._released = False
+
+    def release(self, throttled: Optional[bool] = None, succeeded: Optional[bool] = None):
+        """Free the slot, feeding the outcome into the adaptive limit (idempotent)."""
+        if self._released:
+            return
+        self._released = True
+        if throttled is not None:
+            self.throttled = throttled
+        if succeeded is not None:
+            self.succeeded = succeeded
+        self._bulkhead._release(self.chatbot_type, self.throttled, self.succeeded)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class Bulkhead:
+    """Bounds concurrent upstream calls per chatbot type.
+
+    Each chatbot type gets its own lane with at most BULKHEAD_LIMITS[type]
+    (or BULKHEAD_MAX_CONCURRENT) calls in flight. Callers beyond that wait in
+    a short FIFO queue of BULKHEAD_QUEUE_SIZE for up to
+    BULKHEAD_QUEUE_TIMEOUT seconds; a full queue or an expired wait is
+    rejected immediately with AdmissionRejected, which routes turn into a 503
+    with Retry-After. The limit adapts (AIMD): it is multiplied by
+    BULKHEAD_DECREASE_FACTOR when OpenAI answers 429, and grows back by
+    1/limit per successful call up to the configured maximum. Other
+    failures leave it unchanged.
+    """
+
+    def __init__(self):
+        self.config = current_config()
+        self._lock = threading.Lock()
+        self._lanes: Dict[str, _Lane] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.BULKHEAD_ENABLED
+
+    def _get_lane(self, chatbot_type: str) -> _Lane:
+        lane = self._lanes.get(chatbot_type)
+        if lane is None:
+            max_limit = self.config.BULKHEAD_LIMITS.get(chatbot_type, self.config.BULKHEAD_MAX_CONCURRENT)
+            lane = _Lane(max_limit, self.config.BULKHEAD_MIN_CONCURRENT)
+            self._lanes[chatbot_type] = lane
+        return lane
+
+    def _try_enter(self, chatbot_type: str, loop=None):
+        """Take a slot, or enqueue a waiter; returns (permit, waiter)."""
+        lane = self._get_lane(chatbot_type)
+        if lane.has_capacity() and not lane.waiters:
+            lane.in_flight += 1
+            lane.stats["admitted"] += 1
+            return Permit(self, chatbot_type), None
+        if len(lane.waiters) >= self.config.BULKHEAD_QUEUE_SIZE:
+            lane.stats["rejected_full"] += 1
+            raise self._rejection(chatbot_type, "queue full")
+        waiter = _Waiter(loop)
+        lane.waiters.append(waiter)
+        lane.stats["queued"] += 1
+        lane.stats["max_queue_depth"] = max(lane.stats["max_queue_depth"], len(lane.waiters))
+        return None, waiter
+
+    def _finish_wait(self, chatbot_type: str, waiter: _Waiter, started: float) -> Permit:
+        """Settle a waiter after waking or timing out (called with the lock held)."""
+        lane = self._get_lane(chatbot_type)
+        waited = time.perf_counter() - started
+        lane.stats["total_wait_s"] += waited
+        lane.stats["max_wait_s"] = max(lane.stats["max_wait_s"], waited)
+        if waiter.granted:
+            lane.stats["admitted"] += 1
+            return Permit(self, chatbot_type)
+        lane.waiters.remove(waiter)
+        lane.stats["rejected_timeout"] += 1
+        raise self._rejection(chatbot_type, "queue timeout")
+
+    def _wait_timeout(self, timeout: Optional[float]) -> float:
+        """Queue wait, shortened to the caller's own remaining time if given."""
+        if timeout is None:
+            return self.config.BULKHEAD_QUEUE_TIMEOUT
+        return min(self.config.BULKHEAD_QUEUE_TIMEOUT, timeout)
+
+    def admit(self, chatbot_type: str, timeout: Optional[float] = None) -> Permit:
+        """Wait (briefly) for an upstream slot; raises AdmissionRejected on overflow."""
+        if not self.enabled:
+            return Permit(_NO_BULKHEAD, chatbot_type)
+        with self._lock:
+            permit, waiter = self._try_enter(chatbot_type)
+        if permit is not None:
+            return permit
+
+        started = time.perf_counter()
+        waiter.event.wait(self._wait_timeout(timeout))
+        with self._lock:
+            return self._finish_wait(chatbot_type, waiter, started)
+
+    async def admit_async(self, chatbot_type: str, timeout: Optional[float] = None) -> Permit:
+        """Async counterpart of admit() that waits without blocking the event loop."""
+        if not self.enabled:
+            return Permit(_NO_BULKHEAD, chatbot_type)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            permit, waiter = self._try_enter(chatbot_type, loop)
+        if permit is not None:
+            return permit
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self._wait_timeout(timeout))
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._release_locked(chatbot_type, False, False)
+                else:
+                    self._get_lane(chatbot_type).waiters.remove(waiter)
+            raise
+        with self._lock:
+            return self._finish_wait(chatbot_type, waiter, started)
+
+    def _release(self, chatbot_type: str, throttled: bool, succeeded: bool):
+        with self._lock:
+            self._release_locked(chatbot_type, throttled, succeeded)
+
+    def _release_locked(self, chatbot_type: str, throttled: bool, succeeded: bool):
+        lane = self._get_lane(chatbot_type)
+        lane.in_flight = max(0, lane.in_flight - 1)
+        if throttled:
+            # Multiplicative decrease on 429s
+            lane.stats["throttled"] += 1
+            lane.limit = max(lane.min_limit, lane.limit * self.config.BULKHEAD_DECREASE_FACTOR)
+        elif succeeded:
+            # Additive increase: roughly +1 per limit's worth of successes
+            lane.limit = min(lane.max_limit, lane.limit + 1.0 / max(lane.limit, 1.0))
+        # Timeouts, errors and cancelled calls leave the limit where it is
+        # Hand freed slots straight to queued callers, oldest first
+        while lane.waiters and lane.has_capacity():
+            waiter = lane.waiters.popleft()
+            lane.in_flight += 1
+            waiter.wake()
+
+    def _rejection(self, chatbot_type: str, reason: str) -> AdmissionRejected:
+        return AdmissionRejected(
+            f"The {chatbot_type} chatbot is busy ({reason}). Please try again shortly.",
+            self.config.BULKHEAD_RETRY_AFTER,
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-lane limits, in-flight counts, queue depth and wait-time metrics."""
+        with self._lock:
+            stats = {}
+            for chatbot_type, lane in self._lanes.items():
+                lane_stats = dict(lane.stats)
+                queued = lane_stats["queued"]
+                lane_stats.update({
+                    "limit": round(lane.limit, 2),
+                    "max_limit": lane.max_limit,
+                    "in_flight": lane.in_flight,
+                    "queue_depth": len(lane.waiters),
+                    "avg_wait_s": round(lane_stats["total_wait_s"] / queued, 4) if queued else 0.0,
+                    "total_wait_s": round(lane_stats["total_wait_s"], 4),
+                    "max_wait_s": round(lane_stats["max_wait_s"], 4),
+                })
+                stats[chatbot_type] = lane_stats
+        return stats
+
+    def reset(self):
+        """Forget every lane (in-flight permits are released harmlessly)."""
+        with self._lock:
+            self._lanes = {}
+
+
+class _NoBulkhead:
+    """Release target for permits handed out while the bulkhead is disabled."""
+
+    def _release(self, chatbot_type, throttled, succeeded):
+        pass
+
+
+_NO_BULKHEAD = _NoBulkhead()
+
+# Global instance
+bulkhead = Bulkhead()
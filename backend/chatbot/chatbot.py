@@ -1,42 +1,346 @@
-from openai import OpenAI
+import itertools
+import time
+
+import httpx
+from openai import APIConnectionError, APIError, APIStatusError, APITimeoutError
+
 from config import current_config
+from chatbot.bulkhead import bulkhead
+from chatbot.circuit_breaker import circuit_breaker
+from chatbot.client_pool import OpenAIClientPool
+from chatbot.coalescer import request_coalescer
+from chatbot.deadline import UPSTREAM_TIMEOUT_STAGE, DeadlineExceeded
+from chatbot.fallback import fallback_responder
+from chatbot.hedging import request_hedger
+from chatbot.response_cache import response_cache
+from chatbot.scenarios import scenario_registry
+from chatbot.token_budget import token_budget
+from chatbot.semantic_cache import semantic_cache
 
 
 class Chatbot:
     @classmethod
-    def get_response(cls, chatbot_type, user_message, risk_score=None, api_key=None, conversation_context=None):
+    def get_response(cls, chatbot_type, user_message, risk_score=None, api_key=None, conversation_context=None,
+                     deadline=None):
         """
         Process the user message using the specified chatbot type and return the response.
+
+        When a Deadline is given, work stops with DeadlineExceeded once it has
+        passed, and each upstream attempt only gets the time that is left.
         """
         
         # Check if this is a response to the party scenario
+        scenario_response = cls._get_scenario_response(user_message, conversation_context)
+        if scenario_response is not None:
+            return scenario_response
+
+        client, request_params = cls._prepare_request(chatbot_type, user_message, api_key)
+
+        # Serve repeated and paraphrased questions from the response caches
+        cached = cls._cached_response(user_message, request_params)
+        if cached is not None:
+            return cached
+
+        def fetch():
+            # Fail fast with a local answer while OpenAI is degraded
+            if not circuit_breaker.allow_request():
+                return cls._fallback_response(chatbot_type, user_message, request_params)
+            content = cls._guarded_complete(client, request_params, chatbot_type, deadline)
+            cls._cache_response(user_message, request_params, content)
+            return content
+
+        # Identical concurrent questions share one upstream request
+        return request_coalescer.call(cls._request_key(user_message, request_params), fetch)
+
+    @classmethod
+    def stream_response(cls, chatbot_type, user_message, risk_score=None, api_key=None, conversation_context=None,
+                        deadline=None):
+        """
+        Process the user message and return an iterator over response text chunks.
+
+        The upstream request is opened before this method returns, so connection
+        and authentication failures raise here rather than mid-stream. With a
+        Deadline, the stream is cut off with DeadlineExceeded once it passes.
+        """
+        scenario_response = cls._get_scenario_response(user_message, conversation_context)
+        if scenario_response is not None:
+            return iter([scenario_response])
+
+        client, request_params = cls._prepare_request(chatbot_type, user_message, api_key)
+
+        cached = cls._cached_response(user_message, request_params)
+        if cached is not None:
+            return iter([cached])
+
+        if not circuit_breaker.allow_request():
+            return iter([cls._fallback_response(chatbot_type, user_message, request_params)])
+
+        # The slot is held until the stream has been fully consumed
+        permit = bulkhead.admit(chatbot_type, cls._queue_timeout(deadline))
+        started = time.perf_counter()
+        try:
+            if deadline is not None:
+                client = client.with_options(timeout=deadline.timeout(current_config().OPENAI_TIMEOUT))
+            stream = client.chat.completions.create(
+                stream=True, stream_options={"include_usage": True}, **request_params
+            )
+        except DeadlineExceeded:
+            permit.release()
+            raise
+        except Exception as e:
+            if cls._is_upstream_failure(e):
+                circuit_breaker.record_failure(time.perf_counter() - started)
+            permit.release(throttled=getattr(e, "status_code", None) == 429)
+            if deadline is not None and cls._is_timeout(e) and deadline.expired:
+                raise DeadlineExceeded(UPSTREAM_TIMEOUT_STAGE, deadline.budget) from e
+            raise cls._api_error(e) from e
+
+        return _ResponseStream(
+            cls._iter_stream(stream, user_message, request_params, chatbot_type, started, permit, deadline),
+            stream, permit,
+        )
+
+    @classmethod
+    def _guarded_complete(cls, client, request_params, chatbot_type, deadline=None):
+        """Run _complete inside the bulkhead, reporting the outcome to the breaker and AIMD limit."""
+        with bulkhead.admit(chatbot_type, cls._queue_timeout(deadline)) as permit:
+            started = time.perf_counter()
+            try:
+                # Opt-in hedging re-sends slow requests within the same bulkhead slot;
+                # only the winning attempt's response is used and its usage recorded
+                response, sent = request_hedger.call(lambda: cls._send(client, request_params, deadline))
+                content = cls._finish(chatbot_type, request_params, response, sent)
+            except DeadlineExceeded as e:
+                # A hung upstream that used up the deadline still counts against the breaker
+                if e.stage == UPSTREAM_TIMEOUT_STAGE:
+                    circuit_breaker.record_failure(time.perf_counter() - started)
+                raise
+            except RuntimeError as e:
+                if cls._is_upstream_failure(e):
+                    circuit_breaker.record_failure(time.perf_counter() - started)
+                permit.throttled = cls._is_rate_limited(e)
+                raise
+            circuit_breaker.record_success(time.perf_counter() - started)
+            permit.succeeded = True
+            return content
+
+    @classmethod
+    def _complete(cls, client, request_params, chatbot_type=None, deadline=None):
+        """Send one chat completion request and return the stripped content."""
+        response, sent = cls._send(client, request_params, deadline)
+        return cls._finish(chatbot_type, request_params, response, sent)
+
+    @classmethod
+    def _send(cls, client, request_params, deadline=None):
+        """Send one chat completion request; returns the response and when it was sent."""
+        try:
+            sent = time.perf_counter()
+            return cls._create_completion(client, request_params, deadline), sent
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            raise cls._api_error(e) from e
+
+    @classmethod
+    def _finish(cls, chatbot_type, request_params, response, sent):
+        """Record the usage of a completed request and return its stripped content."""
+        try:
+            cls._record_usage(chatbot_type, request_params, response, sent)
+            content = response.choices[0].message.content
+            if content is None:
+                raise RuntimeError("No content was returned from the API.")
+            return content.strip()
+        except Exception as e:
+            raise cls._api_error(e) from e
+
+    @classmethod
+    def _create_completion(cls, client, request_params, deadline=None):
+        """Call the API, retrying transient errors within the deadline.
+
+        Without a deadline the client's own retries and timeout apply. With
+        one, retries are done here so each attempt (and each backoff) only
+        gets the remaining budget instead of a fresh OPENAI_TIMEOUT.
+        """
+        if deadline is None:
+            return client.chat.completions.create(**request_params)
+
+        config = current_config()
+        for attempt in itertools.count():
+            timeout = deadline.timeout(config.OPENAI_TIMEOUT)
+            try:
+                return client.with_options(timeout=timeout, max_retries=0).chat.completions.create(**request_params)
+            except Exception as e:
+                if cls._is_timeout(e) and deadline.expired:
+                    raise DeadlineExceeded(UPSTREAM_TIMEOUT_STAGE, deadline.budget) from e
+                backoff = cls._retry_backoff(attempt)
+                if attempt >= config.OPENAI_MAX_RETRIES or not cls._is_retryable(e) or deadline.remaining() <= backoff:
+                    raise
+                time.sleep(backoff)
+
+    @classmethod
+    def _is_timeout(cls, error):
+        """True when an upstream attempt failed because its timeout ran out."""
+        return isinstance(error, (APITimeoutError, httpx.TimeoutException, TimeoutError))
+
+    @classmethod
+    def _is_retryable(cls, error):
+        """Connection failures, timeouts, 408/409/429 and 5xx are worth retrying."""
+        if isinstance(error, APIConnectionError):
+            return True
+        status = getattr(error, "status_code", None)
+        return isinstance(status, int) and (status in (408, 409, 429) or status >= 500)
+
+    @classmethod
+    def _is_upstream_failure(cls, error):
+        """True when an error means OpenAI is unhealthy and should count against the circuit breaker.
+
+        Connection errors, timeouts, 429 and 5xx count; other 4xx (bad request,
+        auth, not found) are passed through without touching the breaker.
+        Errors wrapped by _api_error are judged by their cause.
+        """
+        if isinstance(error, RuntimeError) and error.__cause__ is not None:
+            error = error.__cause__
+        if isinstance(error, (httpx.TransportError, TimeoutError)):
+            return True
+        if isinstance(error, APIError) and not isinstance(error, APIStatusError):
+            # Connection failures, timeouts and errors reported mid-stream
+            return True
+        status = getattr(error, "status_code", None)
+        return isinstance(status, int) and (status in (408, 429) or status >= 500)
+
+    @classmethod
+    def _retry_backoff(cls, attempt):
+        """Exponential backoff between retries: 0.5s, 1s, 2s, ... up to 8s."""
+        return min(0.5 * 2 ** attempt, 8.0)
+
+    @classmethod
+    def _queue_timeout(cls, deadline):
+        """How long a turn may wait for a bulkhead slot under its deadline."""
+        if deadline is None:
+            return None
+        return deadline.timeout(stage="admission")
+
+    @classmethod
+    def _iter_stream(cls, stream, user_message=None, request_params=None, chatbot_type=None, started=None,
+                     permit=None, deadline=None):
+        """Yield non-empty content deltas from an OpenAI completion stream."""
+        parts = []
+        usage = None
+        finish_reason = None
+        try:
+            for chunk in stream:
+                # With include_usage the final chunk carries usage and no choices
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+                if deadline is not None:
+                    deadline.check("streaming")
+            if permit is not None:
+                permit.succeeded = True
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if started is not None and cls._is_upstream_failure(e):
+                circuit_breaker.record_failure(time.perf_counter() - started)
+            raise cls._api_error(e) from e
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+            if permit is not None:
+                permit.release()
+
+        if request_params is not None and started is not None:
+            circuit_breaker.record_success(time.perf_counter() - started)
+            token_budget.record(chatbot_type, request_params, usage, finish_reason, time.perf_counter() - started)
+
+        # Cache only streams that completed
+        content = "".join(parts).strip()
+        if request_params is not None and content:
+            cls._cache_response(user_message, request_params, content)
+
+    @classmethod
+    def _record_usage(cls, chatbot_type, request_params, response, started):
+        """Record the cap and reported usage of a completed (non-streamed) request."""
+        choices = getattr(response, "choices", None) or [None]
+        finish_reason = getattr(choices[0], "finish_reason", None)
+        token_budget.record(
+            chatbot_type, request_params, getattr(response, "usage", None),
+            finish_reason, time.perf_counter() - started,
+        )
+
+    @classmethod
+    def _fallback_response(cls, chatbot_type, user_message, request_params):
+        """Answer locally while the circuit breaker is open (never cached)."""
+        if not current_config().FALLBACK_ENABLED:
+            raise cls._api_error(RuntimeError("circuit breaker open"))
+        return fallback_responder.respond(chatbot_type, user_message, request_params)
+
+    @classmethod
+    def _request_key(cls, user_message, request_params):
+        """Identity of a request: persona, normalised message and model parameters."""
+        return response_cache.make_key(user_message, request_params)
+
+    @classmethod
+    def _cached_response(cls, user_message, request_params):
+        """Look a message up in the exact, then the semantic, response cache."""
+        if response_cache.enabled:
+            cached = response_cache.get(response_cache.make_key(user_message, request_params))
+            if cached is not None:
+                return cached
+        if semantic_cache.enabled:
+            namespace = semantic_cache.make_namespace(request_params)
+            return semantic_cache.get(namespace, user_message)
+        return None
+
+    @classmethod
+    def _cache_response(cls, user_message, request_params, content):
+        """Store an upstream answer in every enabled response cache."""
+        if response_cache.enabled:
+            response_cache.set(response_cache.make_key(user_message, request_params), content)
+        if semantic_cache.enabled:
+            namespace = semantic_cache.make_namespace(request_params)
+            semantic_cache.set(namespace, user_message, content)
+
+    @classmethod
+    def _get_scenario_response(cls, user_message, conversation_context):
+        """Return canned scenario feedback, or None when the message is not a scenario reply."""
         if conversation_context and "party_scenario" in conversation_context:
+            # Scenarios are compiled once from SCENARIO_DATA_FILE; unknown numbers fall through
             scenario_num = conversation_context.get("party_scenario", 1)
-            if scenario_num == 1:
-                return cls._handle_party_scenario_response(user_message)
-            elif scenario_num == 2:
-                return cls._handle_concert_scenario_response(user_message)
-            elif scenario_num == 3:
-                return cls._handle_date_scenario_response(user_message)
-    
+            return scenario_registry.respond(scenario_num, user_message)
+        return None
 
-        # Get configuration
-        config = current_config()
-        openai_config = config.get_openai_config()
-        
+    @classmethod
+    def _prepare_request(cls, chatbot_type, user_message, api_key=None):
+        """Resolve the pooled client and the chat completion parameters for a message."""
+        api_key = cls._resolve_api_key(api_key)
+
+        # Reuse the process-wide pooled client (keeps connections alive)
+        client = OpenAIClientPool.get_client(api_key)
+
+        return client, cls._build_request_params(chatbot_type, user_message)
+
+    @classmethod
+    def _resolve_api_key(cls, api_key=None):
+        """Return the provided API key or fall back to the configured one."""
         # Use provided API key or get from config
         if not api_key:
-            api_key = openai_config['api_key']
+            api_key = current_config().OPENAI_API_KEY
         
         if not api_key:
             raise ValueError("Missing OpenAI API key")
+        return api_key
 
-        # Initialize the OpenAI client
-        client = OpenAI(
-            api_key=api_key,
-            timeout=openai_config['timeout'],
-            max_retries=openai_config['max_retries']
-        )
+    @classmethod
+    def _build_request_params(cls, chatbot_type, user_message):
+        """Build the chat completion parameters for a persona and message."""
+        openai_config = current_config().get_openai_config()
 
         # Map chatbot types to style instructions.
         style_instructions = {
@@ -53,134 +357,74 @@ class Chatbot:
             {"role": "user", "content": user_message},
         ]
 
-        try:
-            response = client.chat.completions.create(
-                model=openai_config['model'],
-                messages=messages,
-                temperature=openai_config['temperature'],
-                max_tokens=openai_config['max_tokens'],
-                top_p=openai_config['top_p'],
-                frequency_penalty=openai_config['frequency_penalty'],
-                presence_penalty=openai_config['presence_penalty']
-            )
-            content = response.choices[0].message.content
-            if content is None:
-                raise RuntimeError("No content was returned from the API.")
-            return content.strip()
-        except Exception as e:
-            config = current_config()
-            if config.DEBUG:
-                raise RuntimeError(f"OpenAI API error: {str(e)}")
-            else:
-                raise RuntimeError("I'm sorry, I encountered an error. Please try again later.")
+        return {
+            "model": openai_config['model'],
+            "messages": messages,
+            "temperature": openai_config['temperature'],
+            # Cap generation length per persona and question length (latency grows with output)
+            "max_tokens": token_budget.choose_max_tokens(chatbot_type, messages),
+            "top_p": openai_config['top_p'],
+            "frequency_penalty": openai_config['frequency_penalty'],
+            "presence_penalty": openai_config['presence_penalty'],
+        }
+
+    @classmethod
+    def _is_rate_limited(cls, error):
+        """True when an error raised by _complete came from an upstream 429."""
+        return getattr(error.__cause__, "status_code", None) == 429
+
+    @classmethod
+    def _api_error(cls, error):
+        """Convert an upstream failure into the RuntimeError surfaced to routes."""
+        config = current_config()
+        if config.DEBUG:
+            return RuntimeError(f"OpenAI API error: {str(error)}")
+        else:
+            return RuntimeError("I'm sorry, I encountered an error. Please try again later.")
     
     @classmethod
     def _handle_party_scenario_response(cls, user_message):
         """
         Handle responses to the party scenario question
         """
-        # Define appropriate responses and their feedback
-        appropriate_responses = {
-            "not drinking": {
-                "keywords": ["not drinking", "don't drink", "i'm good", "no thanks", "i don't drink"],
-                "feedback": "Nice. That's clear, confident, and respectful. Most people won't push further after that kind of response."
-            },
-            "driving": {
-                "keywords": ["drive", "driving", "driver", "car", "dd", "designated driver"],
-                "feedback": "Smart move—safety is always a good reason. Giving a specific, practical excuse helps take the pressure off."
-            },
-            "maybe later": {
-                "keywords": ["maybe later", "later", "not now", "not right now"],
-                "feedback": "That's okay too—sometimes deflecting helps avoid confrontation. But sometimes it might invite more pressure later."
-            },
-            "alternative": {
-                "keywords": ["soda", "water", "juice", "something else", "non-alcoholic", "soft drink"],
-                "feedback": "Offering an alternative is a smooth strategy. People usually move on if you're holding a drink—even if it's not alcohol."
-            }
-        }
-        
-        # Check if response matches any appropriate category
-        user_message_lower = user_message.lower()
-        
-        for _, data in appropriate_responses.items():
-            if any(keyword in user_message_lower for keyword in data["keywords"]):
-                return data["feedback"]
-        
-        # If no appropriate response was found, provide a hint
-        hint_response = "That's one way to respond, but let me give you a hint for a better answer. Try being more direct and confident. You could say something like 'No thanks, I'm not drinking tonight' or give a specific reason like 'I'm driving later.' Having a clear, firm response ready helps you handle peer pressure more effectively."
-        
-        return hint_response
+        return scenario_registry.respond(1, user_message)
     
     @classmethod
     def _handle_concert_scenario_response(cls, user_message):
         """
         Handle responses to the concert pre-game scenario question
         """
-        # Define appropriate responses and their feedback
-        appropriate_responses = {
-            "pass_tonight": {
-                "keywords": ["pass tonight", "want to remember", "remember the concert", "not tonight"],
-                "feedback": "That's a powerful reason. Framing your choice positively shows you value the experience."
-            },
-            "meet_there": {
-                "keywords": ["meet you there", "i'll meet", "see you there", "skip pre-gaming", "skipping"],
-                "feedback": "That's a solid boundary—joining later helps avoid early pressure."
-            },
-            "food_instead": {
-                "keywords": ["get food", "food before", "eat instead", "grab food", "dinner"],
-                "feedback": "Offering an alternative is a great strategy. Redirecting plans can shift the tone without causing conflict."
-            },
-            "might_come": {
-                "keywords": ["might come", "come by", "but not drink", "won't drink"],
-                "feedback": "This keeps your options open, but some people might keep pushing."
-            }
-        }
-        
-        # Check if response matches any appropriate category
-        user_message_lower = user_message.lower()
-        
-        for _, data in appropriate_responses.items():
-            if any(keyword in user_message_lower for keyword in data["keywords"]):
-                return data["feedback"]
-        
-        # If no appropriate response was found, provide a hint
-        hint_response = "That's one approach, but here's a hint for a better answer: Try suggesting an alternative activity or being clear about your boundaries. You could say 'I'll pass on pre-gaming but meet you at the concert' or 'Let's grab food before instead.' This shows you want to hang out but on your terms."
-        
-        return hint_response
+        return scenario_registry.respond(2, user_message)
     
     @classmethod
     def _handle_date_scenario_response(cls, user_message):
         """
         Handle responses to the first date scenario question
         """
-        # Define appropriate responses and their feedback
-        appropriate_responses = {
-            "not_drinking": {
-                "keywords": ["not drinking tonight", "don't drink", "still having a great time", "having fun", "great time"],
-                "feedback": "That's perfect—you're holding your boundary while keeping things positive."
-            },
-            "water": {
-                "keywords": ["water", "just water", "have water", "water for now"],
-                "feedback": "Simple and smooth. Sometimes people don't even notice."
-            },
-            "cheers": {
-                "keywords": ["don't really drink", "cheers to you", "don't drink much", "cheers"],
-                "feedback": "Acknowledging them while making your choice clear is a great move."
-            },
-            "dessert": {
-                "keywords": ["dessert", "split a dessert", "want to split", "food", "something else"],
-                "feedback": "Redirection with charm! Offering something else keeps the vibe friendly and light."
-            }
-        }
-        
-        # Check if response matches any appropriate category
-        user_message_lower = user_message.lower()
-        
-        for _, data in appropriate_responses.items():
-            if any(keyword in user_message_lower for keyword in data["keywords"]):
-                return data["feedback"]
-        
-        # If no appropriate response was found, provide a hint
-        hint_response = "That's one way to handle it, but here's a hint for a better answer: Try being clear about your choice while keeping the mood positive. You could say 'I'm not drinking tonight, but I'm having a great time' or suggest an alternative like 'Want to split a dessert instead?' This shows you're engaged in the date while maintaining your boundaries."
-        
-        return hint_response
+        return scenario_registry.respond(3, user_message)
+
+
+class _ResponseStream:
+    """Iterator over a streamed reply that owns its upstream stream and bulkhead permit.
+
+    Closing it frees both even when iteration never started, e.g. when the
+    client disconnects before the first chunk is sent.
+    """
+
+    def __init__(self, chunks, stream, permit):
+        self._chunks = chunks
+        self._stream = stream
+        self._permit = permit
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self._chunks.close()
+        close = getattr(self._stream, "close", None)
+        if close:
+            close()
+        self._permit.release()
@@ -0,0 +1,182 @@
+"""
+Circuit breaker around upstream OpenAI calls
+"""
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+from config import current_config
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stops calling OpenAI while it is failing or too slow.
+
+    Outcomes of recent upstream calls are kept for CIRCUIT_BREAKER_WINDOW
+    seconds. Once at least CIRCUIT_BREAKER_MIN_REQUESTS have been seen, the
+    breaker opens when the error rate reaches CIRCUIT_BREAKER_ERROR_RATE or
+    the p95 latency reaches CIRCUIT_BREAKER_LATENCY_P95. While open, calls
+    are refused immediately so workers are not tied up waiting on the
+    provider. After CIRCUIT_BREAKER_OPEN_SECONDS one probe call is let
+    through (half-open): success closes the breaker, failure reopens it.
+    """
+
+    def __init__(self):
+        self.config = current_config()
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (timestamp, ok, latency)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._last_trip_reason: Optional[str] = None
+        self._stats = {
+            "trips": 0,
+            "rejected": 0,
+            "successes": 0,
+            "failures": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.CIRCUIT_BREAKER_ENABLED
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.time())
+
+    def _current_state(self, now: float) -> str:
+        """Move an open breaker to half-open once its cool-down has passed."""
+        if self._state == OPEN and now - self._opened_at >= self.config.CIRCUIT_BREAKER_OPEN_SECONDS:
+            self._state = HALF_OPEN
+            self._probe_started = None
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Return True if an upstream call may be made now."""
+        if not self.enabled:
+            return True
+        now = time.time()
+        with self._lock:
+            state = self._current_state(now)
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN:
+                # One probe at a time; an abandoned probe is replaced after the cool-down
+                if self._probe_started is None or now - self._probe_started >= self.config.CIRCUIT_BREAKER_OPEN_SECONDS:
+                    self._probe_started = now
+                    return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self, latency: float):
+        """Record a completed upstream call."""
+        self._record(True, latency)
+
+    def record_failure(self, latency: float):
+        """Record a failed upstream call."""
+        self._record(False, latency)
+
+    def _record(self, ok: bool, latency: float):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._stats["successes" if ok else "failures"] += 1
+            state = self._current_state(now)
+            if state == HALF_OPEN:
+                if ok and latency < self.config.CIRCUIT_BREAKER_LATENCY_P95:
+                    self._close()
+                else:
+                    self._trip(now, "probe failed" if not ok else "probe too slow")
+                return
+            if state == OPEN:
+                # A call that started before the breaker opened
+                return
+
+            self._outcomes.append((now, ok, latency))
+            self._prune(now)
+            reason = self._trip_reason()
+            if reason:
+                self._trip(now, reason)
+
+    def _prune(self, now: float):
+        cutoff = now - self.config.CIRCUIT_BREAKER_WINDOW
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def _trip_reason(self) -> Optional[str]:
+        """Return why the breaker should open, or None while healthy."""
+        count = len(self._outcomes)
+        if count < self.config.CIRCUIT_BREAKER_MIN_REQUESTS:
+            return None
+        error_rate = sum(1 for _, ok, _ in self._outcomes if not ok) / count
+        if error_rate >= self.config.CIRCUIT_BREAKER_ERROR_RATE:
+            return f"error rate {error_rate:.0%}"
+        p95 = self._p95()
+        if p95 >= self.config.CIRCUIT_BREAKER_LATENCY_P95:
+            return f"p95 latency {p95:.1f}s"
+        return None
+
+    def _p95(self) -> float:
+        latencies = sorted(latency for _, _, latency in self._outcomes)
+        if not latencies:
+            return 0.0
+        return latencies[max(0, math.ceil(len(latencies) * 0.95) - 1)]
+
+    def _trip(self, now: float, reason: str):
+        self._state = OPEN
+        self._opened_at = now
+        self._probe_started = None
+        self._last_trip_reason = reason
+        self._outcomes.clear()
+        self._stats["trips"] += 1
+
+    def _close(self):
+        self._state = CLOSED
+        self._probe_started = None
+        self._outcomes.clear()
+
+    def force_open(self):
+        """Open the breaker manually (e.g. during a known provider incident)."""
+        with self._lock:
+            self._trip(time.time(), "opened manually")
+
+    def reset(self):
+        """Close the breaker and forget recent outcomes."""
+        with self._lock:
+            self._close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the breaker state, window health and counters."""
+        now = time.time()
+        with self._lock:
+            state = self._current_state(now)
+            self._prune(now)
+            count = len(self._outcomes)
+            stats = dict(self._stats)
+            stats.update({
+                "enabled": self.enabled,
+                "state": state,
+                "window_requests": count,
+                "window_error_rate": (
+                    sum(1 for _, ok, _ in self._outcomes if not ok) / count if count else 0.0
+                ),
+                "window_p95_latency_s": round(self._p95(), 3),
+                "last_trip_reason": self._last_trip_reason,
+                "retry_in_s": (
+                    round(max(0.0, self._opened_at + self.config.CIRCUIT_BREAKER_OPEN_SECONDS - now), 1)
+                    if state == OPEN else 0.0
+                ),
+            })
+        return stats
+
+
+# Global instance
+circuit_breaker = CircuitBreaker()
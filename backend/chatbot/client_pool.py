@@ -0,0 +1,313 @@
+"""
+Shared OpenAI client pool for the chatbot backend
+"""
+import asyncio
+import itertools
+import os
+import threading
+import weakref
+from typing import Dict, Any, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from config import current_config
+
+
+class OpenAIClientPool:
+    """Process-wide, lazily created OpenAI clients with keep-alive connection reuse.
+
+    One client is kept per API key so the HTTP connection pool (and its TLS
+    sessions) survives across requests and worker threads instead of being
+    rebuilt on every chat turn.
+    """
+
+    _lock = threading.Lock()
+    _clients: Dict[str, OpenAI] = {}
+    _pid: Optional[int] = None
+    _stats = {
+        "clients_created": 0,
+        "requests": 0,
+        "connections_opened": 0,
+        "connections_reused": 0,
+    }
+
+    @classmethod
+    def get_client(cls, api_key: str) -> OpenAI:
+        """Return the shared client for an API key, creating it on first use.
+
+        Args:
+            api_key: OpenAI API key the client authenticates with.
+
+        Returns:
+            OpenAI: Client backed by the pooled HTTP transport.
+        """
+        # Connections must not be shared with a forked parent process
+        if cls._pid != os.getpid():
+            cls.reset()
+
+        client = cls._clients.get(api_key)
+        if client is not None:
+            return client
+
+        with cls._lock:
+            client = cls._clients.get(api_key)
+            if client is None:
+                client = cls._create_client(api_key)
+                cls._clients[api_key] = client
+                cls._stats["clients_created"] += 1
+            return client
+
+    @classmethod
+    def _create_client(cls, api_key: str) -> OpenAI:
+        """Build an OpenAI client sized from the connection pool settings."""
+        config = current_config()
+        openai_config = config.get_openai_config()
+
+        http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=config.CONNECTION_POOL_SIZE,
+                max_keepalive_connections=config.CONNECTION_POOL_SIZE,
+                keepalive_expiry=config.CONNECTION_KEEPALIVE_EXPIRY,
+            ),
+            timeout=openai_config['timeout'],
+            event_hooks={"request": [cls._trace_request]},
+        )
+
+        return OpenAI(
+            api_key=api_key,
+            timeout=openai_config['timeout'],
+            max_retries=openai_config['max_retries'],
+            base_url=openai_config['base_url'],
+            http_client=http_client,
+        )
+
+    @classmethod
+    def _trace_request(cls, request: httpx.Request):
+        """Attach a trace callback that records whether a new connection was opened."""
+        state = {"connected": False}
+
+        def trace(event_name, info):
+            if event_name == "connection.connect_tcp.started":
+                state["connected"] = True
+            elif event_name == "http11.send_request_headers.started" or \
+                    event_name == "http2.send_request_headers.started":
+                cls._record(state["connected"])
+
+        request.extensions["trace"] = trace
+
+    @classmethod
+    def _record(cls, connected: bool):
+        """Count one outgoing request as a connection hit or miss."""
+        with cls._lock:
+            cls._stats["requests"] += 1
+            if connected:
+                cls._stats["connections_opened"] += 1
+            else:
+                cls._stats["connections_reused"] += 1
+
+    @classmethod
+    def _close_client(cls, client):
+        """Close a pooled client's connections."""
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """Get connection reuse statistics for the pooled clients."""
+        with cls._lock:
+            stats = dict(cls._stats)
+            stats["active_clients"] = len(cls._clients)
+        stats["pool_size"] = current_config().CONNECTION_POOL_SIZE
+        stats["reuse_rate"] = (
+            stats["connections_reused"] / stats["requests"] if stats["requests"] else 0.0
+        )
+        return stats
+
+    @classmethod
+    def reset(cls):
+        """Drop all pooled clients and statistics (used after fork and in tests)."""
+        with cls._lock:
+            if cls._pid == os.getpid():
+                for client in cls._clients.values():
+                    cls._close_client(client)
+            cls._clients = {}
+            cls._pid = os.getpid()
+            for key in cls._stats:
+                cls._stats[key] = 0
+
+
+class AsyncOpenAIClientPool(OpenAIClientPool):
+    """Process-wide AsyncOpenAI clients for the ASGI serving path.
+
+    Mirrors OpenAIClientPool but builds clients on ``httpx.AsyncClient`` so
+    many in-flight chat turns can share connections on the event loop. Each
+    API key gets ASYNC_CLIENT_SHARDS clients used round-robin: httpcore's
+    per-request pool bookkeeping grows with connections x waiting requests,
+    so several smaller pools stay cheap at hundreds of in-flight calls.
+
+    Async transports are bound to the loop that created them, so clients are
+    kept per event loop and closed when that loop shuts down its async
+    generators (``asyncio.run``, uvicorn and Flask's per-request loops all do).
+    """
+
+    _lock = threading.Lock()
+    _loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClients]" = weakref.WeakKeyDictionary()
+    _pid: Optional[int] = None
+    _stats = {
+        "clients_created": 0,
+        "requests": 0,
+        "connections_opened": 0,
+        "connections_reused": 0,
+    }
+
+    @classmethod
+    def get_client(cls, api_key: str) -> AsyncOpenAI:
+        """Return the shared async client for an API key on the running event loop.
+
+        Args:
+            api_key: OpenAI API key the client authenticates with.
+
+        Returns:
+            AsyncOpenAI: Client backed by the pooled async HTTP transport.
+        """
+        # Connections must not be shared with a forked parent process
+        if cls._pid != os.getpid():
+            cls.reset()
+
+        loop = asyncio.get_running_loop()
+        with cls._lock:
+            clients = cls._loops.get(loop)
+            if clients is None:
+                clients = _LoopClients(loop)
+                cls._loops[loop] = clients
+            client = clients.get(api_key)
+            if client is None:
+                client = cls._create_client(api_key)
+                clients[api_key] = client
+                cls._stats["clients_created"] += 1
+        return client.next_client()
+
+    @classmethod
+    def _create_client(cls, api_key: str) -> "_ShardedAsyncClient":
+        """Build the AsyncOpenAI shards sized from the connection pool settings."""
+        config = current_config()
+        openai_config = config.get_openai_config()
+        shards = max(1, config.ASYNC_CLIENT_SHARDS)
+        shard_size = max(1, -(-config.ASYNC_CONNECTION_POOL_SIZE // shards))
+
+        clients = []
+        for _ in range(shards):
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=shard_size,
+                    max_keepalive_connections=shard_size,
+                    keepalive_expiry=config.CONNECTION_KEEPALIVE_EXPIRY,
+                ),
+                timeout=openai_config['timeout'],
+                event_hooks={"request": [cls._trace_request_async]},
+            )
+            clients.append(AsyncOpenAI(
+                api_key=api_key,
+                timeout=openai_config['timeout'],
+                max_retries=openai_config['max_retries'],
+                base_url=openai_config['base_url'],
+                http_client=http_client,
+            ))
+        return _ShardedAsyncClient(clients)
+
+    @classmethod
+    async def _trace_request_async(cls, request: httpx.Request):
+        """Async counterpart of _trace_request (httpcore awaits async traces)."""
+        state = {"connected": False}
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.started":
+                state["connected"] = True
+            elif event_name == "http11.send_request_headers.started" or \
+                    event_name == "http2.send_request_headers.started":
+                cls._record(state["connected"])
+
+        request.extensions["trace"] = trace
+
+    @classmethod
+    def _release_loop(cls, loop: asyncio.AbstractEventLoop, clients: "_LoopClients"):
+        """Forget a loop's clients once they have been closed."""
+        with cls._lock:
+            if cls._loops.get(loop) is clients:
+                del cls._loops[loop]
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """Get connection reuse statistics for the pooled async clients."""
+        with cls._lock:
+            stats = dict(cls._stats)
+            stats["active_loops"] = len(cls._loops)
+            stats["active_clients"] = sum(len(clients) for clients in cls._loops.values())
+        stats["pool_size"] = current_config().ASYNC_CONNECTION_POOL_SIZE
+        stats["reuse_rate"] = (
+            stats["connections_reused"] / stats["requests"] if stats["requests"] else 0.0
+        )
+        return stats
+
+    @classmethod
+    def reset(cls):
+        """Drop all pooled clients and statistics (used after fork and in tests).
+
+        Clients still open are closed when their own loop shuts down; they
+        cannot be awaited from here.
+        """
+        with cls._lock:
+            cls._loops = weakref.WeakKeyDictionary()
+            cls._pid = os.getpid()
+            for key in cls._stats:
+                cls._stats[key] = 0
+
+
+class _LoopClients(dict):
+    """The sharded clients created on one event loop, keyed by API key.
+
+    A suspended async generator is started on the loop so that the loop's
+    ``shutdown_asyncgens()`` closes it, which in turn closes these clients
+    while the loop can still run their ``aclose()``.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        super().__init__()
+        # Strong reference: the loop only tracks async generators weakly. The
+        # generator holds a weak reference back so the loop can still be collected.
+        self._closer = self._close_on_shutdown(weakref.ref(loop))
+        loop.create_task(self._start())
+
+    async def _start(self):
+        await self._closer.__anext__()
+
+    async def _close_on_shutdown(self, loop_ref):
+        try:
+            yield
+        finally:
+            for client in list(self.values()):
+                await client.aclose()
+            loop = loop_ref()
+            if loop is not None:
+                AsyncOpenAIClientPool._release_loop(loop, self)
+
+
+class _ShardedAsyncClient:
+    """Round-robin over a fixed set of AsyncOpenAI clients for one API key."""
+
+    def __init__(self, clients):
+        self.clients = clients
+        self._counter = itertools.count()
+
+    def next_client(self) -> AsyncOpenAI:
+        return self.clients[next(self._counter) % len(self.clients)]
+
+    async def aclose(self):
+        """Close every shard's connections."""
+        for client in self.clients:
+            try:
+                await client.close()
+            except Exception:
+                pass
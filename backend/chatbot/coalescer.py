@@ -0,0 +1,157 @@
+"""
+Single-flight coalescing of identical in-flight chatbot requests
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict
+
+from config import current_config
+
+
+class RequestCoalescer:
+    """Collapses concurrent identical calls into one upstream request.
+
+    The first caller for a key (the leader) runs the request; callers that
+    arrive with the same key while it is in flight wait for it and receive the
+    same result, or the same exception. Thread-based callers and asyncio
+    callers are tracked separately.
+    """
+
+    def __init__(self):
+        self.config = current_config()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._in_flight_async: Dict[str, asyncio.Future] = {}
+        self._stats = {
+            "calls": 0,
+            "upstream_calls": 0,
+            "collapsed": 0,
+            "shared_errors": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.REQUEST_COALESCING_ENABLED
+
+    def call(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn once per key among concurrent threads and share its outcome.
+
+        Args:
+            key: Identity of the request (persona, normalised message, params).
+            fn: Performs the upstream request when this caller is the leader.
+
+        Returns:
+            The leader's result.
+        """
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            self._stats["calls"] += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                self._stats["upstream_calls"] += 1
+            else:
+                self._stats["collapsed"] += 1
+
+        if not leader:
+            try:
+                return future.result()
+            except Exception:
+                self._count_shared_error()
+                raise
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    async def call_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async counterpart of call() for callers on one event loop.
+
+        If the leader is cancelled (e.g. its client went away), its followers
+        are not: the first to wake becomes the new leader and runs fn itself.
+        """
+        if not self.enabled:
+            return await fn()
+
+        with self._lock:
+            self._stats["calls"] += 1
+        while True:
+            future, leader = self._join_async(key)
+            if leader:
+                break
+            try:
+                # Shield so a cancelled follower does not cancel the leader's result
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+            except Exception:
+                self._count_shared_error()
+                raise
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unobserved error is not logged as never retrieved
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._in_flight_async.get(key) is future:
+                    del self._in_flight_async[key]
+
+    def _join_async(self, key: str):
+        """Return the in-flight future for key and whether this caller leads it."""
+        with self._lock:
+            future = self._in_flight_async.get(key)
+            leader = future is None or future.done() or future.get_loop() is not asyncio.get_running_loop()
+            if leader:
+                future = asyncio.get_running_loop().create_future()
+                self._in_flight_async[key] = future
+                self._stats["upstream_calls"] += 1
+            else:
+                self._stats["collapsed"] += 1
+            return future, leader
+
+    def _count_shared_error(self):
+        with self._lock:
+            self._stats["shared_errors"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get how many calls were collapsed into shared upstream requests."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._in_flight) + len(self._in_flight_async)
+        stats["collapse_rate"] = stats["collapsed"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
+
+    def reset_stats(self):
+        """Reset the counters (in-flight requests are unaffected)."""
+        with self._lock:
+            for key in self._stats:
+                self._stats[key] = 0
+
+
+# Global instance
+request_coalescer = RequestCoalescer()
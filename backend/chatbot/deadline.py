@@ -0,0 +1,54 @@
+"""
+Per-request deadlines carried from the route into the upstream LLM call
+"""
+import time
+from typing import Optional
+
+# DeadlineExceeded stage for an upstream call cut off by the request deadline
+UPSTREAM_TIMEOUT_STAGE = "upstream response"
+
+
+class DeadlineExceeded(RuntimeError):
+    """Raised when a request runs out of its time budget."""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__("The request took too long to process. Please try again.")
+        self.stage = stage
+        self.budget = budget
+
+
+class Deadline:
+    """A fixed point in time by which a request must be answered.
+
+    Created once per request (from REQUEST_TIMEOUT or RESPONSE_TIMEOUT) and
+    passed down explicitly; each stage checks it before doing more work, and
+    each upstream attempt is given only the time that is left.
+    """
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        """Seconds since the deadline was created."""
+        return time.monotonic() - self.started
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded if the deadline has passed before a stage starts."""
+        if self.expired:
+            raise DeadlineExceeded(stage, self.budget)
+
+    def timeout(self, cap: Optional[float] = None, stage: str = "upstream call") -> float:
+        """Return the time budget for the next blocking step, at most cap seconds."""
+        self.check(stage)
+        remaining = self.remaining()
+        return remaining if cap is None else min(cap, remaining)
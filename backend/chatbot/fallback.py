@@ -0,0 +1,119 @@
+"""
+Local fallback answers served while the OpenAI circuit breaker is open
+"""
+import json
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from config import current_config
+from chatbot.semantic_cache import HashedNgramVectorizer, semantic_cache
+
+
+# Persona-styled replies used when neither a cached nor an FAQ answer fits
+CANNED_REPLIES = {
+    "ai": "Sorry, I'm having a bit of trouble thinking right now! Give me a minute and ask me again.",
+    "student": "Oh no, my brain just froze up for a second! Can you try asking me again in a minute?",
+    "doctor": "I apologise, but I am unable to give you a full answer at the moment. Please try again shortly.",
+}
+DEFAULT_CANNED_REPLY = "I'm sorry, I can't answer right now. Please try again in a minute."
+
+
+class FallbackResponder:
+    """Answers a message without calling OpenAI.
+
+    Tries, in order: a semantically close cached answer (with the looser
+    FALLBACK_SEMANTIC_THRESHOLD), the closest question in the FAQ file
+    (FALLBACK_FAQ_FILE, the fine-tuning JSONL) when its cosine similarity
+    reaches FALLBACK_FAQ_THRESHOLD, and finally a canned reply in the
+    persona's style.
+    """
+
+    def __init__(self):
+        self.config = current_config()
+        self.vectorizer = HashedNgramVectorizer(self.config.SEMANTIC_CACHE_DIM)
+        self._lock = threading.Lock()
+        self._faq: Optional[Tuple[np.ndarray, np.ndarray, List[str]]] = None
+        self._stats = {
+            "cached": 0,
+            "faq": 0,
+            "canned": 0,
+        }
+
+    def _load_faq(self) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """Load and vectorise the FAQ question/answer pairs on first use."""
+        with self._lock:
+            if self._faq is not None:
+                return self._faq
+
+            questions, answers = [], []
+            try:
+                with open(self.config.FALLBACK_FAQ_FILE, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        messages = json.loads(line).get("messages", [])
+                        question = next((m["content"] for m in messages if m["role"] == "user"), None)
+                        answer = next((m["content"] for m in messages if m["role"] == "assistant"), None)
+                        if question and answer:
+                            questions.append(question)
+                            answers.append(answer)
+            except (OSError, ValueError):
+                questions, answers = [], []
+
+            dim = self.vectorizer.dim
+            buckets = [self.vectorizer.buckets(q) for q in questions]
+            doc_freq = np.zeros(dim, dtype=np.float64)
+            for b in buckets:
+                doc_freq[np.unique(b)] += 1
+            idf = np.log((1.0 + len(questions)) / (1.0 + doc_freq)) + 1.0
+            matrix = np.zeros((len(questions), dim), dtype=np.float32)
+            for i, b in enumerate(buckets):
+                matrix[i] = self.vectorizer.transform(b, idf)
+            self._faq = (matrix, idf, answers)
+            return self._faq
+
+    def faq_answer(self, user_message: str) -> Optional[str]:
+        """Return the answer to the closest FAQ question, or None if none is close enough."""
+        matrix, idf, answers = self._load_faq()
+        if not answers:
+            return None
+        query = self.vectorizer.transform(self.vectorizer.buckets(user_message), idf)
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.config.FALLBACK_FAQ_THRESHOLD:
+            return answers[best]
+        return None
+
+    def respond(self, chatbot_type: str, user_message: str, request_params: Dict[str, Any]) -> str:
+        """Return the best local answer for a message."""
+        if semantic_cache.enabled:
+            namespace = semantic_cache.make_namespace(request_params)
+            cached = semantic_cache.get(namespace, user_message, threshold=self.config.FALLBACK_SEMANTIC_THRESHOLD)
+            if cached is not None:
+                self._count("cached")
+                return cached
+
+        answer = self.faq_answer(user_message)
+        if answer is not None:
+            self._count("faq")
+            return answer
+
+        self._count("canned")
+        return CANNED_REPLIES.get(chatbot_type, DEFAULT_CANNED_REPLY)
+
+    def _count(self, source: str):
+        with self._lock:
+            self._stats[source] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get how many fallback answers came from each source."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["total"] = sum(stats.values())
+        return stats
+
+
+# Global instance
+fallback_responder = FallbackResponder()
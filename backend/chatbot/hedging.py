@@ -0,0 +1,232 @@
+"""
+Hedged upstream requests to cut tail latency of chat turns
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import current_config
+
+
+class RequestHedger:
+    """Sends a second, identical request when the first one is unusually slow.
+
+    The hedge delay is the HEDGE_PERCENTILE of recent successful upstream
+    latencies (HEDGE_INITIAL_DELAY until HEDGE_MIN_SAMPLES have been seen,
+    never below HEDGE_MIN_DELAY). Whichever request finishes first wins and
+    the other is cancelled; an error from one request only surfaces if the
+    other fails too. Hedges are paid for from a token bucket that earns
+    HEDGE_BUDGET tokens per request, so at most that fraction of extra
+    upstream calls is made.
+
+    Sync requests run on a pool of HEDGE_MAX_WORKERS threads so the caller
+    can stop waiting for the slow one, and the hedge delay is timed from when
+    the request actually starts on a worker. When every worker is busy the
+    request runs unhedged on the calling thread instead of queueing. A sync
+    request that is already running cannot be interrupted; the losing
+    request finishes in the background and its result is discarded, so
+    callers should keep side effects (usage records, breaker outcomes) out
+    of fn and apply them to the returned result. Async losers are cancelled
+    outright.
+    """
+
+    def __init__(self):
+        self.config = current_config()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=self.config.HEDGE_LATENCY_WINDOW)
+        self._tokens = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._busy_workers = 0
+        self._stats = {
+            "calls": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "budget_exhausted": 0,
+            "ran_inline": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.HEDGING_ENABLED
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the first request before hedging."""
+        with self._lock:
+            if len(self._latencies) < self.config.HEDGE_MIN_SAMPLES:
+                delay = self.config.HEDGE_INITIAL_DELAY
+            else:
+                latencies = sorted(self._latencies)
+                index = math.ceil(len(latencies) * self.config.HEDGE_PERCENTILE / 100) - 1
+                delay = latencies[max(0, index)]
+        return max(delay, self.config.HEDGE_MIN_DELAY)
+
+    def _start_call(self):
+        with self._lock:
+            self._stats["calls"] += 1
+            self._tokens = min(self._tokens + self.config.HEDGE_BUDGET, self.config.HEDGE_BUDGET_BURST)
+
+    def _take_hedge_token(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                self._stats["hedged"] += 1
+                return True
+            self._stats["budget_exhausted"] += 1
+            return False
+
+    def _record_latency(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _record_winner(self, hedge_won: bool):
+        with self._lock:
+            self._stats["hedge_wins" if hedge_won else "primary_wins"] += 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.config.HEDGE_MAX_WORKERS, thread_name_prefix="hedge"
+                    )
+        return self._executor
+
+    def _reserve_worker(self) -> bool:
+        """Claim a pool thread for one request, or return False if all are busy."""
+        with self._lock:
+            if self._busy_workers >= self.config.HEDGE_MAX_WORKERS:
+                return False
+            self._busy_workers += 1
+            return True
+
+    def _release_worker(self, _future=None):
+        with self._lock:
+            self._busy_workers -= 1
+
+    def _submit(self, fn: Callable[[], Any]):
+        """Run fn on a reserved pool thread; returns its future and an event set when it starts."""
+        started = threading.Event()
+
+        def run():
+            started.set()
+            return self._timed(fn)()
+
+        future = self._get_executor().submit(run)
+        future.add_done_callback(self._release_worker)
+        return future, started
+
+    def _timed(self, fn: Callable[[], Any]) -> Callable[[], Any]:
+        """Wrap fn so successful calls feed the latency window."""
+        def run():
+            started = time.perf_counter()
+            result = fn()
+            self._record_latency(time.perf_counter() - started)
+            return result
+        return run
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Run fn, hedging it with a second call if it is slow.
+
+        Args:
+            fn: Performs one upstream request; must be safe to call twice.
+
+        Returns:
+            The result of whichever call finished first.
+        """
+        if not self.enabled:
+            return fn()
+
+        self._start_call()
+        if not self._reserve_worker():
+            # Waiting in the pool's queue would look like upstream slowness
+            with self._lock:
+                self._stats["ran_inline"] += 1
+            return self._timed(fn)()
+
+        primary, started = self._submit(fn)
+        started.wait()
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done or not self._reserve_worker():
+            return primary.result()
+        if not self._take_hedge_token():
+            self._release_worker()
+            return primary.result()
+
+        hedge, _ = self._submit(fn)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    self._record_winner(future is hedge)
+                    return future.result()
+                if error is None or future is primary:
+                    error = future.exception()
+        raise error
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async counterpart of call(); the losing request is cancelled."""
+        if not self.enabled:
+            return await fn()
+
+        async def timed():
+            started = time.perf_counter()
+            result = await fn()
+            self._record_latency(time.perf_counter() - started)
+            return result
+
+        self._start_call()
+        primary = asyncio.ensure_future(timed())
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+            if done or not self._take_hedge_token():
+                return await primary
+
+            hedge = asyncio.ensure_future(timed())
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._record_winner(task is hedge)
+                        return task.result()
+                    if error is None or task is primary:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hedge rate, wins and the current hedge delay."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["latency_samples"] = len(self._latencies)
+            stats["budget_tokens"] = round(self._tokens, 2)
+        stats["hedge_rate"] = stats["hedged"] / stats["calls"] if stats["calls"] else 0.0
+        stats["hedge_win_rate"] = stats["hedge_wins"] / stats["hedged"] if stats["hedged"] else 0.0
+        stats["hedge_delay_s"] = round(self.hedge_delay(), 3)
+        return stats
+
+    def reset(self):
+        """Forget latency samples, budget and counters."""
+        with self._lock:
+            self._latencies.clear()
+            self._tokens = 0.0
+            for key in self._stats:
+                self._stats[key] = 0
+
+
+# Global instance
+request_hedger = RequestHedger()
@@ -0,0 +1,193 @@
+"""
+LLM response cache for the chatbot backend
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from config import current_config
+
+
+# Parameters that change the upstream completion and therefore belong in the key.
+# max_tokens is left out: the token budget picks it from the message length, so
+# messages that normalise to the same text would otherwise get different keys.
+KEY_PARAMS = ("model", "temperature", "top_p", "frequency_penalty", "presence_penalty")
+
+
+class ResponseCache:
+    """Bounded LRU + TTL cache of chatbot responses with an optional SQLite tier.
+
+    Entries are keyed on the normalised user message, the persona style
+    instruction and the model parameters, so identical questions to the same
+    chatbot type are answered without calling OpenAI. When
+    RESPONSE_CACHE_DB_PATH is set, entries are also written to SQLite and
+    survive restarts; disk hits are promoted back into memory.
+    """
+
+    def __init__(self):
+        self.config = current_config()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_path: Optional[str] = None
+        self._stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.RESPONSE_CACHE_ENABLED
+
+    @staticmethod
+    def normalize_message(message: str) -> str:
+        """Normalise a message so trivially different phrasings share a key."""
+        text = message.lower()
+        text = re.sub(r"\s+", " ", text).strip()
+        # Ignore trailing punctuation ("what is a standard drink?" == "...drink")
+        return text.rstrip("?!.,;: ")
+
+    @classmethod
+    def make_key(cls, user_message: str, request_params: Dict[str, Any]) -> str:
+        """Build the cache key for a message and its chat completion parameters."""
+        messages = request_params.get("messages", [])
+        style = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        key_data = {
+            "message": cls.normalize_message(user_message),
+            "style": style,
+            "params": {name: request_params.get(name) for name in KEY_PARAMS},
+        }
+        payload = json.dumps(key_data, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                response, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return response
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+            response, expires_at = self._db_get(key, now)
+            if response is not None:
+                self._store_memory(key, response, expires_at)
+                self._stats["hits"] += 1
+                self._stats["disk_hits"] += 1
+                return response
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, response: str, ttl: Optional[int] = None):
+        """Cache a response under a key for ttl seconds (config default if omitted)."""
+        if ttl is None:
+            ttl = self.config.RESPONSE_CACHE_TTL
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._store_memory(key, response, expires_at)
+            self._stats["sets"] += 1
+            db = self._get_db()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                    (key, response, expires_at),
+                )
+                db.commit()
+
+    def _store_memory(self, key: str, response: str, expires_at: float):
+        """Insert into the in-memory LRU, evicting the least recently used entries."""
+        self._entries[key] = (response, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.config.RESPONSE_CACHE_MAX_ENTRIES:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _get_db(self) -> Optional[sqlite3.Connection]:
+        """Open the persistent tier on first use, if configured."""
+        db_path = self.config.RESPONSE_CACHE_DB_PATH
+        if not db_path:
+            return None
+        if self._db is None or self._db_path != db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db_path = db_path
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _db_get(self, key: str, now: float) -> Tuple[Optional[str], float]:
+        """Look a key up in the persistent tier, dropping it if expired."""
+        db = self._get_db()
+        if db is None:
+            return None, 0.0
+        row = db.execute(
+            "SELECT response, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None, 0.0
+        if row[1] <= now:
+            db.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            db.commit()
+            self._stats["expirations"] += 1
+            return None, 0.0
+        return row[0], row[1]
+
+    def purge_expired(self) -> int:
+        """Remove expired entries from both tiers and return how many were dropped."""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            for key in [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]:
+                del self._entries[key]
+                removed += 1
+            db = self._get_db()
+            if db is not None:
+                removed += db.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,)).rowcount
+                db.commit()
+            self._stats["expirations"] += removed
+        return removed
+
+    def clear(self):
+        """Drop every cached entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            db = self._get_db()
+            if db is not None:
+                db.execute("DELETE FROM response_cache")
+                db.commit()
+            for key in self._stats:
+                self._stats[key] = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        stats["max_entries"] = self.config.RESPONSE_CACHE_MAX_ENTRIES
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["persistent"] = bool(self.config.RESPONSE_CACHE_DB_PATH)
+        return stats
+
+
+# Global instance
+response_cache = ResponseCache()
@@ -0,0 +1,135 @@
+"""
+Declarative scenario registry and compiled keyword matcher for scenario grading
+"""
+import json
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from config import current_config
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton mapping keywords to category indices.
+
+    Finds every keyword occurrence, including overlapping ones (for example
+    "don't drink" inside "don't drink much"), in a single pass over the text,
+    so the cost of matching no longer grows with the number of keywords.
+    """
+
+    def __init__(self, keywords: Dict[str, int]):
+        """Build the automaton.
+
+        Args:
+            keywords: Mapping of lowercase keyword to the category index it signals.
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Bitmask of categories whose keyword ends at each state
+        self._output: List[int] = [0]
+
+        for keyword, category in keywords.items():
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(0)
+                state = next_state
+            self._output[state] |= 1 << category
+
+        # Breadth-first construction of failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def match_mask(self, text: str) -> int:
+        """Return a bitmask of every category with a keyword in the text."""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        mask = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            mask |= output[state]
+        return mask
+
+
+class Scenario:
+    """One graded scenario: ordered feedback categories plus a fallback hint."""
+
+    def __init__(self, scenario_id: str, data: Dict[str, Any]):
+        self.id = scenario_id
+        self.name = data.get("name", scenario_id)
+        self.categories = data["categories"]
+        self.hint = data["hint"]
+
+        keywords = {}
+        # Earlier categories win when several match, as in the original handlers,
+        # so a keyword listed twice keeps its first category
+        for index, category in enumerate(self.categories):
+            for keyword in category["keywords"]:
+                keywords.setdefault(keyword.lower(), index)
+        self.automaton = KeywordAutomaton(keywords)
+
+    def match(self, user_message: str) -> List[str]:
+        """Return the ids of all matched categories, in priority order."""
+        mask = self.automaton.match_mask(user_message.lower())
+        return [category["id"] for index, category in enumerate(self.categories) if mask >> index & 1]
+
+    def respond(self, user_message: str) -> str:
+        """Return feedback for the highest-priority matched category, or the hint."""
+        mask = self.automaton.match_mask(user_message.lower())
+        if not mask:
+            return self.hint
+        # Lowest set bit is the first category in declaration order
+        first = (mask & -mask).bit_length() - 1
+        return self.categories[first]["feedback"]
+
+
+class ScenarioRegistry:
+    """Scenarios loaded once from SCENARIO_DATA_FILE and compiled at startup."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.config = current_config()
+        self.path = path or self.config.SCENARIO_DATA_FILE
+        self.scenarios: Dict[str, Scenario] = {}
+        self.load()
+
+    def load(self):
+        """(Re)load and compile every scenario from the JSON registry."""
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.scenarios = {
+            str(scenario_id): Scenario(str(scenario_id), scenario)
+            for scenario_id, scenario in data.items()
+        }
+
+    def __contains__(self, scenario_id) -> bool:
+        return str(scenario_id) in self.scenarios
+
+    def get(self, scenario_id) -> Optional[Scenario]:
+        return self.scenarios.get(str(scenario_id))
+
+    def respond(self, scenario_id, user_message: str) -> Optional[str]:
+        """Grade a reply to a scenario; None if the scenario is not registered."""
+        scenario = self.get(scenario_id)
+        if scenario is None:
+            return None
+        return scenario.respond(user_message)
+
+
+# Global instance
+scenario_registry = ScenarioRegistry()
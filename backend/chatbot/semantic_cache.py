@@ -0,0 +1,243 @@
+"""
+Semantic (near-duplicate) response cache for the chatbot backend
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+import zlib
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from config import current_config
+from chatbot.response_cache import KEY_PARAMS, ResponseCache
+
+
+class HashedNgramVectorizer:
+    """Embeds text locally as hashed character n-gram TF-IDF vectors.
+
+    No model or network is involved: each n-gram of the normalised message is
+    hashed into one of ``dim`` buckets. Term frequencies are log-scaled and
+    weighted by inverse document frequency from the caller's corpus counts.
+    """
+
+    def __init__(self, dim: int, ngram_range=(3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def buckets(self, text: str) -> np.ndarray:
+        """Return the hashed n-gram bucket of every n-gram in a message."""
+        text = f" {ResponseCache.normalize_message(text)} "
+        buckets = []
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            for i in range(len(text) - n + 1):
+                buckets.append(zlib.crc32(text[i:i + n].encode("utf-8")) % self.dim)
+        return np.asarray(buckets, dtype=np.int64)
+
+    def transform(self, buckets: np.ndarray, idf: np.ndarray) -> np.ndarray:
+        """Build the L2-normalised TF-IDF vector for a message's buckets."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if buckets.size == 0:
+            return vector
+        counts = np.bincount(buckets, minlength=self.dim).astype(np.float32)
+        nonzero = counts > 0
+        vector[nonzero] = (1.0 + np.log(counts[nonzero])) * idf[nonzero]
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class _SemanticIndex:
+    """Vector matrix and cached answers for one persona/parameter namespace."""
+
+    def __init__(self, dim: int, max_entries: int):
+        self.max_entries = max_entries
+        capacity = min(max_entries, 64)
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.responses: List[Optional[str]] = [None] * capacity
+        self.doc_freq = np.zeros(dim, dtype=np.float64)
+        self.doc_count = 0
+        # IDF that the stored vectors and queries are both weighted with
+        self.weights = self.idf()
+        self.reweight_at = 1
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def idf(self) -> np.ndarray:
+        return np.log((1.0 + self.doc_count) / (1.0 + self.doc_freq)) + 1.0
+
+    def add_document(self, buckets: np.ndarray, growth: float):
+        """Count a message in the document frequencies, re-weighting the index if it has grown enough.
+
+        Stored vectors and queries share one IDF snapshot, so an exact repeat
+        always scores 1.0. The snapshot is refreshed, and every stored vector
+        re-weighted to it, each time the document count grows by ``growth``.
+        """
+        self.doc_count += 1
+        self.doc_freq[np.unique(buckets)] += 1
+        if self.doc_count < self.reweight_at:
+            return
+        weights = self.idf()
+        if self.size:
+            # Rows are normalised TF x old IDF: rescaling and renormalising is exact
+            rows = self.vectors[:self.size] * (weights / self.weights).astype(np.float32)
+            norms = np.linalg.norm(rows, axis=1, keepdims=True)
+            np.divide(rows, norms, out=rows, where=norms > 0)
+            self.vectors[:self.size] = rows
+        self.weights = weights
+        self.reweight_at = max(self.doc_count + 1, math.ceil(self.doc_count * growth))
+
+    def search(self, query: np.ndarray, now: float):
+        """Return (slot, similarity) of the best live match, or (None, 0.0)."""
+        if self.size == 0:
+            return None, 0.0
+        similarities = self.vectors[:self.size] @ query
+        similarities[self.expires_at[:self.size] <= now] = -1.0
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def allocate(self, now: float):
+        """Return a free slot, growing the matrix or evicting as needed.
+
+        Returns:
+            tuple: (slot, reason) where reason is None, "expired" or "evicted".
+        """
+        if self.size < self.vectors.shape[0]:
+            self.size += 1
+            return self.size - 1, None
+        if self.size < self.max_entries:
+            self._grow(min(self.max_entries, self.vectors.shape[0] * 2))
+            self.size += 1
+            return self.size - 1, None
+
+        # Full: reuse an expired slot first, otherwise the least recently used
+        expired = np.flatnonzero(self.expires_at[:self.size] <= now)
+        if expired.size:
+            return int(expired[0]), "expired"
+        return int(np.argmin(self.last_used[:self.size])), "evicted"
+
+    def _grow(self, capacity: int):
+        extra = capacity - self.vectors.shape[0]
+        self.vectors = np.vstack([self.vectors, np.zeros((extra, self.vectors.shape[1]), dtype=np.float32)])
+        self.expires_at = np.concatenate([self.expires_at, np.zeros(extra)])
+        self.last_used = np.concatenate([self.last_used, np.zeros(extra)])
+        self.responses.extend([None] * extra)
+
+
+class SemanticCache:
+    """Serves cached answers for paraphrased questions via cosine similarity.
+
+    A second cache layer behind ResponseCache: each persona/parameter
+    namespace keeps a NumPy matrix of message vectors, and a lookup is one
+    vectorised matrix-vector product. A cached answer is served when the best
+    cosine similarity reaches SEMANTIC_CACHE_THRESHOLD. When an index reaches
+    SEMANTIC_CACHE_MAX_ENTRIES, expired entries are reused first, then the
+    least recently used.
+    """
+
+    def __init__(self):
+        self.config = current_config()
+        self.vectorizer = HashedNgramVectorizer(self.config.SEMANTIC_CACHE_DIM)
+        self._indexes: Dict[str, _SemanticIndex] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.SEMANTIC_CACHE_ENABLED
+
+    @staticmethod
+    def make_namespace(request_params: Dict[str, Any]) -> str:
+        """Namespace answers by persona style and model parameters."""
+        messages = request_params.get("messages", [])
+        style = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        payload = json.dumps(
+            {"style": style, "params": {name: request_params.get(name) for name in KEY_PARAMS}},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _get_index(self, namespace: str) -> _SemanticIndex:
+        index = self._indexes.get(namespace)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(namespace)
+                if index is None:
+                    index = _SemanticIndex(self.vectorizer.dim, self.config.SEMANTIC_CACHE_MAX_ENTRIES)
+                    self._indexes[namespace] = index
+        return index
+
+    def get(self, namespace: str, user_message: str, threshold: Optional[float] = None) -> Optional[str]:
+        """Return the cached answer for the closest earlier message, or None."""
+        if threshold is None:
+            threshold = self.config.SEMANTIC_CACHE_THRESHOLD
+        index = self._get_index(namespace)
+        buckets = self.vectorizer.buckets(user_message)
+        now = time.time()
+        with index.lock:
+            query = self.vectorizer.transform(buckets, index.weights)
+            slot, similarity = index.search(query, now)
+            if slot is not None and similarity >= threshold:
+                index.last_used[slot] = now
+                response = index.responses[slot]
+            else:
+                response = None
+        with self._lock:
+            self._stats["hits" if response is not None else "misses"] += 1
+        return response
+
+    def set(self, namespace: str, user_message: str, response: str, ttl: Optional[int] = None):
+        """Index a message and its answer for later near-duplicate lookups."""
+        if ttl is None:
+            ttl = self.config.RESPONSE_CACHE_TTL
+        index = self._get_index(namespace)
+        buckets = self.vectorizer.buckets(user_message)
+        now = time.time()
+        with index.lock:
+            index.add_document(buckets, self.config.SEMANTIC_CACHE_REWEIGHT_GROWTH)
+            vector = self.vectorizer.transform(buckets, index.weights)
+            slot, reason = index.allocate(now)
+            index.vectors[slot] = vector
+            index.expires_at[slot] = now + ttl
+            index.last_used[slot] = now
+            index.responses[slot] = response
+        with self._lock:
+            self._stats["sets"] += 1
+            if reason == "evicted":
+                self._stats["evictions"] += 1
+            elif reason == "expired":
+                self._stats["expirations"] += 1
+
+    def clear(self):
+        """Drop every index and reset the counters."""
+        with self._lock:
+            self._indexes = {}
+            for key in self._stats:
+                self._stats[key] = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters and index sizes."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["namespaces"] = len(self._indexes)
+            stats["size"] = sum(index.size for index in self._indexes.values())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["threshold"] = self.config.SEMANTIC_CACHE_THRESHOLD
+        stats["max_entries"] = self.config.SEMANTIC_CACHE_MAX_ENTRIES
+        return stats
+
+
+# Global instance
+semantic_cache = SemanticCache()
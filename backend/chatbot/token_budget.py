@@ -0,0 +1,146 @@
+"""
+Output token budgeting and per-turn usage records for chat completions
+"""
+import json
+import math
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from config import current_config
+from logger.write_behind import log_writer
+
+
+# Words, numbers and individual punctuation marks, roughly as BPE tokenizers split them
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+# Per-message framing tokens added by the chat format
+_MESSAGE_OVERHEAD = 4
+_REPLY_PRIMER = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text without a model tokenizer.
+
+    Words of up to eight letters count as one token; longer words are split roughly
+    every four characters, and numbers every three digits.
+    """
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif piece.isalpha():
+            tokens += 1 if len(piece) <= 8 else math.ceil(len(piece) / 4)
+        else:
+            tokens += 1
+    return tokens
+
+
+def estimate_prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate the prompt tokens of a chat completion message list."""
+    return sum(_MESSAGE_OVERHEAD + estimate_tokens(m["content"]) for m in messages) + _REPLY_PRIMER
+
+
+class TokenBudget:
+    """Chooses max_tokens per turn and records what each turn actually used.
+
+    The output cap starts from the persona's entry in TOKEN_BUDGET_CAPS, is
+    scaled down for short questions and up for long ones, and is clamped to
+    OPENAI_MAX_TOKENS and to what is left of the context window after the
+    estimated prompt. Each upstream completion is recorded with its cap,
+    reported usage, finish reason and latency; recent records are kept in
+    memory and, when TOKEN_USAGE_LOG_PATH is set, appended there as JSON lines
+    through the write-behind log writer.
+    """
+
+    def __init__(self):
+        self.config = current_config()
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=self.config.TOKEN_USAGE_HISTORY)
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.TOKEN_BUDGET_ENABLED
+
+    def choose_max_tokens(self, chatbot_type: str, messages: List[Dict[str, str]]) -> int:
+        """Pick the output token cap for one turn."""
+        config = self.config
+        if not self.enabled:
+            return config.OPENAI_MAX_TOKENS
+
+        cap = config.TOKEN_BUDGET_CAPS.get(chatbot_type, config.OPENAI_MAX_TOKENS)
+        message_tokens = estimate_tokens(messages[-1]["content"])
+        if message_tokens <= config.TOKEN_BUDGET_SHORT_MESSAGE_TOKENS:
+            cap *= config.TOKEN_BUDGET_SHORT_MESSAGE_FACTOR
+        elif message_tokens >= config.TOKEN_BUDGET_LONG_MESSAGE_TOKENS:
+            cap *= config.TOKEN_BUDGET_LONG_MESSAGE_FACTOR
+
+        remaining = config.TOKEN_BUDGET_CONTEXT_WINDOW - estimate_prompt_tokens(messages)
+        cap = min(int(cap), config.OPENAI_MAX_TOKENS, remaining)
+        return max(cap, config.TOKEN_BUDGET_MIN_TOKENS)
+
+    def record(self, chatbot_type: Optional[str], request_params: Dict[str, Any], usage=None,
+               finish_reason: Optional[str] = None, latency: Optional[float] = None):
+        """Record the chosen cap and the usage reported for one upstream completion."""
+        record = {
+            "timestamp": time.time(),
+            "chatbot_type": chatbot_type,
+            "model": request_params.get("model"),
+            "max_tokens": request_params.get("max_tokens"),
+            "estimated_prompt_tokens": estimate_prompt_tokens(request_params.get("messages", [])),
+            "prompt_tokens": self._usage_count(usage, "prompt_tokens"),
+            "completion_tokens": self._usage_count(usage, "completion_tokens"),
+            "finish_reason": finish_reason if isinstance(finish_reason, str) else None,
+            "latency_s": round(latency, 4) if latency is not None else None,
+        }
+        with self._lock:
+            self._records.append(record)
+        path = self.config.TOKEN_USAGE_LOG_PATH
+        if path:
+            # Written by the background log writer; the turn never waits on disk
+            log_writer.append(path, json.dumps(record) + "\n")
+        return record
+
+    @staticmethod
+    def _usage_count(usage, name: str) -> Optional[int]:
+        value = getattr(usage, name, None)
+        return value if isinstance(value, int) else None
+
+    def get_records(self) -> List[Dict[str, Any]]:
+        """Return the most recent usage records, oldest first."""
+        with self._lock:
+            return list(self._records)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Summarise recent records per chatbot type for cap tuning."""
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        for record in self.get_records():
+            by_type.setdefault(record["chatbot_type"] or "unknown", []).append(record)
+
+        stats = {}
+        for chatbot_type, records in by_type.items():
+            completions = [r["completion_tokens"] for r in records if r["completion_tokens"] is not None]
+            caps = [r["max_tokens"] for r in records if r["max_tokens"]]
+            latencies = sorted(r["latency_s"] for r in records if r["latency_s"] is not None)
+            stats[chatbot_type] = {
+                "turns": len(records),
+                "avg_max_tokens": round(statistics.mean(caps), 1) if caps else None,
+                "avg_completion_tokens": round(statistics.mean(completions), 1) if completions else None,
+                "max_completion_tokens": max(completions) if completions else None,
+                "truncated": sum(1 for r in records if r["finish_reason"] == "length"),
+                "p50_latency_s": latencies[len(latencies) // 2] if latencies else None,
+                "p95_latency_s": latencies[max(0, math.ceil(len(latencies) * 0.95) - 1)] if latencies else None,
+            }
+        return stats
+
+    def clear(self):
+        """Drop the in-memory records (the JSONL log is left as is)."""
+        with self._lock:
+            self._records.clear()
+
+
+# Global instance
+token_budget = TokenBudget()
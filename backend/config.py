@@ -23,11 +23,12 @@ class Config:
     
     # ===== PATHS AND DIRECTORIES =====
     BASE_DIR = Path(__file__).parent.absolute()
-    LOG_DIR = BASE_DIR / "logs"
+    LOG_DIR = Path(os.getenv('LOG_DIR') or BASE_DIR / "logs")
     SESSION_LOG_DIR = LOG_DIR / "session_logs"
     ACTIVE_SESSION_DIR = SESSION_LOG_DIR / "active"
     COMPLETED_SESSION_DIR = SESSION_LOG_DIR / "completed"
     ASSESSMENT_DATA_FILE = BASE_DIR / "assessment_data.json"
+    SCENARIO_DATA_FILE = BASE_DIR / "scenario_data.json"
     
     # ===== SERVER CONFIGURATION =====
     HOST = os.getenv('HOST', '0.0.0.0')
@@ -77,6 +78,79 @@ class Config:
     OPENAI_PRESENCE_PENALTY = float(os.getenv('OPENAI_PRESENCE_PENALTY', 0.0))
     OPENAI_TIMEOUT = int(os.getenv('OPENAI_TIMEOUT', 30))
     OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 3))
+    # Point the client at an OpenAI-compatible server, e.g. benchmarks/stub_llm_server.py
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', '') or None
+    
+    # ===== ADMISSION CONTROL =====
+    BULKHEAD_ENABLED = os.getenv('BULKHEAD_ENABLED', 'True').lower() == 'true'
+    BULKHEAD_MAX_CONCURRENT = int(os.getenv('BULKHEAD_MAX_CONCURRENT', 32))  # per chatbot type
+    # Per-type overrides ("type:limit,..."), e.g. "doctor:16"
+    BULKHEAD_LIMITS = {
+        name.strip(): int(limit)
+        for name, limit in (
+            item.split(':') for item in os.getenv('BULKHEAD_LIMITS', '').split(',') if item
+        )
+    }
+    BULKHEAD_MIN_CONCURRENT = int(os.getenv('BULKHEAD_MIN_CONCURRENT', 2))
+    BULKHEAD_QUEUE_SIZE = int(os.getenv('BULKHEAD_QUEUE_SIZE', 16))
+    BULKHEAD_QUEUE_TIMEOUT = float(os.getenv('BULKHEAD_QUEUE_TIMEOUT', 2.0))  # seconds
+    BULKHEAD_DECREASE_FACTOR = float(os.getenv('BULKHEAD_DECREASE_FACTOR', 0.5))
+    BULKHEAD_RETRY_AFTER = int(os.getenv('BULKHEAD_RETRY_AFTER', 2))  # seconds, sent with 503s
+    
+    # ===== REQUEST HEDGING =====
+    HEDGING_ENABLED = os.getenv('HEDGING_ENABLED', 'False').lower() == 'true'
+    HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 95))
+    HEDGE_INITIAL_DELAY = float(os.getenv('HEDGE_INITIAL_DELAY', 3.0))  # seconds, until enough samples
+    HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', 0.5))  # seconds
+    HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', 20))
+    HEDGE_LATENCY_WINDOW = int(os.getenv('HEDGE_LATENCY_WINDOW', 500))
+    HEDGE_BUDGET = float(os.getenv('HEDGE_BUDGET', 0.05))  # max fraction of extra upstream calls
+    HEDGE_BUDGET_BURST = float(os.getenv('HEDGE_BUDGET_BURST', 10))
+    HEDGE_MAX_WORKERS = int(os.getenv('HEDGE_MAX_WORKERS', 64))
+    
+    # ===== CIRCUIT BREAKER =====
+    CIRCUIT_BREAKER_ENABLED = os.getenv('CIRCUIT_BREAKER_ENABLED', 'True').lower() == 'true'
+    CIRCUIT_BREAKER_WINDOW = int(os.getenv('CIRCUIT_BREAKER_WINDOW', 60))  # seconds
+    CIRCUIT_BREAKER_MIN_REQUESTS = int(os.getenv('CIRCUIT_BREAKER_MIN_REQUESTS', 10))
+    CIRCUIT_BREAKER_ERROR_RATE = float(os.getenv('CIRCUIT_BREAKER_ERROR_RATE', 0.5))
+    CIRCUIT_BREAKER_LATENCY_P95 = float(os.getenv('CIRCUIT_BREAKER_LATENCY_P95', 20.0))  # seconds
+    CIRCUIT_BREAKER_OPEN_SECONDS = int(os.getenv('CIRCUIT_BREAKER_OPEN_SECONDS', 30))
+    FALLBACK_ENABLED = os.getenv('FALLBACK_ENABLED', 'True').lower() == 'true'
+    FALLBACK_FAQ_FILE = Path(os.getenv('FALLBACK_FAQ_FILE') or BASE_DIR.parent / "gpt_tuning" / "training_data.jsonl")
+    FALLBACK_FAQ_THRESHOLD = float(os.getenv('FALLBACK_FAQ_THRESHOLD', 0.35))
+    FALLBACK_SEMANTIC_THRESHOLD = float(os.getenv('FALLBACK_SEMANTIC_THRESHOLD', 0.6))
+    
+    # ===== TOKEN BUDGETING =====
+    TOKEN_BUDGET_ENABLED = os.getenv('TOKEN_BUDGET_ENABLED', 'True').lower() == 'true'
+    # Output caps per chatbot type ("type:tokens,..."); other types use OPENAI_MAX_TOKENS
+    TOKEN_BUDGET_CAPS = {
+        name.strip(): int(cap)
+        for name, cap in (
+            item.split(':') for item in os.getenv('TOKEN_BUDGET_CAPS', 'ai:400,student:400,doctor:600').split(',') if item
+        )
+    }
+    TOKEN_BUDGET_SHORT_MESSAGE_TOKENS = int(os.getenv('TOKEN_BUDGET_SHORT_MESSAGE_TOKENS', 8))
+    TOKEN_BUDGET_SHORT_MESSAGE_FACTOR = float(os.getenv('TOKEN_BUDGET_SHORT_MESSAGE_FACTOR', 0.75))
+    TOKEN_BUDGET_LONG_MESSAGE_TOKENS = int(os.getenv('TOKEN_BUDGET_LONG_MESSAGE_TOKENS', 150))
+    TOKEN_BUDGET_LONG_MESSAGE_FACTOR = float(os.getenv('TOKEN_BUDGET_LONG_MESSAGE_FACTOR', 1.5))
+    TOKEN_BUDGET_MIN_TOKENS = int(os.getenv('TOKEN_BUDGET_MIN_TOKENS', 64))
+    TOKEN_BUDGET_CONTEXT_WINDOW = int(os.getenv('TOKEN_BUDGET_CONTEXT_WINDOW', 16385))
+    TOKEN_USAGE_HISTORY = int(os.getenv('TOKEN_USAGE_HISTORY', 1000))
+    TOKEN_USAGE_LOG_PATH = os.getenv('TOKEN_USAGE_LOG_PATH', '')  # empty = memory only
+    
+    # ===== RESPONSE CACHE =====
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 86400))  # 24 hours
+    RESPONSE_CACHE_DB_PATH = os.getenv('RESPONSE_CACHE_DB_PATH', '')  # empty = memory only
+    SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'False').lower() == 'true'
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.8))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', 10000))  # per persona
+    SEMANTIC_CACHE_DIM = int(os.getenv('SEMANTIC_CACHE_DIM', 1024))
+    SEMANTIC_CACHE_REWEIGHT_GROWTH = float(os.getenv('SEMANTIC_CACHE_REWEIGHT_GROWTH', 1.25))  # IDF refresh factor
+    
+    # ===== REQUEST COALESCING =====
+    REQUEST_COALESCING_ENABLED = os.getenv('REQUEST_COALESCING_ENABLED', 'True').lower() == 'true'
     
     # ===== LOGGING CONFIGURATION =====
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -86,6 +160,30 @@ class Config:
     LOG_FILE_BACKUP_COUNT = int(os.getenv('LOG_FILE_BACKUP_COUNT', 5))
     LOG_TO_FILE = os.getenv('LOG_TO_FILE', 'True').lower() == 'true'
     LOG_TO_CONSOLE = os.getenv('LOG_TO_CONSOLE', 'True').lower() == 'true'
+    # Conversation/session log writes are queued and done by a background thread
+    LOG_WRITE_BEHIND_ENABLED = os.getenv('LOG_WRITE_BEHIND_ENABLED', 'True').lower() == 'true'
+    LOG_WRITE_QUEUE_SIZE = int(os.getenv('LOG_WRITE_QUEUE_SIZE', 10000))  # entries; overflow is dropped
+    LOG_WRITE_BATCH_SIZE = int(os.getenv('LOG_WRITE_BATCH_SIZE', 500))
+    LOG_FSYNC_MODE = os.getenv('LOG_FSYNC_MODE', 'none')  # none | periodic | batch
+    LOG_FSYNC_INTERVAL = float(os.getenv('LOG_FSYNC_INTERVAL', 1.0))  # seconds, periodic mode
+    LOG_SHUTDOWN_FLUSH_TIMEOUT = float(os.getenv('LOG_SHUTDOWN_FLUSH_TIMEOUT', 5.0))
+    LOG_READ_FLUSH_TIMEOUT = float(os.getenv('LOG_READ_FLUSH_TIMEOUT', 2.0))  # seconds a read waits for queued writes
+    
+    # ===== SESSION STORAGE =====
+    SESSION_STORE = os.getenv('SESSION_STORE', 'csv')  # csv | sqlite
+    SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', '')  # empty = SESSION_LOG_DIR/sessions.db
+    # Processes parsing session CSVs for exports (0 = in the request process)
+    SESSION_EXPORT_WORKERS = int(os.getenv('SESSION_EXPORT_WORKERS', 0))
+    SESSION_EXPORT_CHUNK_SIZE = int(os.getenv('SESSION_EXPORT_CHUNK_SIZE', 500))  # sessions per task
+    # Exports of fewer session files are merged in-process (below two chunks the pool cannot help)
+    SESSION_EXPORT_PARALLEL_MIN_SESSIONS = int(os.getenv('SESSION_EXPORT_PARALLEL_MIN_SESSIONS', 1000))
+    SESSION_MANIFEST_PATH = os.getenv('SESSION_MANIFEST_PATH', '')  # empty = SESSION_LOG_DIR/manifest.db
+    SESSIONS_PAGE_SIZE = int(os.getenv('SESSIONS_PAGE_SIZE', 50))  # /sessions default page size
+    SESSIONS_MAX_PAGE_SIZE = int(os.getenv('SESSIONS_MAX_PAGE_SIZE', 500))
+    # Sessions kept in memory per process (least recently used are evicted; 0 = no cap)
+    SESSION_MAX_RESIDENT = int(os.getenv('SESSION_MAX_RESIDENT', 1000))
+    SESSION_IDLE_TIMEOUT = int(os.getenv('SESSION_IDLE_TIMEOUT', 1800))  # seconds; idle sessions are ended (0 = never)
+    SESSION_REAP_INTERVAL = float(os.getenv('SESSION_REAP_INTERVAL', 60))  # seconds between idle-session sweeps
     
     # ===== RATE LIMITING =====
     RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
@@ -99,9 +197,12 @@ class Config:
     MAX_CONVERSATION_LENGTH = int(os.getenv('MAX_CONVERSATION_LENGTH', 100))
     
     # ===== PERFORMANCE SETTINGS =====
-    RESPONSE_TIMEOUT = int(os.getenv('RESPONSE_TIMEOUT', 60))
+    RESPONSE_TIMEOUT = int(os.getenv('RESPONSE_TIMEOUT', 60))  # seconds per streamed chat turn
     CONNECTION_POOL_SIZE = int(os.getenv('CONNECTION_POOL_SIZE', 10))
-    REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 30))
+    CONNECTION_KEEPALIVE_EXPIRY = float(os.getenv('CONNECTION_KEEPALIVE_EXPIRY', 30.0))
+    ASYNC_CONNECTION_POOL_SIZE = int(os.getenv('ASYNC_CONNECTION_POOL_SIZE', 200))
+    ASYNC_CLIENT_SHARDS = int(os.getenv('ASYNC_CLIENT_SHARDS', 8))
+    REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 30))  # seconds per chat turn, retries included
     
     # ===== SECURITY SETTINGS =====
     SECURITY_HEADERS_ENABLED = os.getenv('SECURITY_HEADERS_ENABLED', 'True').lower() == 'true'
@@ -182,7 +283,8 @@ class Config:
             'frequency_penalty': cls.OPENAI_FREQUENCY_PENALTY,
             'presence_penalty': cls.OPENAI_PRESENCE_PENALTY,
             'timeout': cls.OPENAI_TIMEOUT,
-            'max_retries': cls.OPENAI_MAX_RETRIES
+            'max_retries': cls.OPENAI_MAX_RETRIES,
+            'base_url': cls.OPENAI_BASE_URL
         }
     
     @classmethod
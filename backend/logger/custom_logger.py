@@ -2,6 +2,7 @@ import re
 from datetime import datetime
 import json
 from config import current_config
+from logger.write_behind import log_writer
 
 class Logger:
     @classmethod
@@ -18,8 +19,8 @@ class Logger:
         pass
 
     @classmethod
-    def log_conversation(cls, chatbot_type, user_message, bot_response, user_ip):
-        """Log the conversation with a timestamp and a masked IP address."""
+    def log_conversation(cls, chatbot_type, user_message, bot_response, user_ip, elapsed_ms=None):
+        """Log the conversation with a timestamp, a masked IP address and, if known, the turn's duration."""
         config = cls._get_config()
         
         # Only log if logging to file is enabled
@@ -36,15 +37,13 @@ class Logger:
             "user_message": user_message,
             "bot_response": bot_response
         }
+        if elapsed_ms is not None:
+            log_data["elapsed_ms"] = elapsed_ms
         
         log_file_path = config.LOG_DIR / "conversations.log"
         
-        try:
-            with open(log_file_path, "a", encoding="utf-8") as log_file:
-                log_file.write(json.dumps(log_data) + "\n")
-        except Exception as e:
-            if config.DEBUG:
-                print(f"Error logging conversation: {e}")
+        # Written by the background log writer; the request never waits on disk
+        log_writer.append(log_file_path, json.dumps(log_data) + "\n")
 
     @staticmethod
     def mask_ip(ip_address):
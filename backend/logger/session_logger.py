@@ -1,66 +1,171 @@
 import csv
 import json
 import os
+import sys
+import threading
 import uuid
-from datetime import datetime
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
 from config import current_config
+from logger.session_manifest import SessionManifest
+from logger.session_store import EXPORT_CSV_FIELDS, create_session_store
+
+
+class ActiveSession:
+    """What an in-memory session needs to take its next turn.
+    
+    Turn contents go straight to the session store (and its write-behind
+    queue) and are not kept here, so a resident session costs the same few
+    dozen bytes however long its conversation gets. turns counts the turns
+    this process has seen; with several workers the store settles the final
+    conversation number when the row is written. Turns of one session are
+    numbered and queued under its own lock; live becomes False once the
+    record is evicted or the session ended, and a thread that was waiting
+    on the lock then looks the session up again.
+    """
+    
+    __slots__ = ("turns", "lock", "live")
+    
+    def __init__(self, turns: int = 0):
+        self.turns = turns
+        self.lock = threading.Lock()
+        self.live = True
 
 
 class SessionLogger:
-    """Logger that tracks conversations by session and saves them as CSV files."""
+    """Logger that tracks conversations by session and saves them through a session store.
+    
+    SESSION_STORE picks the backend: per-session CSV files ("csv") or an
+    indexed SQLite database ("sqlite"). Writes go through the background log
+    writer, so store methods that read or move session data flush it first.
+    
+    Only a compact ActiveSession per session is held in memory, for at
+    most SESSION_MAX_RESIDENT sessions; the least
+    recently used one is evicted when a new one comes in and reloaded from
+    the store on its next turn. A background reaper ends sessions that have
+    had no turn for SESSION_IDLE_TIMEOUT seconds.
+    
+    Safe to call from many threads: the logger-wide lock only guards the
+    resident map, and turns are serialised per session, so unrelated
+    sessions never wait on each other. Safe across worker processes too:
+    stores append rows and number them under a per-session file lock (CSV)
+    or in the write transaction (SQLite), never from a worker's own count.
+    """
     
     def __init__(self):
         self.config = current_config()
-        self.sessions: Dict[str, List[Dict]] = {}
-        # Directories are created by config.create_directories()
+        self.sessions: "OrderedDict[str, ActiveSession]" = OrderedDict()
+        self.store = create_session_store(self.config)
+        self.manifest = SessionManifest(self.config, self.store)
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._reaper_pid: Optional[int] = None
+        self._stop = threading.Event()
+        self._stats = {
+            "evictions": 0,
+            "rehydrations": 0,
+            "lock_waits": 0,
+            "reaped": 0,
+            "reap_runs": 0,
+            "reap_errors": 0,
+        }
+        self._last_reap: Optional[str] = None
     
+    def _resident(self, session_id: str, record: ActiveSession) -> ActiveSession:
+        """Keep a session in memory as most recently used and return its record.
+        
+        If another thread made the session resident first, its record wins,
+        so every thread numbers the session's turns under the same lock.
+        """
+        with self._lock:
+            current = self.sessions.get(session_id)
+            if current is not None and current.live:
+                record = current
+            self.sessions[session_id] = record
+            self.sessions.move_to_end(session_id)
+            self._evict(record)
+        return record
     
-    def _get_status_dir(self, status: str) -> str:
-        """Get the directory path for a given status."""
-        if status == "active":
-            return str(self.config.ACTIVE_SESSION_DIR)
-        elif status == "completed":
-            return str(self.config.COMPLETED_SESSION_DIR)
-        else:
-            return str(self.config.SESSION_LOG_DIR / status)
+    def _evict(self, keep: ActiveSession):
+        """Drop the least recently used sessions past the cap (call with self._lock held).
+        
+        Sessions taking a turn right now are skipped; their turns are
+        already in the store, so nothing is lost by evicting the others.
+        """
+        limit = self.config.SESSION_MAX_RESIDENT
+        excess = len(self.sessions) - limit
+        if limit <= 0 or excess <= 0:
+            return
+        victims = []
+        for session_id, record in self.sessions.items():
+            if len(victims) == excess or record is keep:
+                break
+            if record.lock.acquire(blocking=False):
+                victims.append((session_id, record))
+        for session_id, record in victims:
+            record.live = False
+            del self.sessions[session_id]
+            record.lock.release()
+            self._stats["evictions"] += 1
     
-    def _get_csv_path(self, session_id: str, status: str) -> str:
-        """Get the CSV file path for a session."""
-        return os.path.join(self._get_status_dir(status), f"{session_id}.csv")
+    def _get_session(self, session_id: str) -> Optional[ActiveSession]:
+        """A session's in-memory record, reloaded from the store if needed; None if it is not active."""
+        with self._lock:
+            record = self.sessions.get(session_id)
+            if record is not None:
+                self.sessions.move_to_end(session_id)
+                return record
+        return self._load_session(session_id)
     
-    def _get_metadata_path(self, session_id: str, status: str) -> str:
-        """Get the metadata file path for a session."""
-        return os.path.join(self._get_status_dir(status), f"{session_id}_metadata.json")
+    def _lock_session(self, session_id: str) -> Optional[ActiveSession]:
+        """Look up a session and acquire its lock; None if it is not active.
+        
+        The caller must release record.lock.
+        """
+        while True:
+            record = self._get_session(session_id)
+            if record is None:
+                return None
+            if not record.lock.acquire(blocking=False):
+                with self._lock:
+                    self._stats["lock_waits"] += 1
+                record.lock.acquire()
+            if record.live:
+                return record
+            # Evicted or ended while we waited: look it up again
+            record.lock.release()
     
     def create_session(self, user_ip: str) -> str:
         """Create a new session for a user and return the session ID."""
+        self._ensure_reaper()
         session_id = str(uuid.uuid4())
-        self.sessions[session_id] = []
+        self._resident(session_id, ActiveSession())
+        started = datetime.now()
         
         # Create initial session metadata
         metadata = {
             "session_id": session_id,
             "user_ip": user_ip,
-            "start_time": datetime.now().isoformat(),
+            "start_time": started.isoformat(),
             "status": "active"
         }
         
         # Save metadata
-        metadata_path = self._get_metadata_path(session_id, "active")
-        with open(metadata_path, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, indent=2)
+        self.store.create_session(session_id, metadata)
+        self.manifest.session_created(session_id, started.strftime(self.config.LOG_DATE_FORMAT))
         
         return session_id
     
+    def is_active(self, session_id: str) -> bool:
+        """Whether a session can still take turns (it has not been ended or reaped)."""
+        return self._get_session(session_id) is not None
+    
     def log_conversation(self, session_id: str, chatbot_type: str, user_message: str, 
                         bot_response: str, user_ip: str, risk_score: Optional[int] = None,
                         conversation_context: Optional[Dict] = None) -> bool:
         """Log a conversation entry for a specific session."""
-        if session_id not in self.sessions:
-            # Try to load existing session
-            if not self._load_session(session_id):
-                return False
+        self._ensure_reaper()
         
         # Extract assessment answers and chat history from context
         assessment_answers = ""
@@ -73,147 +178,192 @@ class SessionLogger:
                 # Convert chat history to JSON string
                 chat_history = json.dumps(conversation_context["chat_history"], ensure_ascii=False)
         
-        entry = {
-            "timestamp": datetime.now().strftime(self.config.LOG_DATE_FORMAT),
-            "conversation_number": len(self.sessions[session_id]) + 1,
-            "chatbot_type": chatbot_type,
-            "user_message": user_message,
-            "bot_response": bot_response,
-            "user_ip": user_ip,
-            "risk_score": risk_score if risk_score is not None else "",
-            "scenario": conversation_context.get("party_scenario", "") if conversation_context else "",
-            "assessment_answers": assessment_answers,
-            "chat_history": chat_history,
-            "full_context": json.dumps(conversation_context, ensure_ascii=False) if conversation_context else ""
-        }
+        scenario = conversation_context.get("party_scenario", "") if conversation_context else ""
+        full_context = json.dumps(conversation_context, ensure_ascii=False) if conversation_context else ""
         
-        self.sessions[session_id].append(entry)
+        record = self._lock_session(session_id)
+        if record is None:
+            return False
+        try:
+            # Number, timestamp and queue the turn in one step, so rows reach the store in order
+            record.turns += 1
+            entry = {
+                "timestamp": datetime.now().strftime(self.config.LOG_DATE_FORMAT),
+                "conversation_number": record.turns,
+                "chatbot_type": chatbot_type,
+                "user_message": user_message,
+                "bot_response": bot_response,
+                "user_ip": user_ip,
+                "risk_score": risk_score if risk_score is not None else "",
+                "scenario": scenario,
+                "assessment_answers": assessment_answers,
+                "chat_history": chat_history,
+                "full_context": full_context
+            }
+            size = self.store.append_turn(session_id, entry)
+            self.manifest.turn_logged(session_id, entry, size)
+        finally:
+            record.lock.release()
         
-        self._save_session_csv(session_id)
+        return True
+    
+    def _load_session(self, session_id: str) -> Optional[ActiveSession]:
+        """Load an existing active session from the store."""
+        turns = self.store.count_turns(session_id)
+        if turns is None:
+            return None
+        record = self._resident(session_id, ActiveSession(turns))
+        with self._lock:
+            self._stats["rehydrations"] += 1
+        return record
+    
+    def end_session(self, session_id: str) -> bool:
+        """Mark a session as completed and move it to completed folder.
         
+        Works for sessions that are no longer in memory too. Returns False
+        if the session is not active.
+        """
+        record = self._lock_session(session_id)
+        if record is None:
+            return False
+        try:
+            ended = datetime.now()
+            self.store.end_session(session_id, ended)
+            self.manifest.session_ended(session_id, ended.strftime(self.config.LOG_DATE_FORMAT))
+            
+            # Remove from memory
+            record.live = False
+            with self._lock:
+                if self.sessions.get(session_id) is record:
+                    del self.sessions[session_id]
+        finally:
+            record.lock.release()
         return True
     
-    def _load_session(self, session_id: str) -> bool:
-        """Load an existing session from disk."""
-        csv_path = self._get_csv_path(session_id, "active")
-        if os.path.exists(csv_path):
-            self.sessions[session_id] = []
-            with open(csv_path, "r", encoding="utf-8-sig") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    self.sessions[session_id].append(row)
-            return True
-        return False
-    
-    def _save_session_csv(self, session_id: str):
-        """Save session data to CSV file."""
-        if session_id not in self.sessions or not self.sessions[session_id]:
-            return
+    def reap_idle_sessions(self, now: Optional[datetime] = None) -> int:
+        """End every active session idle for longer than SESSION_IDLE_TIMEOUT; returns how many.
         
-        csv_path = self._get_csv_path(session_id, "active")
+        Sessions are found through the manifest, so ones that were evicted
+        from memory or left over from a previous run are reaped as well.
+        """
+        timeout = self.config.SESSION_IDLE_TIMEOUT
+        if timeout <= 0:
+            return 0
+        now = now or datetime.now()
+        cutoff = (now - timedelta(seconds=timeout)).strftime(self.config.LOG_DATE_FORMAT)
         
-        fieldnames = ["timestamp", "conversation_number", "chatbot_type", 
-                     "user_message", "bot_response", "user_ip", "risk_score", "scenario",
-                     "assessment_answers", "chat_history", "full_context"]
+        reaped = errors = 0
+        for session_id in self.manifest.idle_sessions(cutoff):
+            try:
+                if self.end_session(session_id):
+                    reaped += 1
+            except OSError:
+                errors += 1
         
-        with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(self.sessions[session_id])
+        with self._lock:
+            self._stats["reaped"] += reaped
+            self._stats["reap_errors"] += errors
+            self._stats["reap_runs"] += 1
+            self._last_reap = now.isoformat()
+        return reaped
     
-    def end_session(self, session_id: str):
-        """Mark a session as completed and move it to completed folder."""
-        if session_id not in self.sessions:
+    def _ensure_reaper(self):
+        """Start the idle-session reaper thread on first use (again in a forked worker)."""
+        if self.config.SESSION_IDLE_TIMEOUT <= 0 or self._reaper_pid == os.getpid():
             return
-        
-        # Update metadata
-        metadata_path = self._get_metadata_path(session_id, "active")
-        if os.path.exists(metadata_path):
-            with open(metadata_path, "r", encoding="utf-8") as f:
-                metadata = json.load(f)
-            
-            metadata["end_time"] = datetime.now().isoformat()
-            metadata["status"] = "completed"
-            metadata["total_conversations"] = len(self.sessions[session_id])
-            
-            # Move files to completed folder
-            new_metadata_path = self._get_metadata_path(session_id, "completed")
-            with open(new_metadata_path, "w", encoding="utf-8") as f:
-                json.dump(metadata, f, indent=2)
-            os.remove(metadata_path)
-        
-        # Move CSV file
-        old_csv = self._get_csv_path(session_id, "active")
-        new_csv = self._get_csv_path(session_id, "completed")
-        if os.path.exists(old_csv):
-            os.rename(old_csv, new_csv)
-        
-        # Remove from memory
-        del self.sessions[session_id]
+        with self._lock:
+            if self._reaper_pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._reaper = threading.Thread(
+                target=self._run_reaper, args=(self._stop,), name="session-reaper", daemon=True
+            )
+            self._reaper_pid = os.getpid()
+            self._reaper.start()
+    
+    def _run_reaper(self, stop: threading.Event):
+        """Reaper thread: sweep for idle sessions every SESSION_REAP_INTERVAL seconds."""
+        while not stop.wait(self.config.SESSION_REAP_INTERVAL):
+            try:
+                self.reap_idle_sessions()
+            except Exception:
+                # Keep sweeping; a failed run (e.g. a locked manifest) is retried next interval
+                with self._lock:
+                    self._stats["reap_errors"] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get resident session count and approximate memory, evictions, reloads and reaper counts."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["last_reap"] = self._last_reap
+            resident = list(self.sessions.items())
+            stats["resident_bytes"] = sys.getsizeof(self.sessions)
+        stats["resident_sessions"] = len(resident)
+        stats["resident_turns"] = sum(record.turns for _, record in resident)
+        stats["resident_bytes"] += sum(sys.getsizeof(session_id) + sys.getsizeof(record) + sys.getsizeof(record.lock)
+                                       for session_id, record in resident)
+        stats["max_resident"] = self.config.SESSION_MAX_RESIDENT
+        stats["idle_timeout"] = self.config.SESSION_IDLE_TIMEOUT
+        stats["reap_interval"] = self.config.SESSION_REAP_INTERVAL
+        stats["reaper_running"] = self._reaper is not None and self._reaper.is_alive()
+        return stats
     
     def get_session_csv_path(self, session_id: str) -> Optional[str]:
-        """Get the path to a session's CSV file."""
-        # Check both active and completed sessions
-        for status in ["active", "completed"]:
-            csv_path = self._get_csv_path(session_id, status)
-            if os.path.exists(csv_path):
-                return csv_path
-        
-        return None
-    
-    def _list_sessions_in_dir(self, status: str) -> List[str]:
-        """List all session IDs in a specific directory."""
-        sessions = []
-        dir_path = self._get_status_dir(status)
-        if os.path.exists(dir_path):
-            for file in os.listdir(dir_path):
-                if file.endswith(".csv"):
-                    sessions.append(file.replace(".csv", ""))
-        return sessions
+        """Get the path to a session's CSV file (None if the store keeps no files, as with SQLite)."""
+        return self.store.session_csv_path(session_id)
+    
+    def iter_session_csv(self, session_id: str) -> Optional[Iterator[str]]:
+        """Stream a session's CSV as text chunks from the store; None if it has no turns."""
+        return self.store.iter_session_csv(session_id)
     
     def get_all_sessions(self) -> Dict[str, List[str]]:
         """Get all session IDs organized by status."""
-        return {
-            "active": self._list_sessions_in_dir("active"),
-            "completed": self._list_sessions_in_dir("completed")
-        }
+        return self.store.list_sessions()
+    
+    def list_sessions(self, **query) -> Dict:
+        """Get one page of session summaries from the manifest (see SessionManifest.query)."""
+        return self.manifest.query(**query)
     
-    def export_all_sessions_to_csv(self, output_path: str):
-        """Export all sessions (active and completed) to a single CSV file."""
+    def iter_all_sessions(self, chatbot_type: Optional[str] = None, since: Optional[str] = None,
+                          until: Optional[str] = None, min_risk_score: Optional[int] = None) -> Iterator[Dict]:
+        """Yield the turns of all sessions (active and completed) in timestamp order.
+        
+        Rows are produced one at a time, so callers can stream an export of any
+        size. Optional filters keep only turns of one chatbot type, with a
+        timestamp in [since, until] (LOG_DATE_FORMAT strings), or with a risk
+        score of at least min_risk_score.
+        """
         # Only proceed if session export feature is enabled
         if not self.config.FEATURE_SESSION_EXPORT:
+            return iter(())
+        
+        return self.store.iter_export(chatbot_type=chatbot_type, since=since,
+                                      until=until, min_risk_score=min_risk_score)
+    
+    def export_all_sessions_to_csv(self, output_path: str, chatbot_type: Optional[str] = None,
+                                   since: Optional[str] = None, until: Optional[str] = None,
+                                   min_risk_score: Optional[int] = None):
+        """Export all sessions (active and completed) to a single CSV file.
+        
+        Takes the same filters as iter_all_sessions. Returns the number of
+        exported turns; no file is written when there are none.
+        """
+        rows = self.iter_all_sessions(chatbot_type=chatbot_type, since=since,
+                                      until=until, min_risk_score=min_risk_score)
+        first = next(rows, None)
+        if first is None:
             return 0
-            
-        all_data = []
-        
-        # Collect data from all sessions
-        for status in ["active", "completed"]:
-            session_ids = self._list_sessions_in_dir(status)
-            for session_id in session_ids:
-                csv_path = self._get_csv_path(session_id, status)
-                if os.path.exists(csv_path):
-                    with open(csv_path, "r", encoding="utf-8-sig") as f:
-                        reader = csv.DictReader(f)
-                        for row in reader:
-                            row["session_id"] = session_id
-                            row["session_status"] = status
-                            all_data.append(row)
-        
-        # Sort by timestamp
-        all_data.sort(key=lambda x: x.get("timestamp", ""))
-        
-        # Write to output CSV
-        if all_data:
-            fieldnames = ["session_id", "session_status", "timestamp", "conversation_number", 
-                         "chatbot_type", "user_message", "bot_response", "user_ip", 
-                         "risk_score", "scenario", "assessment_answers", "chat_history", "full_context"]
-            
-            with open(output_path, "w", newline="", encoding="utf-8-sig") as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(all_data)
         
-        return len(all_data)
+        count = 1
+        with open(output_path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=EXPORT_CSV_FIELDS)
+            writer.writeheader()
+            writer.writerow(first)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        
+        return count
 
 # Global instance
 session_logger = SessionLogger()
\ No newline at end of file
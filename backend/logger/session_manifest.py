@@ -0,0 +1,257 @@
+"""
+Session manifest: one summary record per session for listing and paging
+"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from logger.write_behind import log_writer
+
+
+class SessionManifest:
+    """Summary of every session in a WAL-mode SQLite file, kept up to date incrementally.
+
+    SessionLogger reports session creation, every turn and session end;
+    the updates are queued on the background log writer and applied in one
+    transaction per batch. Reads page through the index with a keyset cursor,
+    so listing costs the same on page 1 and page 1000. When the manifest file
+    does not exist yet it is rebuilt once from the session store.
+    """
+
+    RECORD_FIELDS = ("session_id", "status", "start_time", "end_time", "last_activity",
+                     "turns", "chatbot_type", "risk_score", "bytes")
+
+    # Sort key -> SQL expression; NULLs are mapped so keyset comparisons hold
+    SORTS = {
+        "start_time": "start_time",
+        "end_time": "COALESCE(end_time, '')",
+        "last_activity": "COALESCE(last_activity, '')",
+        "turns": "turns",
+        "risk_score": "COALESCE(risk_score, -1)",
+        "bytes": "bytes",
+    }
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS manifest ("
+        " session_id TEXT PRIMARY KEY, status TEXT NOT NULL, start_time TEXT NOT NULL, end_time TEXT,"
+        " last_activity TEXT, turns INTEGER NOT NULL DEFAULT 0, chatbot_type TEXT, risk_score INTEGER,"
+        " bytes INTEGER NOT NULL DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS manifest_meta (key TEXT PRIMARY KEY, value TEXT)",
+        # Partial indexes, one per sort key: listings only ever show sessions with turns
+        "CREATE INDEX IF NOT EXISTS idx_manifest_start ON manifest (start_time, session_id) WHERE turns > 0",
+        "CREATE INDEX IF NOT EXISTS idx_manifest_status ON manifest (status, start_time) WHERE turns > 0",
+        "CREATE INDEX IF NOT EXISTS idx_manifest_chatbot ON manifest (chatbot_type, start_time) WHERE turns > 0",
+        "CREATE INDEX IF NOT EXISTS idx_manifest_end ON manifest (COALESCE(end_time, ''), session_id)"
+        " WHERE turns > 0",
+        "CREATE INDEX IF NOT EXISTS idx_manifest_activity ON manifest (COALESCE(last_activity, ''), session_id)"
+        " WHERE turns > 0",
+        "CREATE INDEX IF NOT EXISTS idx_manifest_turns ON manifest (turns, session_id) WHERE turns > 0",
+        "CREATE INDEX IF NOT EXISTS idx_manifest_risk ON manifest (COALESCE(risk_score, -1), session_id)"
+        " WHERE turns > 0",
+        "CREATE INDEX IF NOT EXISTS idx_manifest_bytes ON manifest (bytes, session_id) WHERE turns > 0",
+        # Idle-session sweeps look at every active session, with or without turns
+        "CREATE INDEX IF NOT EXISTS idx_manifest_idle ON manifest (status, COALESCE(last_activity, start_time))",
+    ]
+
+    def __init__(self, config, store):
+        self.config = config
+        self.store = store
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_key = None
+
+    @property
+    def db_path(self) -> str:
+        return self.config.SESSION_MANIFEST_PATH or str(self.config.SESSION_LOG_DIR / "manifest.db")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(f"PRAGMA synchronous={'FULL' if self.config.LOG_FSYNC_MODE == 'batch' else 'NORMAL'}")
+        return db
+
+    def _get_db(self) -> sqlite3.Connection:
+        """The write connection, opened (and the manifest built if new) on first use in this process."""
+        key = (os.getpid(), self.db_path)
+        if self._db is None or self._db_key != key:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            db = self._connect()
+            with db:
+                for statement in self.SCHEMA:
+                    db.execute(statement)
+            self._build(db)
+            self._db = db
+            self._db_key = key
+        return self._db
+
+    def _build(self, db: sqlite3.Connection):
+        """Fill a new manifest from the session store (once, even with several workers)."""
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if db.execute("SELECT 1 FROM manifest_meta WHERE key = 'built'").fetchone() is None:
+                columns = ", ".join(self.RECORD_FIELDS)
+                placeholders = ", ".join("?" for _ in self.RECORD_FIELDS)
+                db.executemany(
+                    f"INSERT OR REPLACE INTO manifest ({columns}) VALUES ({placeholders})",
+                    (tuple(record.get(field) for field in self.RECORD_FIELDS)
+                     for record in self.store.manifest_records(self.config.LOG_DATE_FORMAT)))
+                db.execute("INSERT INTO manifest_meta (key, value) VALUES ('built', '1')")
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def _ready(self):
+        """Open (and if needed build) the manifest on the calling thread, not the writer thread."""
+        if self._db is not None and self._db_key == (os.getpid(), self.db_path):
+            return
+        # A rebuild reads the store, so let queued writes land first
+        log_writer.flush(self.config.LOG_READ_FLUSH_TIMEOUT)
+        with self._lock:
+            self._get_db()
+
+    def _apply(self, ops: List[tuple]):
+        """Apply a batch of queued updates in one transaction (runs on the writer thread)."""
+        with self._lock:
+            db = self._get_db()
+            with db:
+                for op, params in ops:
+                    if op == "create":
+                        db.execute(
+                            "INSERT OR IGNORE INTO manifest (session_id, status, start_time)"
+                            " VALUES (?, 'active', ?)", params)
+                    elif op == "turn":
+                        db.execute(
+                            "INSERT INTO manifest (session_id, status, start_time, last_activity, turns,"
+                            " chatbot_type, risk_score, bytes) VALUES (?, 'active', ?, ?, 1, ?, ?, ?)"
+                            " ON CONFLICT (session_id) DO UPDATE SET turns = turns + 1,"
+                            " last_activity = excluded.last_activity, chatbot_type = excluded.chatbot_type,"
+                            " risk_score = excluded.risk_score, bytes = bytes + excluded.bytes", params)
+                    elif op == "end":
+                        db.execute(
+                            "UPDATE manifest SET status = 'completed', end_time = ? WHERE session_id = ?",
+                            params)
+
+    def session_created(self, session_id: str, start_time: str):
+        self._ready()
+        log_writer.call(self._apply, ("create", (session_id, start_time)))
+
+    def turn_logged(self, session_id: str, entry: Dict, size: int):
+        self._ready()
+        risk_score = entry["risk_score"]
+        log_writer.call(self._apply, ("turn", (
+            session_id, entry["timestamp"], entry["timestamp"], entry["chatbot_type"],
+            None if risk_score == "" else risk_score, size)))
+
+    def session_ended(self, session_id: str, end_time: str):
+        self._ready()
+        log_writer.call(self._apply, ("end", (end_time, session_id)))
+
+    def idle_sessions(self, cutoff: str, limit: int = 1000) -> List[str]:
+        """IDs of active sessions whose last turn (or start, if none) is before cutoff (LOG_DATE_FORMAT).
+
+        The write-behind queue is only flushed when a first look finds
+        candidates, so a turn still queued keeps its session alive. If the
+        writer does not catch up in time none are returned; the next sweep
+        tries again.
+        """
+        self._ready()
+        if not self._idle(cutoff, limit):
+            return []
+        if not log_writer.flush(self.config.LOG_READ_FLUSH_TIMEOUT):
+            return []
+        return self._idle(cutoff, limit)
+
+    def _idle(self, cutoff: str, limit: int) -> List[str]:
+        db = self._connect()
+        try:
+            rows = db.execute(
+                "SELECT session_id FROM manifest WHERE status = 'active'"
+                " AND COALESCE(last_activity, start_time) < ? LIMIT ?", (cutoff, limit)).fetchall()
+        finally:
+            db.close()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _encode_cursor(value, session_id: str) -> str:
+        return base64.urlsafe_b64encode(json.dumps([value, session_id]).encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> list:
+        try:
+            value = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        except (ValueError, UnicodeError):
+            raise ValueError("Invalid cursor")
+        if not isinstance(value, list) or len(value) != 2:
+            raise ValueError("Invalid cursor")
+        return value
+
+    def query(self, status: Optional[str] = None, chatbot_type: Optional[str] = None,
+              min_risk_score: Optional[int] = None, since: Optional[str] = None,
+              until: Optional[str] = None, sort: str = "start_time", descending: bool = True,
+              limit: int = 50, cursor: Optional[str] = None, fresh: bool = False) -> Dict:
+        """Get one page of sessions that have at least one turn.
+
+        Filters apply to the session's status, last chatbot type, last risk
+        score and start time (LOG_DATE_FORMAT strings). Pass the returned
+        next_cursor to get the following page; it is None on the last page.
+        The page may lag turns still queued on the log writer; fresh=True
+        waits for them (up to LOG_READ_FLUSH_TIMEOUT) for read-your-writes.
+
+        Raises:
+            ValueError: Unknown sort key or invalid cursor.
+        """
+        if sort not in self.SORTS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        expression = self.SORTS[sort]
+
+        where, params = ["turns > 0"], []
+        if status is not None:
+            where.append("status = ?")
+            params.append(status)
+        if chatbot_type is not None:
+            where.append("chatbot_type = ?")
+            params.append(chatbot_type)
+        if min_risk_score is not None:
+            where.append("risk_score >= ?")
+            params.append(min_risk_score)
+        if since is not None:
+            where.append("start_time >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("start_time <= ?")
+            params.append(until)
+        filters = " AND ".join(where)
+
+        page_where, page_params = list(where), list(params)
+        if cursor:
+            page_where.append(f"({expression}, session_id) {'<' if descending else '>'} (?, ?)")
+            page_params.extend(self._decode_cursor(cursor))
+        direction = "DESC" if descending else "ASC"
+
+        self._ready()
+        if fresh:
+            log_writer.flush(self.config.LOG_READ_FLUSH_TIMEOUT)
+        db = self._connect()
+        try:
+            db.row_factory = sqlite3.Row
+            total = db.execute(f"SELECT COUNT(*) FROM manifest WHERE {filters}", params).fetchone()[0]
+            rows = db.execute(
+                f"SELECT *, {expression} AS sort_value FROM manifest WHERE {' AND '.join(page_where)}"
+                f" ORDER BY {expression} {direction}, session_id {direction} LIMIT ?",
+                page_params + [limit + 1]).fetchall()
+        finally:
+            db.close()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_cursor(rows[-1]["sort_value"], rows[-1]["session_id"])
+        return {
+            "sessions": [{field: row[field] for field in self.RECORD_FIELDS} for row in rows],
+            "next_cursor": next_cursor,
+            "total": total,
+        }
@@ -0,0 +1,874 @@
+"""
+Storage backends for session conversation logs
+"""
+import atexit
+import csv
+import heapq
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from logger.write_behind import log_writer
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so run a single worker there
+    fcntl = None
+
+# Columns of a per-session CSV download
+SESSION_CSV_FIELDS = ["timestamp", "conversation_number", "chatbot_type",
+                      "user_message", "bot_response", "user_ip", "risk_score", "scenario",
+                      "assessment_answers", "chat_history", "full_context"]
+
+# Columns of the all-sessions export
+EXPORT_CSV_FIELDS = ["session_id", "session_status"] + SESSION_CSV_FIELDS
+
+
+def _matches(row: Dict, chatbot_type=None, since=None, until=None, min_risk_score=None) -> bool:
+    """Apply export filters to a turn row (timestamps compare as LOG_DATE_FORMAT strings)."""
+    if chatbot_type is not None and row.get("chatbot_type") != chatbot_type:
+        return False
+    timestamp = row.get("timestamp", "")
+    if since is not None and timestamp < since:
+        return False
+    if until is not None and timestamp > until:
+        return False
+    if min_risk_score is not None:
+        try:
+            if int(row.get("risk_score")) < min_risk_score:
+                return False
+        except (TypeError, ValueError):
+            return False
+    return True
+
+
+def _format_row(entry: Dict) -> str:
+    """One session CSV row as text."""
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, fieldnames=SESSION_CSV_FIELDS).writerow(entry)
+    return buffer.getvalue()
+
+
+_CSV_HEADER = ",".join(SESSION_CSV_FIELDS) + "\r\n"
+
+
+def _lock_file(fd: int):
+    """Take an exclusive advisory lock on an open file; it is released when the file is closed."""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def _count_records(fd: int) -> int:
+    """Number of CSV records after the header in an open session file."""
+    with os.fdopen(os.dup(fd), "r", newline="", encoding="utf-8-sig") as f:
+        f.seek(0)
+        # Records, not lines: messages may contain newlines
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+def _write_all(fd: int, data: bytes):
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _to_date_format(value: Optional[str], date_format: str) -> Optional[str]:
+    """Convert an ISO timestamp (as in session metadata) to date_format."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).strftime(date_format)
+    except ValueError:
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_export_csv(rows: Iterable[Dict], chunk_size: int = 65536,
+                    fieldnames: List[str] = EXPORT_CSV_FIELDS) -> Iterator[str]:
+    """Render export rows as CSV text (BOM and header first) in chunks of about chunk_size characters."""
+    buffer = io.StringIO()
+    buffer.write("\ufeff")
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _read_record(f: BinaryIO, offset: int) -> Tuple[Optional[List[str]], int]:
+    """Parse the CSV record starting at byte offset; returns it (None at EOF) and the next offset.
+
+    Lines are pulled one readline() at a time, so the file position after the
+    record is exact even when quoted fields span lines.
+    """
+    f.seek(offset)
+    lines = (line.decode("utf-8") for line in iter(f.readline, b""))
+    for record in csv.reader(lines):
+        if record:
+            return record, f.tell()
+    return None, f.tell()
+
+
+def _peek_timestamp(f: BinaryIO, offset: int, fieldnames: List[str]) -> Optional[str]:
+    """Timestamp of the record at offset (None at EOF) without parsing the whole record.
+
+    The timestamp is the first column and never needs quoting, so reading up
+    to the first comma of the record's first line is enough.
+    """
+    if fieldnames[0] != "timestamp":
+        record, _ = _read_record(f, offset)
+        return None if record is None else dict(zip(fieldnames, record)).get("timestamp", "")
+    f.seek(offset)
+    for line in iter(f.readline, b""):
+        if line.strip():
+            return line.split(b",", 1)[0].decode("utf-8")
+    return None
+
+
+class _SessionCursor:
+    """Byte offset of the next unread row of one session CSV."""
+
+    __slots__ = ("session_id", "status", "path", "fieldnames", "offset")
+
+    def __init__(self, session_id: str, status: str, path: str, fieldnames: List[str], offset: int):
+        self.session_id = session_id
+        self.status = status
+        self.path = path
+        self.fieldnames = fieldnames
+        self.offset = offset
+
+
+class _OpenFiles:
+    """A few open session files (LRU), so consecutive rows of a session share one open()."""
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self._files: "OrderedDict[str, BinaryIO]" = OrderedDict()
+
+    def get(self, path: str) -> BinaryIO:
+        f = self._files.get(path)
+        if f is not None:
+            self._files.move_to_end(path)
+            return f
+        f = open(path, "rb")
+        self._files[path] = f
+        if len(self._files) > self.size:
+            self._files.popitem(last=False)[1].close()
+        return f
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+
+def _first_timestamps(paths: List[str]) -> List[Optional[str]]:
+    """Pool task: timestamp of the first row of each session file (None if empty or gone)."""
+    timestamps = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                if f.read(3) != b"\xef\xbb\xbf":
+                    f.seek(0)
+                header, offset = _read_record(f, f.tell())
+                timestamps.append(None if header is None else _peek_timestamp(f, offset, header))
+        except FileNotFoundError:
+            timestamps.append(None)
+    return timestamps
+
+
+def _parse_sessions(sessions: List[Tuple[int, str, str, List[str]]], filters: Dict) -> List[Tuple]:
+    """Pool task: parse a chunk of session files into (timestamp, seq, n, row) in merge order.
+
+    sessions holds (seq, session_id, status, candidate paths); the first path
+    that exists is read, so a session that ended since listing is still found.
+    """
+    rows = []
+    for seq, session_id, status, paths in sessions:
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                    for n, row in enumerate(csv.DictReader(f)):
+                        if _matches(row, **filters):
+                            row["session_id"] = session_id
+                            row["session_status"] = status
+                            rows.append((row.get("timestamp", ""), seq, n, row))
+                break
+            except FileNotFoundError:
+                continue
+    rows.sort(key=lambda item: item[:3])
+    return rows
+
+
+_export_pool: Optional[ProcessPoolExecutor] = None
+_export_pool_pid: Optional[int] = None
+_export_pool_lock = threading.Lock()
+
+
+def _get_export_pool(workers: int) -> ProcessPoolExecutor:
+    """The process-wide export pool, started on first use with workers processes.
+
+    Exports share it, so workers are started once rather than per request; it
+    is shut down at interpreter exit, and a forked worker starts its own.
+    """
+    global _export_pool, _export_pool_pid
+    with _export_pool_lock:
+        if _export_pool is None or _export_pool_pid != os.getpid():
+            # Fork is unsafe with the writer and request threads running
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+            if _export_pool_pid is None:
+                atexit.register(_shutdown_export_pool)
+            _export_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _export_pool_pid = os.getpid()
+        return _export_pool
+
+
+def _shutdown_export_pool(pool: Optional[ProcessPoolExecutor] = None):
+    """Stop the export pool (or only the given one, e.g. after it broke) so the next export starts afresh."""
+    global _export_pool
+    with _export_pool_lock:
+        current = _export_pool
+        if current is None or _export_pool_pid != os.getpid() or pool not in (None, current):
+            return
+        _export_pool = None
+    current.shutdown(wait=False, cancel_futures=True)
+
+
+class CsvSessionStore:
+    """One CSV plus one metadata JSON per session under SESSION_LOG_DIR/{active,completed}.
+
+    Listing and export walk the directories and parse every file; large
+    exports can spread the parsing over a shared pool of
+    SESSION_EXPORT_WORKERS processes.
+    """
+
+    name = "csv"
+
+    # Files whose row count the writer remembers
+    COUNT_CACHE_SIZE = 4096
+
+    def __init__(self, config):
+        self.config = config
+        # (device, inode) of a session CSV -> (size, records) after this process last wrote it
+        self._counts: "OrderedDict[Tuple[int, int], Tuple[int, int]]" = OrderedDict()
+        # Directories are created by config.create_directories()
+
+    def _get_status_dir(self, status: str) -> str:
+        """Get the directory path for a given status."""
+        if status == "active":
+            return str(self.config.ACTIVE_SESSION_DIR)
+        elif status == "completed":
+            return str(self.config.COMPLETED_SESSION_DIR)
+        else:
+            return str(self.config.SESSION_LOG_DIR / status)
+
+    def _get_csv_path(self, session_id: str, status: str) -> str:
+        """Get the CSV file path for a session."""
+        return os.path.join(self._get_status_dir(status), f"{session_id}.csv")
+
+    def _get_metadata_path(self, session_id: str, status: str) -> str:
+        """Get the metadata file path for a session."""
+        return os.path.join(self._get_status_dir(status), f"{session_id}_metadata.json")
+
+    def create_session(self, session_id: str, metadata: Dict):
+        """Queue the initial session metadata file."""
+        metadata_path = self._get_metadata_path(session_id, "active")
+        log_writer.replace(metadata_path, json.dumps(metadata, indent=2))
+
+    def append_turn(self, session_id: str, entry: Dict) -> int:
+        """Queue one conversation row to be appended to the session CSV file.
+
+        Only the new row is written, so the cost of a turn does not grow with
+        the length of the session. Its conversation number is settled when it
+        is written (see _append_rows).
+
+        Returns:
+            int: Size of the row in bytes.
+        """
+        log_writer.call(self._append_rows, (session_id, entry))
+        return len(_format_row(entry).encode("utf-8"))
+
+    def _append_rows(self, items: List[Tuple[str, Dict]]):
+        """Append a batch of queued turns, one locked write per session file (runs on the writer thread).
+
+        Several worker processes may append to the same session, so the
+        number a turn was given in memory can be taken already; rows are
+        numbered in file order under the file's advisory lock instead. The
+        row count is cached per file and only recounted when another process
+        has appended since. The header (with the UTF-8 BOM) is written when
+        the file is new or empty.
+        """
+        by_session: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        for session_id, entry in items:
+            by_session.setdefault(session_id, []).append(entry)
+
+        for session_id, entries in by_session.items():
+            path, fd = self._open_locked(session_id)
+            try:
+                stat = os.fstat(fd)
+                key = (stat.st_dev, stat.st_ino)
+                size, count = self._counts.get(key, (None, 0))
+                if size != stat.st_size:
+                    count = _count_records(fd)
+                chunks = [] if stat.st_size else ["\ufeff" + _CSV_HEADER]
+                for entry in entries:
+                    count += 1
+                    chunks.append(_format_row(dict(entry, conversation_number=count)))
+                data = "".join(chunks).encode("utf-8")
+                _write_all(fd, data)
+                log_writer.written(path, fd)
+                self._counts[key] = (stat.st_size + len(data), count)
+                self._counts.move_to_end(key)
+                while len(self._counts) > self.COUNT_CACHE_SIZE:
+                    self._counts.popitem(last=False)
+            finally:
+                os.close(fd)
+
+    def _open_locked(self, session_id: str) -> Tuple[str, int]:
+        """Open a session CSV for appending and lock it; returns (path, fd).
+
+        A file opened before another worker ended the session has been moved
+        to completed/ with the lock released, so the turn lands there. If the
+        session was ended before the file existed, the empty file opening just
+        created is removed and the completed one is used instead.
+        """
+        flags = os.O_RDWR | os.O_APPEND | os.O_CREAT
+        while True:
+            path = self._get_csv_path(session_id, "active")
+            fd = os.open(path, flags, 0o644)
+            _lock_file(fd)
+            stat = os.fstat(fd)
+            if stat.st_nlink == 0:
+                # Removed by another worker while we waited (see below): open again
+                os.close(fd)
+                continue
+            if (stat.st_size == 0 and not os.path.exists(self._get_metadata_path(session_id, "active"))
+                    and os.path.exists(self._get_metadata_path(session_id, "completed"))):
+                os.unlink(path)
+                os.close(fd)
+                path = self._get_csv_path(session_id, "completed")
+                fd = os.open(path, flags, 0o644)
+                _lock_file(fd)
+            return path, fd
+
+    def count_turns(self, session_id: str) -> Optional[int]:
+        """Count the turns of an active session on disk, or None if it is not active."""
+        log_writer.flush(self.config.LOG_READ_FLUSH_TIMEOUT)
+        csv_path = self._get_csv_path(session_id, "active")
+        if not os.path.exists(csv_path):
+            # A session without turns yet only has its metadata file
+            return 0 if os.path.exists(self._get_metadata_path(session_id, "active")) else None
+        with open(csv_path, "r", newline="", encoding="utf-8-sig") as f:
+            # Records, not lines: messages may contain newlines
+            return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+    def end_session(self, session_id: str, ended: datetime):
+        """Mark a session as completed and move its files to the completed folder.
+
+        The CSV is locked while the files move, so rows other workers are
+        appending either land before the count or follow the file.
+        """
+        log_writer.flush(self.config.LOG_READ_FLUSH_TIMEOUT)
+
+        old_csv = self._get_csv_path(session_id, "active")
+        try:
+            fd = os.open(old_csv, os.O_RDONLY)
+        except FileNotFoundError:
+            fd = None
+        try:
+            if fd is not None:
+                _lock_file(fd)
+
+            # Update metadata
+            metadata_path = self._get_metadata_path(session_id, "active")
+            if os.path.exists(metadata_path):
+                with open(metadata_path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+
+                metadata["end_time"] = ended.isoformat()
+                metadata["status"] = "completed"
+                metadata["total_conversations"] = _count_records(fd) if fd is not None else 0
+
+                # Move files to completed folder
+                new_metadata_path = self._get_metadata_path(session_id, "completed")
+                with open(new_metadata_path, "w", encoding="utf-8") as f:
+                    json.dump(metadata, f, indent=2)
+                os.remove(metadata_path)
+
+            # Move CSV file
+            if fd is not None and os.path.exists(old_csv) and os.path.samestat(os.fstat(fd), os.stat(old_csv)):
+                os.rename(old_csv, self._get_csv_path(session_id, "completed"))
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def session_csv_path(self, session_id: str) -> Optional[str]:
+        """Get the path to a session's CSV file."""
+        log_writer.flush(self.config.LOG_READ_FLUSH_TIMEOUT)
+        # Check both active and completed sessions
+        for status in ["active", "completed"]:
+            csv_path = self._get_csv_path(session_id, status)
+            if os.path.exists(csv_path):
+                return csv_path
+
+        return None
+
+    def iter_session_csv(self, session_id: str, chunk_size: int = 65536) -> Optional[Iterator[str]]:
+        """Stream a session's CSV file as text chunks; None if it has no turns."""
+        csv_path = self.session_csv_path(session_id)
+        if csv_path is None:
+            return None
+
+        def chunks():
+            with open(csv_path, "r", newline="", encoding="utf-8") as f:
+                yield from iter(lambda: f.read(chunk_size), "")
+
+        return chunks()
+
+    def _list_sessions_in_dir(self, status: str) -> List[str]:
+        """List all session IDs in a specific directory."""
+        sessions = []
+        dir_path = self._get_status_dir(status)
+        if os.path.exists(dir_path):
+            for file in os.listdir(dir_path):
+                if file.endswith(".csv"):
+                    sessions.append(file.replace(".csv", ""))
+        return sessions
+
+    def list_sessions(self) -> Dict[str, List[str]]:
+        """Get all session IDs organized by status."""
+        log_writer.flush(self.config.LOG_READ_FLUSH_TIMEOUT)
+        return {
+            "active": self._list_sessions_in_dir("active"),
+            "completed": self._list_sessions_in_dir("completed")
+        }
+
+    def manifest_records(self, date_format: str) -> Iterator[Dict]:
+        """Summarise every session on disk for a manifest rebuild (see SessionManifest.RECORD_FIELDS).
+
+        Does not flush the log writer: the manifest calls this while applying
+        queued writes.
+        """
+        header_bytes = len(("\ufeff" + _CSV_HEADER).encode("utf-8"))
+        for status in ["active", "completed"]:
+            for session_id in self._list_sessions_in_dir(status):
+                csv_path = self._get_csv_path(session_id, status)
+                try:
+                    size = os.path.getsize(csv_path)
+                    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+                        turns, first, last = 0, {}, {}
+                        for last in csv.DictReader(f):
+                            if not turns:
+                                first = last
+                            turns += 1
+                except FileNotFoundError:
+                    continue
+                metadata = {}
+                try:
+                    with open(self._get_metadata_path(session_id, status), "r", encoding="utf-8") as f:
+                        metadata = json.load(f)
+                except (OSError, ValueError):
+                    pass
+                yield {
+                    "session_id": session_id,
+                    "status": status,
+                    "start_time": _to_date_format(metadata.get("start_time"), date_format) or first.get("timestamp"),
+                    "end_time": _to_date_format(metadata.get("end_time"), date_format),
+                    "last_activity": last.get("timestamp"),
+                    "turns": turns,
+                    "chatbot_type": last.get("chatbot_type"),
+                    "risk_score": _to_int(last.get("risk_score")),
+                    "bytes": max(0, size - header_bytes),
+                }
+
+    def _open_cursor(self, files: _OpenFiles, session_id: str, status: str) -> Optional[Tuple[str, _SessionCursor]]:
+        """Read a session's header and first row; returns (first timestamp, cursor) or None if empty."""
+        path = self._get_csv_path(session_id, status)
+        try:
+            f = files.get(path)
+        except FileNotFoundError:
+            return None
+        f.seek(0)
+        if f.read(3) != b"\xef\xbb\xbf":
+            f.seek(0)
+        header, offset = _read_record(f, f.tell())
+        if header is None:
+            return None
+        fieldnames = SESSION_CSV_FIELDS if header == SESSION_CSV_FIELDS else header
+        timestamp = _peek_timestamp(f, offset, fieldnames)
+        if timestamp is None:
+            return None
+        return timestamp, _SessionCursor(session_id, status, path, fieldnames, offset)
+
+    def _open_session_file(self, files: _OpenFiles, cursor: _SessionCursor) -> Optional[BinaryIO]:
+        """Open a cursor's file, following it to completed/ if the session ended mid-export."""
+        try:
+            return files.get(cursor.path)
+        except FileNotFoundError:
+            if cursor.status != "active":
+                return None
+        cursor.path = self._get_csv_path(cursor.session_id, "completed")
+        try:
+            return files.get(cursor.path)
+        except FileNotFoundError:
+            return None
+
+    def iter_export(self, **filters) -> Iterator[Dict]:
+        """Yield matching turns of all sessions in timestamp order.
+
+        With SESSION_EXPORT_WORKERS set and at least
+        SESSION_EXPORT_PARALLEL_MIN_SESSIONS session files, files are parsed
+        on the shared process pool; otherwise they are merged in this process.
+        """
+        log_writer.flush(self.config.LOG_READ_FLUSH_TIMEOUT)
+        sessions = [(status, session_id)
+                    for status in ["active", "completed"]
+                    for session_id in self._list_sessions_in_dir(status)]
+        workers = self.config.SESSION_EXPORT_WORKERS
+        if workers > 0 and len(sessions) >= self.config.SESSION_EXPORT_PARALLEL_MIN_SESSIONS:
+            yield from self._iter_export_parallel(sessions, workers, **filters)
+        else:
+            yield from self._iter_export_merge(sessions, **filters)
+
+    def _iter_export_merge(self, sessions: List[Tuple[str, str]], **filters) -> Iterator[Dict]:
+        """Yield matching turns of all sessions in timestamp order without loading them all.
+
+        Each session file is already in time order, so this is a k-way merge:
+        a heap holds the timestamp and byte offset of the next row of every
+        session, and a row is only parsed when it is popped. Memory stays at
+        one small cursor per session however many turns there are, and the
+        first row is available as soon as every file's first line has been
+        read.
+        """
+        files = _OpenFiles()
+        try:
+            heap = []
+            for status, session_id in sessions:
+                head = self._open_cursor(files, session_id, status)
+                if head is not None:
+                    heap.append((head[0], len(heap), head[1]))
+            heapq.heapify(heap)
+
+            while heap:
+                _, seq, cursor = heap[0]
+                f = self._open_session_file(files, cursor)
+                record = None
+                if f is not None:
+                    record, next_offset = _read_record(f, cursor.offset)
+                if record is None:
+                    heapq.heappop(heap)
+                    continue
+                row = dict(zip(cursor.fieldnames, record))
+
+                timestamp = _peek_timestamp(f, next_offset, cursor.fieldnames)
+                if timestamp is None:
+                    heapq.heappop(heap)
+                else:
+                    cursor.offset = next_offset
+                    heapq.heapreplace(heap, (timestamp, seq, cursor))
+
+                if _matches(row, **filters):
+                    row["session_id"] = cursor.session_id
+                    row["session_status"] = cursor.status
+                    yield row
+        finally:
+            files.close()
+
+
+    def _iter_export_parallel(self, sessions: List[Tuple[str, str]], workers: int, **filters) -> Iterator[Dict]:
+        """Yield matching turns of all sessions in timestamp order, parsed on the export pool.
+
+        The pool first reads the first timestamp of every session, then parses
+        sessions in order of their start in chunks of SESSION_EXPORT_CHUNK_SIZE,
+        with at most two chunks per worker in flight. A parsed row is released
+        once it is older than the start of every session not yet received, so
+        the order is exactly that of the in-process merge and memory is bounded
+        by the sessions that overlap a chunk boundary.
+        """
+        chunk_size = max(1, self.config.SESSION_EXPORT_CHUNK_SIZE)
+        pool = _get_export_pool(workers)
+        try:
+            paths = [self._get_csv_path(session_id, status) for status, session_id in sessions]
+            first = [timestamp
+                     for chunk in pool.map(_first_timestamps,
+                                           [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)])
+                     for timestamp in chunk]
+            order = sorted((timestamp, seq) for seq, timestamp in enumerate(first) if timestamp is not None)
+            chunks = [order[i:i + chunk_size] for i in range(0, len(order), chunk_size)]
+
+            def submit(chunk):
+                tasks = []
+                for _, seq in chunk:
+                    status, session_id = sessions[seq]
+                    candidates = [paths[seq]]
+                    if status == "active":
+                        candidates.append(self._get_csv_path(session_id, "completed"))
+                    tasks.append((seq, session_id, status, candidates))
+                return pool.submit(_parse_sessions, tasks, filters)
+
+            in_flight = deque()
+            submitted = 0
+            pending = []
+            try:
+                for k in range(len(chunks)):
+                    while submitted < len(chunks) and len(in_flight) < workers * 2:
+                        in_flight.append(submit(chunks[submitted]))
+                        submitted += 1
+                    for item in in_flight.popleft().result():
+                        heapq.heappush(pending, item)
+
+                    # Sessions not received yet all start at or after this
+                    watermark = chunks[k + 1][0][0] if k + 1 < len(chunks) else None
+                    while pending and (watermark is None or pending[0][0] < watermark):
+                        yield heapq.heappop(pending)[3]
+            finally:
+                for future in in_flight:
+                    future.cancel()
+        except BrokenProcessPool:
+            _shutdown_export_pool(pool)
+            raise
+
+
+class SqliteSessionStore:
+    """Sessions and turns in one SQLite database in WAL mode.
+
+    Writes are queued on the background log writer and applied in one
+    transaction per batch; reads use their own short-lived connections, which
+    WAL lets run alongside the writer. Turns are indexed by session,
+    timestamp, chatbot type and risk score, so listing, per-session download
+    and filtered export are index queries. Per-session CSVs are streamed from
+    the database on demand in the same format as the CSV store.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        " session_id TEXT PRIMARY KEY, user_ip TEXT, start_time TEXT NOT NULL, end_time TEXT,"
+        " status TEXT NOT NULL DEFAULT 'active', total_conversations INTEGER)",
+        "CREATE TABLE IF NOT EXISTS turns ("
+        " id INTEGER PRIMARY KEY, session_id TEXT NOT NULL, timestamp TEXT NOT NULL,"
+        " conversation_number INTEGER NOT NULL, chatbot_type TEXT, user_message TEXT,"
+        " bot_response TEXT, user_ip TEXT, risk_score INTEGER, scenario TEXT,"
+        " assessment_answers TEXT, chat_history TEXT, full_context TEXT)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions (status, start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_turns_session ON turns (session_id, conversation_number)",
+        "CREATE INDEX IF NOT EXISTS idx_turns_timestamp ON turns (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_turns_chatbot_type ON turns (chatbot_type, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_turns_risk_score ON turns (risk_score)",
+    ]
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_key = None
+
+    @property
+    def db_path(self) -> str:
+        return self.config.SESSION_DB_PATH or str(self.config.SESSION_LOG_DIR / "sessions.db")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        # fsync every commit only when batch durability is asked for
+        db.execute(f"PRAGMA synchronous={'FULL' if self.config.LOG_FSYNC_MODE == 'batch' else 'NORMAL'}")
+        return db
+
+    def _get_db(self) -> sqlite3.Connection:
+        """The write connection, opened (and the schema created) on first use in this process."""
+        key = (os.getpid(), self.db_path)
+        if self._db is None or self._db_key != key:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._db = self._connect()
+            self._db_key = key
+            with self._db:
+                for statement in self.SCHEMA:
+                    self._db.execute(statement)
+        return self._db
+
+    def _iter(self, query: str, params=(), flush: bool = True) -> Iterator[sqlite3.Row]:
+        """Stream a read query on its own connection, after pending writes have landed."""
+        if flush:
+            log_writer.flush(self.config.LOG_READ_FLUSH_TIMEOUT)
+        with self._lock:
+            self._get_db()  # make sure the schema exists
+        db = self._connect()
+        try:
+            db.row_factory = sqlite3.Row
+            yield from db.execute(query, params)
+        finally:
+            db.close()
+
+    def _read(self, query: str, params=(), flush: bool = True) -> List[sqlite3.Row]:
+        return list(self._iter(query, params, flush))
+
+    def _apply(self, ops: List[tuple]):
+        """Apply a batch of queued writes in one transaction (runs on the writer thread)."""
+        with self._lock:
+            db = self._get_db()
+            with db:
+                for op, params in ops:
+                    if op == "session":
+                        db.execute(
+                            "INSERT OR REPLACE INTO sessions (session_id, user_ip, start_time, status)"
+                            " VALUES (?, ?, ?, ?)", params)
+                    elif op == "turn":
+                        # Numbered in the transaction, so turns from several workers never collide
+                        db.execute(
+                            "INSERT INTO turns (session_id, timestamp, conversation_number, chatbot_type,"
+                            " user_message, bot_response, user_ip, risk_score, scenario,"
+                            " assessment_answers, chat_history, full_context)"
+                            " VALUES (?1, ?2, (SELECT COALESCE(MAX(conversation_number), 0) + 1 FROM turns"
+                            " WHERE session_id = ?1), ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11)", params)
+                    elif op == "end":
+                        db.execute(
+                            "UPDATE sessions SET status = 'completed', end_time = ?1,"
+                            " total_conversations = (SELECT COUNT(*) FROM turns WHERE session_id = ?2)"
+                            " WHERE session_id = ?2", params)
+
+    def create_session(self, session_id: str, metadata: Dict):
+        log_writer.call(self._apply, ("session", (
+            session_id, metadata["user_ip"], metadata["start_time"], metadata["status"])))
+
+    def append_turn(self, session_id: str, entry: Dict) -> int:
+        """Queue a turn insert; returns the size in bytes of the turn's CSV row."""
+        risk_score = entry["risk_score"]
+        log_writer.call(self._apply, ("turn", (
+            session_id, entry["timestamp"], entry["chatbot_type"],
+            entry["user_message"], entry["bot_response"], entry["user_ip"],
+            None if risk_score == "" else risk_score, entry["scenario"],
+            entry["assessment_answers"], entry["chat_history"], entry["full_context"])))
+        return len(_format_row(entry).encode("utf-8"))
+
+    def count_turns(self, session_id: str) -> Optional[int]:
+        rows = self._read("SELECT status FROM sessions WHERE session_id = ?", (session_id,))
+        if not rows or rows[0]["status"] != "active":
+            return None
+        return self._read("SELECT COUNT(*) FROM turns WHERE session_id = ?", (session_id,))[0][0]
+
+    def end_session(self, session_id: str, ended: datetime):
+        log_writer.call(self._apply, ("end", (ended.isoformat(), session_id)))
+
+    @staticmethod
+    def _csv_row(row: sqlite3.Row) -> Dict:
+        """Turn a turns row into the dict written to CSV (NULL risk score as empty)."""
+        data = {field: row[field] for field in SESSION_CSV_FIELDS}
+        if data["risk_score"] is None:
+            data["risk_score"] = ""
+        return data
+
+    def session_csv_path(self, session_id: str) -> Optional[str]:
+        """Always None: turns live in the database, not in per-session files (see iter_session_csv)."""
+        return None
+
+    def iter_session_csv(self, session_id: str, chunk_size: int = 65536) -> Optional[Iterator[str]]:
+        """Stream one session's turns from the database as CSV text chunks; None if it has no turns.
+
+        Rows are rendered as they are read, in the CSV store's format, so
+        nothing is written to disk.
+        """
+        rows = self._iter(
+            "SELECT * FROM turns WHERE session_id = ? ORDER BY conversation_number", (session_id,))
+        first = next(rows, None)
+        if first is None:
+            return None
+        return iter_export_csv((self._csv_row(row) for row in itertools.chain([first], rows)),
+                               chunk_size, SESSION_CSV_FIELDS)
+
+    def list_sessions(self) -> Dict[str, List[str]]:
+        """Sessions with at least one turn, by status, oldest first."""
+        sessions = {"active": [], "completed": []}
+        for row in self._read(
+                "SELECT session_id, status FROM sessions s WHERE EXISTS"
+                " (SELECT 1 FROM turns t WHERE t.session_id = s.session_id) ORDER BY start_time"):
+            sessions.setdefault(row["status"], []).append(row["session_id"])
+        return sessions
+
+    def manifest_records(self, date_format: str) -> Iterator[Dict]:
+        """Summarise every session with turns for a manifest rebuild (see SessionManifest.RECORD_FIELDS).
+
+        Does not flush the log writer: the manifest calls this while applying
+        queued writes.
+        """
+        sessions = {row["session_id"]: row for row in self._read("SELECT * FROM sessions", flush=False)}
+        record = None
+        for row in self._iter("SELECT * FROM turns ORDER BY session_id, conversation_number", flush=False):
+            if record is None or record["session_id"] != row["session_id"]:
+                if record is not None:
+                    yield record
+                session = sessions.get(row["session_id"])
+                record = {
+                    "session_id": row["session_id"],
+                    "status": session["status"] if session else "active",
+                    "start_time": _to_date_format(session["start_time"], date_format) if session else row["timestamp"],
+                    "end_time": _to_date_format(session["end_time"], date_format) if session else None,
+                    "turns": 0,
+                    "bytes": 0,
+                }
+            record["turns"] += 1
+            record["bytes"] += len(_format_row(self._csv_row(row)).encode("utf-8"))
+            record["last_activity"] = row["timestamp"]
+            record["chatbot_type"] = row["chatbot_type"]
+            record["risk_score"] = row["risk_score"]
+        if record is not None:
+            yield record
+
+    def iter_export(self, chatbot_type=None, since=None, until=None, min_risk_score=None) -> Iterator[Dict]:
+        """Yield matching turns of all sessions in timestamp order, streamed from an index scan."""
+        where, params = [], []
+        if chatbot_type is not None:
+            where.append("t.chatbot_type = ?")
+            params.append(chatbot_type)
+        if since is not None:
+            where.append("t.timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("t.timestamp <= ?")
+            params.append(until)
+        if min_risk_score is not None:
+            where.append("t.risk_score >= ?")
+            params.append(min_risk_score)
+        query = ("SELECT t.*, s.status AS session_status FROM turns t JOIN sessions s USING (session_id)"
+                 + (" WHERE " + " AND ".join(where) if where else "")
+                 + " ORDER BY t.timestamp, t.id")
+
+        for row in self._iter(query, params):
+            data = self._csv_row(row)
+            data["session_id"] = row["session_id"]
+            data["session_status"] = row["session_status"]
+            yield data
+
+
+SESSION_STORES = {
+    CsvSessionStore.name: CsvSessionStore,
+    SqliteSessionStore.name: SqliteSessionStore,
+}
+
+
+def create_session_store(config):
+    """Build the storage backend named by SESSION_STORE."""
+    store_class = SESSION_STORES.get(config.SESSION_STORE.lower())
+    if store_class is None:
+        raise ValueError(f"Unknown SESSION_STORE: {config.SESSION_STORE}")
+    return store_class(config)
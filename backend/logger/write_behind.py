@@ -0,0 +1,341 @@
+"""
+Write-behind queue for conversation and session log files
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from config import current_config
+
+FSYNC_MODES = ("none", "periodic", "batch")
+
+
+class _Entry:
+    """One pending file write: an append (with optional header) or a whole-file replace."""
+
+    __slots__ = ("path", "text", "header", "encoding", "replace")
+
+    def __init__(self, path: str, text: str, header: Optional[str], encoding: str, replace: bool):
+        self.path = path
+        self.text = text
+        self.header = header
+        self.encoding = encoding
+        self.replace = replace
+
+
+class _Call:
+    """One pending item for a batch handler, e.g. a database insert."""
+
+    __slots__ = ("handler", "item")
+
+    def __init__(self, handler: Callable[[List[Any]], None], item: Any):
+        self.handler = handler
+        self.item = item
+
+
+class _FlushMarker:
+    """Queued behind pending entries; set once everything before it is written."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class LogWriter:
+    """Moves log file I/O off the request path.
+
+    Request threads format their entry and enqueue it; a single background
+    thread drains the bounded queue (LOG_WRITE_QUEUE_SIZE), groups up to
+    LOG_WRITE_BATCH_SIZE entries by file and writes each file with one
+    open/write/close, in submission order. A full queue never blocks the
+    request: the entry is dropped and counted.
+
+    Besides files, call() queues items for a batch handler (such as the
+    SQLite session store), which gets every item of a batch in one call.
+
+    LOG_FSYNC_MODE sets durability: "none" leaves flushing to the OS,
+    "periodic" fsyncs written files every LOG_FSYNC_INTERVAL seconds, and
+    "batch" fsyncs every file before the batch is acknowledged. Pending
+    entries are flushed on interpreter exit, and readers of the log files
+    call flush() first, bounded by LOG_READ_FLUSH_TIMEOUT. With LOG_WRITE_BEHIND_ENABLED off, writes happen
+    synchronously in the caller.
+    """
+
+    def __init__(self):
+        self.config = current_config()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._exit_registered = False
+        self._dirty = set()
+        self._last_fsync = time.monotonic()
+        self._stats = {
+            "submitted": 0,
+            "written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "fsyncs": 0,
+            "write_errors": 0,
+            "flush_timeouts": 0,
+            "max_queue_depth": 0,
+        }
+        self._last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.LOG_WRITE_BEHIND_ENABLED
+
+    @property
+    def fsync_mode(self) -> str:
+        mode = self.config.LOG_FSYNC_MODE.lower()
+        return mode if mode in FSYNC_MODES else "none"
+
+    def append(self, path: str, text: str, header: Optional[str] = None, encoding: str = "utf-8") -> bool:
+        """Queue text to be appended to a file, preceded by header if the file is empty.
+
+        Returns:
+            bool: False if the entry was dropped because the queue is full.
+        """
+        return self._submit(_Entry(str(path), text, header, encoding, False))
+
+    def replace(self, path: str, text: str, encoding: str = "utf-8") -> bool:
+        """Queue an atomic rewrite of a whole (small) file, e.g. session metadata."""
+        return self._submit(_Entry(str(path), text, None, encoding, True))
+
+    def call(self, handler: Callable[[List[Any]], None], item: Any) -> bool:
+        """Queue an item for handler, which is called with a batch of items in submission order."""
+        return self._submit(_Call(handler, item))
+
+    def written(self, path: str, fd: int):
+        """Apply the fsync mode to a file that a call() handler appended to through fd."""
+        if self.fsync_mode == "batch":
+            os.fsync(fd)
+            with self._lock:
+                self._stats["fsyncs"] += 1
+        elif self.fsync_mode == "periodic":
+            with self._lock:
+                self._dirty.add(str(path))
+
+    def _submit(self, entry) -> bool:
+        if not self.enabled:
+            with self._write_lock:
+                self._write([entry])
+            with self._lock:
+                self._stats["submitted"] += 1
+            return True
+
+        entries = self._ensure_started()
+        try:
+            entries.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+        depth = entries.qsize()
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], depth)
+        return True
+
+    def _ensure_started(self) -> queue.Queue:
+        """Start the writer thread on first use (again in a forked worker)."""
+        if self._pid == os.getpid() and self._queue is not None:
+            return self._queue
+        with self._lock:
+            if self._pid != os.getpid() or self._queue is None:
+                self._queue = queue.Queue(maxsize=self.config.LOG_WRITE_QUEUE_SIZE)
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name="log-writer", daemon=True
+                )
+                self._pid = os.getpid()
+                self._thread.start()
+                if not self._exit_registered:
+                    atexit.register(self.close)
+                    self._exit_registered = True
+            return self._queue
+
+    def _run(self, entries: queue.Queue):
+        """Writer thread: drain the queue in batches until told to stop."""
+        while True:
+            wait = self.config.LOG_FSYNC_INTERVAL if self.fsync_mode == "periodic" else None
+            try:
+                item = entries.get(timeout=wait)
+            except queue.Empty:
+                self._periodic_fsync()
+                continue
+
+            batch = [item]
+            while len(batch) < self.config.LOG_WRITE_BATCH_SIZE:
+                try:
+                    batch.append(entries.get_nowait())
+                except queue.Empty:
+                    break
+
+            pending = [e for e in batch if isinstance(e, (_Entry, _Call))]
+            if pending:
+                with self._write_lock:
+                    self._write(pending)
+            self._periodic_fsync()
+            for e in batch:
+                if isinstance(e, _FlushMarker):
+                    e.done.set()
+                entries.task_done()
+            if any(e is _STOP for e in batch):
+                return
+
+    def _write(self, entries: List[Any]):
+        """Write a batch: one open per file (or handler call), entries for a target kept in order."""
+        by_path: "OrderedDict[str, List[_Entry]]" = OrderedDict()
+        by_handler: "OrderedDict[Callable, List[Any]]" = OrderedDict()
+        for entry in entries:
+            if isinstance(entry, _Call):
+                by_handler.setdefault(entry.handler, []).append(entry.item)
+            else:
+                by_path.setdefault(entry.path, []).append(entry)
+
+        for handler, items in by_handler.items():
+            try:
+                handler(items)
+                with self._lock:
+                    self._stats["written"] += len(items)
+            except Exception as e:
+                with self._lock:
+                    self._stats["write_errors"] += len(items)
+                    self._last_error = f"{getattr(handler, '__qualname__', handler)}: {e}"
+
+        batch_fsync = self.fsync_mode == "batch"
+        for path, file_entries in by_path.items():
+            try:
+                i = 0
+                while i < len(file_entries):
+                    entry = file_entries[i]
+                    if entry.replace:
+                        self._replace_file(entry, batch_fsync)
+                        i += 1
+                        continue
+                    # Consecutive appends to the same file share one open()
+                    run = [entry]
+                    while i + len(run) < len(file_entries) and not file_entries[i + len(run)].replace:
+                        run.append(file_entries[i + len(run)])
+                    self._append_file(path, run, batch_fsync)
+                    i += len(run)
+                with self._lock:
+                    self._stats["written"] += len(file_entries)
+                    if self.fsync_mode == "periodic":
+                        self._dirty.add(path)
+            except OSError as e:
+                with self._lock:
+                    self._stats["write_errors"] += len(file_entries)
+                    self._last_error = f"{path}: {e}"
+        with self._lock:
+            self._stats["batches"] += 1
+
+    def _append_file(self, path: str, run: List[_Entry], fsync: bool):
+        with open(path, "a", newline="", encoding=run[0].encoding) as f:
+            for entry in run:
+                if entry.header and f.tell() == 0:
+                    f.write(entry.header)
+                f.write(entry.text)
+            if fsync:
+                self._fsync(f)
+
+    def _replace_file(self, entry: _Entry, fsync: bool):
+        tmp_path = f"{entry.path}.tmp"
+        with open(tmp_path, "w", encoding=entry.encoding) as f:
+            f.write(entry.text)
+            if fsync:
+                self._fsync(f)
+        os.replace(tmp_path, entry.path)
+
+    def _fsync(self, f):
+        f.flush()
+        os.fsync(f.fileno())
+        with self._lock:
+            self._stats["fsyncs"] += 1
+
+    def _periodic_fsync(self, force: bool = False):
+        """In periodic mode, fsync files written since the last interval."""
+        if self.fsync_mode != "periodic":
+            return
+        now = time.monotonic()
+        if not force and now - self._last_fsync < self.config.LOG_FSYNC_INTERVAL:
+            return
+        self._last_fsync = now
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for path in dirty:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue  # moved or removed since (e.g. a completed session)
+            try:
+                os.fsync(fd)
+                with self._lock:
+                    self._stats["fsyncs"] += 1
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far has been written.
+
+        Request paths pass LOG_READ_FLUSH_TIMEOUT and, on a timeout, read
+        what has landed so far rather than stall behind a long queue.
+
+        Returns:
+            bool: False if the writer did not catch up within timeout.
+        """
+        if self._queue is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return True
+        marker = _FlushMarker()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            caught_up = False
+        else:
+            caught_up = marker.done.wait(timeout)
+        if not caught_up:
+            with self._lock:
+                self._stats["flush_timeouts"] += 1
+        return caught_up
+
+    def close(self):
+        """Flush pending entries and stop the writer thread (registered with atexit)."""
+        if self._queue is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        timeout = self.config.LOG_SHUTDOWN_FLUSH_TIMEOUT
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._periodic_fsync(force=True)
+        with self._lock:
+            self._queue = None
+            self._thread = None
+            self._pid = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, throughput, dropped entries and fsync counts."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["last_error"] = self._last_error
+        stats["enabled"] = self.enabled
+        stats["fsync_mode"] = self.fsync_mode
+        stats["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        stats["queue_size"] = self.config.LOG_WRITE_QUEUE_SIZE
+        stats["avg_batch_size"] = round(stats["written"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+
+# Global instance
+log_writer = LogWriter()
@@ -2,7 +2,9 @@
 """
 Test suite for APT Chat Bot configuration system
 """
+import atexit
 import os
+import shutil
 import sys
 import tempfile
 from pathlib import Path
@@ -11,6 +13,14 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# Keep test sessions, manifests and logs out of the real log directory
+# (shared with worker processes the tests spawn, removed by the process that made it)
+if 'APT_TEST_LOG_DIR' not in os.environ:
+    os.environ['APT_TEST_LOG_DIR'] = tempfile.mkdtemp(prefix="apt-test-logs-")
+    atexit.register(shutil.rmtree, os.environ['APT_TEST_LOG_DIR'], True)
+os.environ['LOG_DIR'] = os.environ['APT_TEST_LOG_DIR']
+os.environ['SESSION_MANIFEST_PATH'] = os.path.join(os.environ['LOG_DIR'], 'session_logs', 'manifest.db')
+
 # Add backend to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
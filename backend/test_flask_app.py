@@ -2,16 +2,27 @@
 """
 Test suite for Flask application initialization and routes
 """
+import atexit
+import base64
 import os
+import shutil
 import sys
-import json
 import tempfile
-from unittest.mock import patch, MagicMock
+import json
+from unittest.mock import ANY, patch, MagicMock
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Keep test sessions, manifests and logs out of the real log directory
+# (shared with worker processes the tests spawn, removed by the process that made it)
+if 'APT_TEST_LOG_DIR' not in os.environ:
+    os.environ['APT_TEST_LOG_DIR'] = tempfile.mkdtemp(prefix="apt-test-logs-")
+    atexit.register(shutil.rmtree, os.environ['APT_TEST_LOG_DIR'], True)
+os.environ['LOG_DIR'] = os.environ['APT_TEST_LOG_DIR']
+os.environ['SESSION_MANIFEST_PATH'] = os.path.join(os.environ['LOG_DIR'], 'session_logs', 'manifest.db')
+
 # Add backend to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
@@ -205,6 +216,467 @@ def test_auth_manager():
         print(f"❌ Auth manager test failed: {str(e)}")
         return False
 
+def test_streaming_endpoint():
+    """Test the Server-Sent Events chat endpoint"""
+    print("\nTesting streaming chat endpoint...")
+    try:
+        from app import create_app
+        from chatbot.chatbot import Chatbot
+        
+        app = create_app('testing')
+        client = app.test_client()
+        
+        # Mock the upstream stream with two chunks
+        with patch.object(Chatbot, 'stream_response', return_value=iter(['Hel', 'lo'])), \
+                patch('app.routes.session_logger') as mock_session_logger, \
+                patch('app.routes.Logger') as mock_logger:
+            mock_session_logger.create_session.return_value = 'test-session'
+            response = client.post('/chat/stream', json={'message': 'Hi', 'chatbot_type': 'ai'})
+            assert response.status_code == 200
+            assert response.mimetype == 'text/event-stream'
+            body = response.get_data(as_text=True)
+            assert 'data: {"delta": "Hel"}' in body
+            assert 'data: {"delta": "lo"}' in body
+            assert 'event: done' in body
+            assert '"bot_response": "Hello"' in body
+            
+            # Assembled response is logged once the stream completes
+            mock_logger.log_conversation.assert_called_once_with('ai', 'Hi', 'Hello', '127.0.0.1', elapsed_ms=ANY)
+            assert mock_session_logger.log_conversation.call_args[0][3] == 'Hello'
+        print("✅ Stream chunks and done event emitted")
+        
+        # Scenario replies are streamed as a single chunk
+        with patch('app.routes.session_logger') as mock_session_logger, \
+                patch('app.routes.Logger'):
+            mock_session_logger.create_session.return_value = 'test-session'
+            response = client.post('/chat/stream', json={
+                'message': "I'm driving tonight",
+                'chatbot_type': 'ai',
+                'conversation_context': {'party_scenario': 1}
+            })
+            body = response.get_data(as_text=True)
+            assert 'Smart move' in body
+            assert 'event: done' in body
+        print("✅ Scenario responses streamed")
+        
+        # Validation errors are still returned before streaming
+        response = client.post('/chat/stream', json={'chatbot_type': 'ai'})
+        assert response.status_code == 400
+        print("✅ Invalid requests rejected with 400")
+        
+        # A response that is never iterated still frees its bulkhead slot
+        from chatbot.bulkhead import bulkhead
+        from config import current_config
+        upstream = MagicMock()
+        upstream.with_options.return_value = upstream
+        stream = MagicMock()
+        stream.__iter__.return_value = iter([])
+        upstream.chat.completions.create.return_value = stream
+        bulkhead.reset()
+        with patch('chatbot.chatbot.OpenAIClientPool.get_client', return_value=upstream), \
+                patch.object(current_config(), 'OPENAI_API_KEY', 'test-key'), \
+                patch.object(current_config(), 'RESPONSE_CACHE_ENABLED', False), \
+                patch.object(current_config(), 'SEMANTIC_CACHE_ENABLED', False), \
+                patch('app.routes.session_logger') as mock_session_logger, \
+                app.test_request_context('/chat/stream', method='POST',
+                                         json={'message': 'Hi there', 'chatbot_type': 'ai'}):
+            mock_session_logger.create_session.return_value = 'test-session'
+            response = app.full_dispatch_request()
+            assert response.status_code == 200
+            assert bulkhead.get_stats()['ai']['in_flight'] == 1
+            response.close()
+            assert bulkhead.get_stats()['ai']['in_flight'] == 0
+            stream.close.assert_called()
+        bulkhead.reset()
+        print("✅ Unstarted streams release their bulkhead slot on close")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Streaming endpoint test failed: {str(e)}")
+        return False
+
+def test_circuit_breaker_endpoint():
+    """Test the circuit breaker admin endpoint"""
+    print("\nTesting circuit breaker endpoint...")
+    try:
+        from app import create_app
+        from chatbot.circuit_breaker import circuit_breaker
+        
+        app = create_app('testing')
+        client = app.test_client()
+        auth = {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin').decode()}
+        
+        response = client.get('/admin/circuit_breaker')
+        assert response.status_code == 401
+        
+        response = client.get('/admin/circuit_breaker', headers=auth)
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['circuit_breaker']['state'] == 'closed'
+        assert 'faq' in data['fallback']
+        print("✅ Breaker state exposed")
+        
+        try:
+            response = client.post('/admin/circuit_breaker', json={'action': 'open'}, headers=auth)
+            assert response.get_json()['circuit_breaker']['state'] == 'open'
+            response = client.post('/admin/circuit_breaker', json={'action': 'reset'}, headers=auth)
+            assert response.get_json()['circuit_breaker']['state'] == 'closed'
+        finally:
+            circuit_breaker.reset()
+        print("✅ Breaker can be opened and reset")
+        
+        response = client.post('/admin/circuit_breaker', json={'action': 'explode'}, headers=auth)
+        assert response.status_code == 400
+        print("✅ Unknown actions rejected")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Circuit breaker endpoint test failed: {str(e)}")
+        return False
+
+def test_log_writer_endpoint():
+    """Test the log writer admin endpoint"""
+    print("\nTesting log writer endpoint...")
+    try:
+        from app import create_app
+        
+        app = create_app('testing')
+        client = app.test_client()
+        auth = {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin').decode()}
+        
+        assert client.get('/admin/log_writer').status_code == 401
+        response = client.get('/admin/log_writer', headers=auth)
+        assert response.status_code == 200
+        data = response.get_json()
+        for key in ('queue_depth', 'dropped', 'written', 'fsync_mode'):
+            assert key in data
+        print("✅ Log writer metrics exposed")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Log writer endpoint test failed: {str(e)}")
+        return False
+
+def test_cache_endpoint():
+    """Test the response cache admin endpoint"""
+    print("\nTesting cache endpoint...")
+    try:
+        from app import create_app
+        
+        app = create_app('testing')
+        client = app.test_client()
+        auth = {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin').decode()}
+        
+        assert client.get('/admin/cache').status_code == 401
+        response = client.get('/admin/cache', headers=auth)
+        assert response.status_code == 200
+        data = response.get_json()
+        assert 'hit_rate' in data['response_cache'] and 'size' in data['response_cache']
+        assert 'hit_rate' in data['semantic_cache'] and 'threshold' in data['semantic_cache']
+        assert 'collapse_rate' in data['coalescer'] and 'in_flight' in data['coalescer']
+        print("✅ Cache and coalescing metrics exposed")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Cache endpoint test failed: {str(e)}")
+        return False
+
+def test_token_budget_endpoint():
+    """Test the token budget admin endpoint"""
+    print("\nTesting token budget endpoint...")
+    try:
+        from app import create_app
+        from chatbot.token_budget import token_budget
+        
+        app = create_app('testing')
+        client = app.test_client()
+        auth = {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin').decode()}
+        
+        assert client.get('/admin/token_budget').status_code == 401
+        token_budget.clear()
+        token_budget.record('doctor', {'model': 'gpt-4o-mini', 'max_tokens': 200, 'messages': []},
+                            MagicMock(prompt_tokens=30, completion_tokens=200), 'length', 0.8)
+        response = client.get('/admin/token_budget', headers=auth)
+        assert response.status_code == 200
+        data = response.get_json()['doctor']
+        assert data['turns'] == 1 and data['truncated'] == 1
+        assert data['avg_max_tokens'] == 200
+        token_budget.clear()
+        print("✅ Token budget metrics exposed")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Token budget endpoint test failed: {str(e)}")
+        return False
+
+def test_session_logger_endpoint():
+    """Test the session logger admin endpoint and reaped-session replacement"""
+    print("\nTesting session logger endpoint...")
+    try:
+        from app import create_app
+        from chatbot.chatbot import Chatbot
+        
+        app = create_app('testing')
+        client = app.test_client()
+        auth = {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin').decode()}
+        
+        assert client.get('/admin/session_logger').status_code == 401
+        response = client.get('/admin/session_logger', headers=auth)
+        assert response.status_code == 200
+        data = response.get_json()
+        for key in ('resident_sessions', 'resident_bytes', 'max_resident', 'evictions', 'reaped'):
+            assert key in data
+        print("✅ Session logger metrics exposed")
+        
+        # A session ended by the reaper is replaced on the next turn
+        with patch.object(Chatbot, 'stream_response', return_value=iter(['Hi'])), \
+                patch('app.routes.session_logger') as mock_session_logger, \
+                patch('app.routes.Logger'):
+            mock_session_logger.create_session.side_effect = ['first-session', 'second-session']
+            mock_session_logger.is_active.return_value = False
+            client.post('/chat/stream', json={'message': 'Hi', 'chatbot_type': 'ai'}).get_data()
+            client.post('/chat/stream', json={'message': 'Hi', 'chatbot_type': 'ai'}).get_data()
+            assert mock_session_logger.create_session.call_count == 2
+            assert mock_session_logger.log_conversation.call_args[0][0] == 'second-session'
+        print("✅ Reaped session replaced with a new one")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Session logger endpoint test failed: {str(e)}")
+        return False
+
+def test_reaped_session_turns():
+    """Test that a turn is not dropped when its session is reaped mid-request"""
+    print("\nTesting turns of reaped sessions...")
+    try:
+        import flask
+        from pathlib import Path
+        from app import create_app
+        from chatbot.chatbot import Chatbot
+        from config import current_config
+        from logger.session_logger import SessionLogger
+        
+        app = create_app('testing')
+        client = app.test_client()
+        config = current_config()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / "active").mkdir()
+            (root / "completed").mkdir()
+            with patch.object(config, 'SESSION_STORE', 'csv'), \
+                    patch.object(config, 'SESSION_LOG_DIR', root), \
+                    patch.object(config, 'ACTIVE_SESSION_DIR', root / "active"), \
+                    patch.object(config, 'COMPLETED_SESSION_DIR', root / "completed"), \
+                    patch.object(config, 'SESSION_MANIFEST_PATH', ''), \
+                    patch.object(config, 'SESSION_REAP_INTERVAL', 3600), \
+                    patch('app.routes.Logger'):
+                logger = SessionLogger()
+                
+                # The reaper ends the session while the reply is streamed
+                def reaped_stream(*args, **kwargs):
+                    reaped = flask.session['session_id']
+                    
+                    def chunks():
+                        logger.end_session(reaped)
+                        yield 'Hello'
+                    return chunks()
+                
+                with patch('app.routes.session_logger', logger), \
+                        patch.object(Chatbot, 'stream_response', side_effect=reaped_stream):
+                    body = client.post('/chat/stream', json={'message': 'Hi', 'chatbot_type': 'ai'}).get_data(as_text=True)
+                done = json.loads(body.split('event: done\ndata: ')[1])
+                assert logger.is_active(done['session_id'])
+                assert logger.store.count_turns(done['session_id']) == 1
+                print("✅ Streamed turn logged to a new session")
+                
+                # Ended after the session was resolved: the cookie moves to the new session
+                with patch('app.routes.session_logger', logger), \
+                        patch.object(Chatbot, 'get_response', return_value='Hello'):
+                    first = client.post('/', json={'message': 'Hi', 'chatbot_type': 'ai'}).get_json()['session_id']
+                    logger.end_session(first)
+                    with patch.object(logger, 'is_active', return_value=True):
+                        second = client.post('/', json={'message': 'Hi', 'chatbot_type': 'ai'}).get_json()['session_id']
+                    third = client.post('/', json={'message': 'Hi', 'chatbot_type': 'ai'}).get_json()['session_id']
+                assert second != first and third == second
+                assert logger.store.count_turns(second) == 2
+                print("✅ Chat turn logged to a new session and the cookie follows it")
+                logger.end_session(second)
+                logger.end_session(done['session_id'])
+                from logger.write_behind import log_writer
+                log_writer.flush()
+        
+        return True
+    except Exception as e:
+        print(f"❌ Reaped session turns test failed: {str(e)}")
+        return False
+
+def test_export_filters():
+    """Test the filter parameters of the all-sessions download"""
+    print("\nTesting export filters...")
+    try:
+        from unittest.mock import patch
+        from app import create_app
+        from logger.session_logger import session_logger
+        
+        app = create_app('testing')
+        client = app.test_client()
+        auth = {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin').decode()}
+        
+        for query in ('chatbot_type=bogus', 'since=yesterday', 'until=2024-13-01', 'min_risk_score=high'):
+            assert client.get(f'/download_all_sessions?{query}', headers=auth).status_code == 400
+        print("✅ Invalid filters rejected with 400")
+        
+        with patch.object(session_logger, 'iter_all_sessions', return_value=iter(())) as export:
+            response = client.get('/download_all_sessions?chatbot_type=ai&since=2024-05-01'
+                                  '&until=2024-05-31&min_risk_score=5', headers=auth)
+        assert response.status_code == 404
+        assert export.call_args[1] == {'chatbot_type': 'ai', 'since': '2024-05-01 00:00:00',
+                                       'until': '2024-05-31 23:59:59', 'min_risk_score': 5}
+        print("✅ Filters passed to the export")
+        
+        rows = [{'session_id': 's1', 'session_status': 'active', 'timestamp': '2024-05-01 10:00:00',
+                 'conversation_number': 1, 'chatbot_type': 'ai', 'user_message': 'Hi, "there"'}]
+        with patch.object(session_logger, 'iter_all_sessions', return_value=iter(rows)):
+            response = client.get('/download_all_sessions', headers=auth)
+        assert response.status_code == 200
+        assert response.is_streamed and response.mimetype == 'text/csv'
+        assert 'attachment; filename=all_sessions_' in response.headers['Content-Disposition']
+        body = response.get_data().decode('utf-8')
+        assert body.startswith('\ufeffsession_id,session_status,timestamp')
+        assert 's1,active,2024-05-01 10:00:00,1,ai,"Hi, ""there"""' in body
+        print("✅ Export streamed as CSV")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Export filters test failed: {str(e)}")
+        return False
+
+def test_sessions_endpoint():
+    """Test the paginated /sessions endpoint"""
+    print("\nTesting sessions endpoint...")
+    try:
+        from unittest.mock import patch
+        from app import create_app
+        from logger.session_logger import session_logger
+        
+        app = create_app('testing')
+        client = app.test_client()
+        auth = {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin').decode()}
+        
+        for query in ('status=open', 'order=sideways', 'limit=ten', 'sort=user_ip', 'cursor=%%%'):
+            assert client.get(f'/sessions?{query}', headers=auth).status_code == 400
+        print("✅ Invalid parameters rejected with 400")
+        
+        page = {'sessions': [], 'next_cursor': None, 'total': 0}
+        with patch.object(session_logger.manifest, 'query', return_value=page) as query:
+            response = client.get('/sessions?status=completed&chatbot_type=doctor&min_risk_score=5'
+                                  '&sort=turns&order=asc&limit=100000&cursor=abc', headers=auth)
+        assert response.status_code == 200
+        assert response.get_json() == page
+        assert query.call_args[1] == {'status': 'completed', 'chatbot_type': 'doctor', 'min_risk_score': 5,
+                                      'sort': 'turns', 'descending': False, 'limit': 500, 'cursor': 'abc'}
+        print("✅ Query parameters passed to the manifest")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Sessions endpoint test failed: {str(e)}")
+        return False
+
+def test_admission_control_response():
+    """Test 503 with Retry-After on bulkhead overflow and 504 on deadline overrun"""
+    print("\nTesting admission control response...")
+    try:
+        from app import create_app
+        from chatbot.bulkhead import AdmissionRejected
+        from chatbot.chatbot import Chatbot
+        from chatbot.deadline import DeadlineExceeded
+        
+        app = create_app('testing')
+        client = app.test_client()
+        
+        rejection = AdmissionRejected("The ai chatbot is busy (queue full). Please try again shortly.", 3)
+        with patch.object(Chatbot, 'get_response', side_effect=rejection):
+            response = client.post('/', json={'message': 'Hi', 'chatbot_type': 'ai'})
+        assert response.status_code == 503
+        assert response.headers.get('Retry-After') == '3'
+        assert 'busy' in response.get_json()['message']
+        print("✅ Overflow returned as 503 with Retry-After")
+        
+        with patch.object(Chatbot, 'get_response', side_effect=DeadlineExceeded("upstream call", 30)):
+            response = client.post('/', json={'message': 'Hi', 'chatbot_type': 'ai'})
+        assert response.status_code == 504
+        print("✅ Deadline overrun returned as 504")
+        
+        auth = {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin').decode()}
+        response = client.get('/admin/bulkhead', headers=auth)
+        assert response.status_code == 200
+        print("✅ Bulkhead metrics exposed")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Admission control response test failed: {str(e)}")
+        return False
+
+def test_asgi_chat_endpoint():
+    """Test the ASGI entry point dispatches POST / to the async chat view"""
+    print("\nTesting ASGI async chat endpoint...")
+    try:
+        import asyncio
+        from unittest.mock import AsyncMock
+        from asgi import AsyncChatDispatcher
+        from app import create_app
+        from chatbot.async_chatbot import AsyncChatbot
+        
+        asgi_app = AsyncChatDispatcher(create_app('testing'))
+        
+        async def asgi_request(method, path, payload=None):
+            body = json.dumps(payload).encode() if payload is not None else b""
+            messages = [{"type": "http.request", "body": body, "more_body": False}]
+            sent = []
+            
+            async def receive():
+                return messages.pop(0) if messages else {"type": "http.disconnect"}
+            
+            async def send(message):
+                sent.append(message)
+            
+            scope = {
+                "type": "http", "http_version": "1.1", "scheme": "http",
+                "method": method, "path": path, "raw_path": path.encode(),
+                "root_path": "", "query_string": b"",
+                "headers": [(b"host", b"localhost"), (b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())],
+                "client": ("127.0.0.1", 50000), "server": ("localhost", 8000),
+            }
+            await asgi_app(scope, receive, send)
+            body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+            return sent[0]["status"], json.loads(body)
+        
+        with patch.object(AsyncChatbot, 'get_response', new=AsyncMock(return_value='Async hello')) as mock_get, \
+                patch('app.routes.session_logger') as mock_session_logger, \
+                patch('app.routes.Logger'):
+            mock_session_logger.create_session.return_value = 'test-session'
+            status, data = asyncio.run(asgi_request("POST", "/", {'message': 'Hi', 'chatbot_type': 'ai'}))
+            assert status == 200
+            assert data == {'bot_response': 'Async hello', 'session_id': 'test-session'}
+            mock_get.assert_awaited_once()
+            mock_session_logger.log_conversation.assert_called_once()
+        print("✅ POST / served by async view")
+        
+        status, data = asyncio.run(asgi_request("POST", "/", {'chatbot_type': 'ai'}))
+        assert status == 400
+        print("✅ Validation errors use Flask error handlers")
+        
+        status, data = asyncio.run(asgi_request("GET", "/"))
+        assert status == 200
+        assert 'message' in data
+        print("✅ Sync routes fall back to WSGI")
+        
+        return True
+    except Exception as e:
+        print(f"❌ ASGI chat endpoint test failed: {str(e)}")
+        return False
+
 def run_all_tests():
     """Run all Flask application tests"""
     print("=" * 50)
@@ -219,7 +691,18 @@ def run_all_tests():
         test_security_headers,
         test_logging_setup,
         test_validation_module,
-        test_auth_manager
+        test_auth_manager,
+        test_streaming_endpoint,
+        test_circuit_breaker_endpoint,
+        test_log_writer_endpoint,
+        test_cache_endpoint,
+        test_token_budget_endpoint,
+        test_session_logger_endpoint,
+        test_reaped_session_turns,
+        test_export_filters,
+        test_sessions_endpoint,
+        test_admission_control_response,
+        test_asgi_chat_endpoint
     ]
     
     passed = 0
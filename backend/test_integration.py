@@ -2,15 +2,27 @@
 """
 Integration tests for APT Chat Bot modules
 """
+import atexit
 import os
+import shutil
 import sys
+import tempfile
 import json
+import time
 from unittest.mock import patch, MagicMock
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Keep test sessions, manifests and logs out of the real log directory
+# (shared with worker processes the tests spawn, removed by the process that made it)
+if 'APT_TEST_LOG_DIR' not in os.environ:
+    os.environ['APT_TEST_LOG_DIR'] = tempfile.mkdtemp(prefix="apt-test-logs-")
+    atexit.register(shutil.rmtree, os.environ['APT_TEST_LOG_DIR'], True)
+os.environ['LOG_DIR'] = os.environ['APT_TEST_LOG_DIR']
+os.environ['SESSION_MANIFEST_PATH'] = os.path.join(os.environ['LOG_DIR'], 'session_logs', 'manifest.db')
+
 # Add backend to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
@@ -24,8 +36,10 @@ def test_chatbot_integration():
         mock_response.choices = [MagicMock(message=MagicMock(content="Test response"))]
         mock_openai.chat.completions.create.return_value = mock_response
         
-        with patch('chatbot.chatbot.OpenAI', return_value=mock_openai):
+        with patch('chatbot.client_pool.OpenAI', return_value=mock_openai):
             from chatbot.chatbot import Chatbot
+            from chatbot.client_pool import OpenAIClientPool
+            OpenAIClientPool.reset()
             
             # Test basic response
             response = Chatbot.get_response('ai', 'Hello', api_key='test-key')
@@ -46,6 +60,8 @@ def test_chatbot_integration():
             assert "Simple and smooth" in response or "water" in response.lower()
             print("✅ Date scenario handler working")
             
+            OpenAIClientPool.reset()
+            
         return True
     except Exception as e:
         import traceback
@@ -53,6 +69,915 @@ def test_chatbot_integration():
         traceback.print_exc()
         return False
 
+def test_client_pool():
+    """Test the shared OpenAI client pool"""
+    print("\nTesting OpenAI client pool...")
+    try:
+        from chatbot.client_pool import OpenAIClientPool
+        
+        OpenAIClientPool.reset()
+        
+        # Same API key should reuse the same client
+        client_a = OpenAIClientPool.get_client('test-key')
+        client_b = OpenAIClientPool.get_client('test-key')
+        assert client_a is client_b
+        assert OpenAIClientPool.get_client('other-key') is not client_a
+        print("✅ Client reused across calls")
+        
+        stats = OpenAIClientPool.get_stats()
+        assert stats['clients_created'] == 2
+        assert stats['active_clients'] == 2
+        assert stats['requests'] == 0
+        assert 'reuse_rate' in stats
+        print("✅ Pool statistics available")
+        
+        OpenAIClientPool.reset()
+        assert OpenAIClientPool.get_stats()['active_clients'] == 0
+        print("✅ Pool reset working")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Client pool test failed: {str(e)}")
+        return False
+
+def test_async_client_pool():
+    """Test that async clients are kept per event loop and closed with it"""
+    print("\nTesting async OpenAI client pool...")
+    try:
+        import asyncio
+        import threading
+        from chatbot.client_pool import AsyncOpenAIClientPool
+        
+        AsyncOpenAIClientPool.reset()
+        
+        async def two_clients():
+            return AsyncOpenAIClientPool.get_client('test-key'), AsyncOpenAIClientPool.get_client('test-key')
+        
+        first, second = asyncio.run(two_clients())
+        stats = AsyncOpenAIClientPool.get_stats()
+        assert stats['clients_created'] == 1
+        assert stats['active_loops'] == 0 and stats['active_clients'] == 0
+        assert first.is_closed() and second.is_closed()
+        print("✅ Clients reused on a loop and closed when it shuts down")
+        
+        # Two loops at once, as Flask runs each /chat/async request under WSGI
+        barrier = threading.Barrier(2)
+        seen = {}
+        
+        async def hold_client(name):
+            seen[name] = AsyncOpenAIClientPool.get_client('test-key')
+            barrier.wait(timeout=5)
+            await asyncio.sleep(0)
+            AsyncOpenAIClientPool.get_client('test-key')  # reused on the same loop
+            assert not seen[name].is_closed()
+            seen[name + '_ok'] = True
+            barrier.wait(timeout=5)
+        
+        threads = [threading.Thread(target=asyncio.run, args=(hold_client(name),)) for name in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        assert seen.get('a_ok') and seen.get('b_ok')
+        assert seen['a'] is not seen['b']
+        assert seen['a'].is_closed() and seen['b'].is_closed()
+        assert AsyncOpenAIClientPool.get_stats()['clients_created'] == 3
+        assert AsyncOpenAIClientPool.get_stats()['active_loops'] == 0
+        print("✅ Concurrent loops keep their own clients")
+        
+        AsyncOpenAIClientPool.reset()
+        return True
+    except Exception as e:
+        print(f"❌ Async client pool test failed: {str(e)}")
+        return False
+
+def test_response_cache():
+    """Test the LLM response cache"""
+    print("\nTesting response cache...")
+    try:
+        import tempfile
+        import time
+        from chatbot.response_cache import ResponseCache
+        
+        params = {
+            'model': 'gpt-test', 'temperature': 0.7, 'max_tokens': 100,
+            'messages': [{'role': 'system', 'content': 'Be friendly.'}, {'role': 'user', 'content': 'x'}]
+        }
+        
+        # Normalised messages share a key; persona and params do not
+        key = ResponseCache.make_key('What is a standard drink?', params)
+        assert key == ResponseCache.make_key('  what is a   STANDARD drink ', params)
+        formal = dict(params, messages=[{'role': 'system', 'content': 'Be formal.'}])
+        assert key != ResponseCache.make_key('What is a standard drink?', formal)
+        assert key != ResponseCache.make_key('What is a standard drink?', dict(params, temperature=0.2))
+        print("✅ Cache keys normalised per persona and parameters")
+        
+        cache = ResponseCache()
+        with patch.object(cache.config, 'RESPONSE_CACHE_MAX_ENTRIES', 2), \
+                patch.object(cache.config, 'RESPONSE_CACHE_DB_PATH', ''):
+            cache.set('a', 'A')
+            cache.set('b', 'B')
+            assert cache.get('a') == 'A'  # 'a' becomes most recently used
+            cache.set('c', 'C')
+            assert cache.get('b') is None
+            assert cache.get('a') == 'A'
+            stats = cache.get_stats()
+            assert stats['evictions'] == 1
+            assert stats['hits'] == 2 and stats['misses'] == 1
+            print("✅ LRU eviction and counters working")
+            
+            cache.set('short', 'S', ttl=0.05)
+            time.sleep(0.1)
+            assert cache.get('short') is None
+            assert cache.get_stats()['expirations'] == 1
+            print("✅ TTL expiry working")
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, 'cache.db')
+            with patch.object(cache.config, 'RESPONSE_CACHE_DB_PATH', db_path):
+                ResponseCache().set('persisted', 'P')
+                restarted = ResponseCache()
+                assert restarted.get('persisted') == 'P'
+                assert restarted.get_stats()['disk_hits'] == 1
+                restarted._db.close()
+        print("✅ SQLite tier survives restarts")
+        
+        # Repeated questions to the same persona skip the upstream call
+        mock_openai = MagicMock()
+        mock_openai.chat.completions.create.return_value = MagicMock(
+            choices=[MagicMock(message=MagicMock(content="One standard drink is 14g of alcohol."))]
+        )
+        with patch('chatbot.client_pool.OpenAI', return_value=mock_openai):
+            from chatbot.chatbot import Chatbot
+            from chatbot.client_pool import OpenAIClientPool
+            from chatbot.response_cache import response_cache
+            OpenAIClientPool.reset()
+            response_cache.clear()
+            first = Chatbot.get_response('doctor', 'What is a standard drink?', api_key='test-key')
+            second = Chatbot.get_response('doctor', 'what is a standard drink', api_key='test-key')
+            assert first == second
+            assert mock_openai.chat.completions.create.call_count == 1
+            response_cache.clear()
+            OpenAIClientPool.reset()
+        print("✅ Chatbot serves repeated questions from cache")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Response cache test failed: {str(e)}")
+        return False
+
+def test_semantic_cache():
+    """Test the near-duplicate semantic response cache"""
+    print("\nTesting semantic cache...")
+    try:
+        from chatbot.semantic_cache import SemanticCache
+        
+        cache = SemanticCache()
+        with patch.object(cache.config, 'SEMANTIC_CACHE_THRESHOLD', 0.8), \
+                patch.object(cache.config, 'SEMANTIC_CACHE_MAX_ENTRIES', 2):
+            cache.set('ai', 'how much is one drink', 'About 14 grams of alcohol.')
+            
+            # Paraphrases above the threshold are served, unrelated questions are not
+            assert cache.get('ai', 'How much is one drink??') == 'About 14 grams of alcohol.'
+            assert cache.get('ai', 'how do I say no at a party') is None
+            assert cache.get('doctor', 'how much is one drink') is None
+            print("✅ Near-duplicate lookup respects threshold and namespace")
+            
+            # Full index evicts the least recently used entry
+            cache.set('ai', 'is it safe to drive after two beers', 'No.')
+            cache.get('ai', 'how much is one drink')
+            cache.set('ai', 'what happens during a blackout', 'Memory gaps.')
+            assert cache.get('ai', 'is it safe to drive after two beers') is None
+            assert cache.get('ai', 'how much is one drink') is not None
+            stats = cache.get_stats()
+            assert stats['evictions'] == 1
+            assert stats['size'] == 2
+            print("✅ LRU eviction working")
+        
+        # An exact repeat still hits after many similar questions shift the IDF
+        cache = SemanticCache()
+        cache.set('ai', 'how much is one drink', 'About 14 grams of alcohol.')
+        for i in range(300):
+            cache.set('ai', f'how much is question number {i}', 'Other answer.')
+        assert cache.get('ai', 'how much is one drink', threshold=0.99) == 'About 14 grams of alcohol.'
+        index = cache._indexes['ai']
+        assert index.reweight_at > index.doc_count == 301
+        print("✅ Stored vectors follow the corpus IDF")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Semantic cache test failed: {str(e)}")
+        return False
+
+def test_request_coalescing():
+    """Test single-flight coalescing of identical in-flight requests"""
+    print("\nTesting request coalescing...")
+    try:
+        import asyncio
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from chatbot.coalescer import RequestCoalescer
+        
+        coalescer = RequestCoalescer()
+        upstream_calls = []
+        barrier = threading.Barrier(10)
+        
+        def fetch():
+            upstream_calls.append(1)
+            time.sleep(0.2)
+            return "shared answer"
+        
+        def caller(_):
+            barrier.wait()
+            return coalescer.call('same-key', fetch)
+        
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            results = list(pool.map(caller, range(10)))
+        assert results == ["shared answer"] * 10
+        assert len(upstream_calls) == 1
+        stats = coalescer.get_stats()
+        assert stats['calls'] == 10 and stats['collapsed'] == 9
+        print("✅ Concurrent identical calls share one upstream request")
+        
+        # Errors are shared with every waiter
+        def failing_fetch():
+            time.sleep(0.2)
+            raise RuntimeError("upstream down")
+        
+        def failing_caller(_):
+            try:
+                coalescer.call('error-key', failing_fetch)
+            except RuntimeError as e:
+                return str(e)
+        
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            errors = list(pool.map(failing_caller, range(3)))
+        assert errors == ["upstream down"] * 3
+        assert coalescer.get_stats()['shared_errors'] == 2
+        print("✅ Errors propagated to all waiters")
+        
+        async def run_async():
+            calls = []
+            
+            async def async_fetch():
+                calls.append(1)
+                await asyncio.sleep(0.1)
+                return "async answer"
+            
+            results = await asyncio.gather(*[coalescer.call_async('async-key', async_fetch) for _ in range(5)])
+            return results, len(calls)
+        
+        results, calls = asyncio.run(run_async())
+        assert results == ["async answer"] * 5 and calls == 1
+        print("✅ Async callers coalesced")
+        
+        # A cancelled leader hands over to a follower instead of cancelling it
+        async def run_cancelled_leader():
+            calls = []
+            
+            async def async_fetch():
+                calls.append(1)
+                await asyncio.sleep(0.1)
+                return "retried answer"
+            
+            leader = asyncio.create_task(coalescer.call_async('cancel-key', async_fetch))
+            await asyncio.sleep(0)
+            followers = [asyncio.create_task(coalescer.call_async('cancel-key', async_fetch)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            results = await asyncio.gather(*followers)
+            return leader.cancelled(), results, len(calls)
+        
+        leader_cancelled, results, calls = asyncio.run(run_cancelled_leader())
+        assert leader_cancelled
+        assert results == ["retried answer"] * 3 and calls == 2
+        print("✅ Followers take over from a cancelled leader")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Request coalescing test failed: {str(e)}")
+        return False
+
+def test_scenario_registry():
+    """Test the compiled scenario matcher against the original keyword rules"""
+    print("\nTesting scenario registry...")
+    try:
+        import tempfile
+        from chatbot.scenarios import ScenarioRegistry, scenario_registry
+        
+        def reference(scenario, message):
+            # The original handlers: first category with any substring keyword wins
+            text = message.lower()
+            for category in scenario.categories:
+                if any(keyword in text for keyword in category["keywords"]):
+                    return category["feedback"]
+            return scenario.hint
+        
+        messages = [
+            "I'm not drinking tonight", "No thanks, I'm the DD", "maybe later",
+            "Can I get a soda?", "I'll meet you there", "let's grab food first",
+            "I don't drink much, cheers", "just water for now", "whatever", "",
+        ]
+        for scenario_id in ("1", "2", "3"):
+            scenario = scenario_registry.get(scenario_id)
+            for message in messages:
+                assert scenario.respond(message) == reference(scenario, message), (scenario_id, message)
+        print("✅ Compiled matcher agrees with the original keyword rules")
+        
+        # Overlapping keywords are all found in one pass
+        date = scenario_registry.get(3)
+        assert date.match("I don't drink much") == ["not_drinking", "cheers"]
+        print("✅ Overlapping keywords matched")
+        
+        assert scenario_registry.respond(99, "hello") is None
+        
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump({"7": {"name": "game night", "hint": "Try again",
+                             "categories": [{"id": "pass", "keywords": ["I'll Pass"], "feedback": "Nice"}]}}, f)
+        registry = ScenarioRegistry(f.name)
+        os.unlink(f.name)
+        assert registry.respond(7, "Thanks, i'll pass") == "Nice"
+        assert registry.respond("7", "sure") == "Try again"
+        print("✅ New scenarios load from data without code changes")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Scenario registry test failed: {str(e)}")
+        return False
+
+def test_token_budget():
+    """Test adaptive max_tokens selection and per-turn usage records"""
+    print("\nTesting token budgeting...")
+    try:
+        import tempfile
+        from config import current_config
+        from chatbot.chatbot import Chatbot
+        from chatbot.token_budget import TokenBudget, estimate_tokens
+        from logger.write_behind import log_writer
+        
+        assert estimate_tokens("What counts as one standard drink?") == 7
+        assert estimate_tokens("") == 0
+        print("✅ Heuristic token estimate working")
+        
+        config = current_config()
+        budget = TokenBudget()
+        short = [{"role": "user", "content": "hi"}]
+        medium = [{"role": "user", "content": "How can I say no to drinks at a party without it being awkward?"}]
+        long = [{"role": "user", "content": "word " * 200}]
+        doctor_cap = config.TOKEN_BUDGET_CAPS["doctor"]
+        assert budget.choose_max_tokens("doctor", medium) == doctor_cap
+        assert budget.choose_max_tokens("doctor", short) < doctor_cap
+        assert budget.choose_max_tokens("doctor", long) > doctor_cap
+        assert budget.choose_max_tokens("doctor", long) <= config.OPENAI_MAX_TOKENS
+        assert budget.choose_max_tokens("ai", medium) == config.TOKEN_BUDGET_CAPS["ai"]
+        print("✅ Caps chosen per chatbot type and message length")
+        
+        params = Chatbot._build_request_params("doctor", medium[0]["content"])
+        assert params["max_tokens"] == doctor_cap
+        
+        # The cap depends on message length, but must not split cache entries
+        from chatbot.response_cache import ResponseCache
+        from chatbot.semantic_cache import SemanticCache
+        plain = Chatbot._build_request_params("ai", "What is a standard drink")
+        excited = Chatbot._build_request_params("ai", "What is a standard drink?!?!")
+        assert plain["max_tokens"] != excited["max_tokens"]
+        assert ResponseCache.make_key("What is a standard drink", plain) == \
+            ResponseCache.make_key("What is a standard drink?!?!", excited)
+        assert SemanticCache.make_namespace(plain) == SemanticCache.make_namespace(excited)
+        assert Chatbot._request_key("What is a standard drink", plain) == \
+            Chatbot._request_key("What is a standard drink?!?!", excited)
+        print("✅ Per-message caps share cache entries")
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_path = os.path.join(tmpdir, "usage.jsonl")
+            with patch.object(config, "TOKEN_USAGE_LOG_PATH", log_path):
+                usage = MagicMock(prompt_tokens=30, completion_tokens=120)
+                budget.record("doctor", params, usage, "stop", 0.5)
+                budget.record("doctor", params, MagicMock(prompt_tokens=30, completion_tokens=doctor_cap), "length", 1.5)
+            log_writer.flush()
+            with open(log_path) as f:
+                lines = [json.loads(line) for line in f]
+        assert len(lines) == 2 and lines[0]["max_tokens"] == doctor_cap
+        assert lines[0]["completion_tokens"] == 120
+        stats = budget.get_stats()["doctor"]
+        assert stats["turns"] == 2 and stats["truncated"] == 1
+        assert stats["p95_latency_s"] == 1.5
+        print("✅ Usage recorded per turn")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Token budget test failed: {str(e)}")
+        return False
+
+def test_circuit_breaker():
+    """Test the circuit breaker and local fallback answers"""
+    print("\nTesting circuit breaker...")
+    try:
+        from config import current_config
+        from chatbot.chatbot import Chatbot
+        from chatbot.circuit_breaker import CircuitBreaker, circuit_breaker
+        from chatbot.client_pool import OpenAIClientPool
+        from chatbot.fallback import FallbackResponder, CANNED_REPLIES
+        
+        config = current_config()
+        with patch.object(config, 'CIRCUIT_BREAKER_MIN_REQUESTS', 4), \
+                patch.object(config, 'CIRCUIT_BREAKER_OPEN_SECONDS', 0.2):
+            breaker = CircuitBreaker()
+            for _ in range(2):
+                breaker.record_success(0.1)
+            for _ in range(2):
+                breaker.record_failure(0.1)
+            assert breaker.state == "open"
+            assert not breaker.allow_request()
+            print("✅ Breaker trips on error rate and fails fast")
+            
+            time.sleep(0.25)
+            assert breaker.allow_request()       # half-open probe
+            assert not breaker.allow_request()   # only one probe at a time
+            breaker.record_success(0.1)
+            assert breaker.state == "closed"
+            print("✅ Half-open probe closes the breaker")
+            
+            for _ in range(4):
+                breaker.record_success(config.CIRCUIT_BREAKER_LATENCY_P95 + 1)
+            assert breaker.state == "open"
+            assert "latency" in breaker.get_stats()["last_trip_reason"]
+            print("✅ Breaker trips on p95 latency")
+        
+        fallback = FallbackResponder()
+        answer = fallback.faq_answer("what is the cycle of alcohol addiction")
+        assert answer and answer.startswith("Alcohol addiction is a chronic")
+        assert fallback.faq_answer("qwerty zxcvb") is None
+        print("✅ Closest FAQ answer found")
+        
+        mock_openai = MagicMock()
+        with patch('chatbot.client_pool.OpenAI', return_value=mock_openai), \
+                patch.object(config, 'RESPONSE_CACHE_ENABLED', False):
+            OpenAIClientPool.reset()
+            circuit_breaker.force_open()
+            try:
+                response = Chatbot.get_response('doctor', 'zzzz qqqq', api_key='test-key')
+            finally:
+                circuit_breaker.reset()
+                OpenAIClientPool.reset()
+        assert response == CANNED_REPLIES['doctor']
+        assert not mock_openai.chat.completions.create.called
+        print("✅ Open breaker serves a fallback without calling OpenAI")
+        
+        # Only connection errors, timeouts, 429 and 5xx count against the breaker
+        import asyncio
+        import httpx
+        from unittest.mock import AsyncMock
+        from openai import (APIConnectionError, AuthenticationError, BadRequestError, InternalServerError,
+                            NotFoundError, RateLimitError, UnprocessableEntityError)
+        from chatbot.async_chatbot import AsyncChatbot
+        from chatbot.bulkhead import bulkhead
+        
+        api_request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+        
+        def status_error(error_class, status):
+            return error_class("error", response=httpx.Response(status, request=api_request), body=None)
+        
+        caller_errors = [status_error(BadRequestError, 400), status_error(AuthenticationError, 401),
+                         status_error(NotFoundError, 404), status_error(UnprocessableEntityError, 422)]
+        upstream_errors = [status_error(InternalServerError, 500), status_error(RateLimitError, 429),
+                           APIConnectionError(request=api_request)]
+        
+        def failures_recorded(error):
+            mock_openai = MagicMock()
+            mock_openai.chat.completions.create.side_effect = error
+            async_client = MagicMock()
+            async_client.chat.completions.create = AsyncMock(side_effect=error)
+            with patch('chatbot.chatbot.OpenAIClientPool.get_client', return_value=mock_openai), \
+                    patch('chatbot.async_chatbot.AsyncOpenAIClientPool.get_client', return_value=async_client), \
+                    patch.object(config, 'RESPONSE_CACHE_ENABLED', False), \
+                    patch.object(config, 'REQUEST_COALESCING_ENABLED', False), \
+                    patch.object(circuit_breaker, 'record_failure') as record_failure:
+                for call in (lambda: Chatbot.get_response('ai', 'zzzz qqqq', api_key='test-key'),
+                             lambda: Chatbot.stream_response('ai', 'zzzz qqqq', api_key='test-key'),
+                             lambda: asyncio.run(AsyncChatbot.get_response('ai', 'zzzz qqqq', api_key='test-key'))):
+                    try:
+                        call()
+                        assert False, "error was not surfaced"
+                    except RuntimeError:
+                        pass
+            bulkhead.reset()
+            return record_failure.call_count
+        
+        try:
+            for error in caller_errors:
+                assert failures_recorded(error) == 0, error.status_code
+            for error in upstream_errors:
+                assert failures_recorded(error) == 3, error
+            
+            # Errors raised mid-stream are judged the same way
+            with patch.object(circuit_breaker, 'record_failure') as record_failure:
+                for error in caller_errors[:1] + upstream_errors[:1] + [httpx.ReadError("reset")]:
+                    def broken_stream():
+                        raise error
+                        yield
+                    try:
+                        list(Chatbot._iter_stream(broken_stream(), started=time.perf_counter()))
+                    except RuntimeError:
+                        pass
+            assert record_failure.call_count == 2
+        finally:
+            circuit_breaker.reset()
+            bulkhead.reset()
+        print("✅ Only upstream failures count against the breaker")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Circuit breaker test failed: {str(e)}")
+        return False
+
+def test_bulkhead():
+    """Test bounded upstream concurrency, queueing and the adaptive limit"""
+    print("\nTesting bulkhead admission control...")
+    try:
+        import asyncio
+        import threading
+        from config import current_config
+        from chatbot.bulkhead import Bulkhead, AdmissionRejected
+        
+        config = current_config()
+        with patch.object(config, 'BULKHEAD_MAX_CONCURRENT', 2), \
+                patch.object(config, 'BULKHEAD_LIMITS', {'doctor': 4}), \
+                patch.object(config, 'BULKHEAD_MIN_CONCURRENT', 1), \
+                patch.object(config, 'BULKHEAD_QUEUE_SIZE', 1), \
+                patch.object(config, 'BULKHEAD_QUEUE_TIMEOUT', 0.2):
+            bulkhead = Bulkhead()
+            first = bulkhead.admit('ai')
+            second = bulkhead.admit('ai')
+            
+            # A queued caller receives the next freed slot
+            admitted = []
+            waiter = threading.Thread(target=lambda: admitted.append(bulkhead.admit('ai')))
+            waiter.start()
+            time.sleep(0.05)
+            assert bulkhead.get_stats()['ai']['queue_depth'] == 1
+            try:
+                bulkhead.admit('ai')
+                assert False, "queue overflow was admitted"
+            except AdmissionRejected as e:
+                assert e.retry_after == config.BULKHEAD_RETRY_AFTER
+            first.release()
+            waiter.join()
+            assert len(admitted) == 1
+            print("✅ Overflow rejected and queued caller admitted")
+            
+            start = time.perf_counter()
+            try:
+                bulkhead.admit('ai')
+                assert False, "timed-out wait was admitted"
+            except AdmissionRejected:
+                assert time.perf_counter() - start < 1.0
+            stats = bulkhead.get_stats()['ai']
+            assert stats['rejected_full'] == 1 and stats['rejected_timeout'] == 1
+            assert stats['max_wait_s'] > 0
+            print("✅ Queue wait bounded and measured")
+            
+            # Lanes are independent per chatbot type
+            doctor_permits = [bulkhead.admit('doctor') for _ in range(4)]
+            assert bulkhead.get_stats()['doctor']['in_flight'] == 4
+            
+            # AIMD: 429s halve the limit, successes grow it back
+            doctor_permits[0].release(throttled=True)
+            assert bulkhead.get_stats()['doctor']['limit'] == 2
+            # Timeouts, 5xx and cancelled calls leave the limit alone
+            doctor_permits[1].release()
+            assert bulkhead.get_stats()['doctor']['limit'] == 2
+            for permit in doctor_permits[2:]:
+                permit.release(succeeded=True)
+            assert 2 < bulkhead.get_stats()['doctor']['limit'] < 4
+            print("✅ Adaptive limit shrinks on 429 and recovers")
+            
+            second.release()
+            admitted[0].release()
+            
+            async def run_async():
+                permits = [await bulkhead.admit_async('student') for _ in range(2)]
+                queued = asyncio.ensure_future(bulkhead.admit_async('student'))
+                await asyncio.sleep(0.05)
+                permits[0].release()
+                permit = await queued
+                permit.release()
+                permits[1].release()
+                return bulkhead.get_stats()['student']
+            
+            stats = asyncio.run(run_async())
+            assert stats['admitted'] == 3 and stats['in_flight'] == 0
+            print("✅ Async callers wait without blocking the loop")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Bulkhead test failed: {str(e)}")
+        return False
+
+def test_request_hedging():
+    """Test hedged upstream requests and the hedge budget"""
+    print("\nTesting request hedging...")
+    try:
+        import asyncio
+        import itertools
+        import threading
+        from config import current_config
+        from chatbot.chatbot import Chatbot
+        from chatbot.hedging import RequestHedger
+        
+        config = current_config()
+        with patch.object(config, 'HEDGING_ENABLED', True), \
+                patch.object(config, 'HEDGE_INITIAL_DELAY', 0.1), \
+                patch.object(config, 'HEDGE_MIN_DELAY', 0.05), \
+                patch.object(config, 'HEDGE_BUDGET', 1.0):
+            hedger = RequestHedger()
+            attempts = itertools.count()
+            
+            def slow_then_fast():
+                # The first attempt is a straggler, the hedge answers quickly
+                if next(attempts) == 0:
+                    time.sleep(1.0)
+                    return "slow"
+                return "fast"
+            
+            start = time.perf_counter()
+            assert hedger.call(slow_then_fast) == "fast"
+            assert time.perf_counter() - start < 0.5
+            stats = hedger.get_stats()
+            assert stats['hedged'] == 1 and stats['hedge_wins'] == 1
+            print("✅ Slow request hedged and hedge won")
+            
+            assert hedger.call(lambda: "quick") == "quick"
+            assert hedger.get_stats()['hedged'] == 1
+            print("✅ Fast requests are not hedged")
+            
+            with patch.object(config, 'HEDGE_BUDGET', 0.0):
+                hedger.reset()
+                start = time.perf_counter()
+                assert hedger.call(lambda: time.sleep(0.3) or "only") == "only"
+                assert hedger.get_stats()['budget_exhausted'] == 1
+            print("✅ Hedges capped by the budget")
+            
+            # With every worker busy, requests run on the caller instead of queueing into a hedge
+            with patch.object(config, 'HEDGE_MAX_WORKERS', 1):
+                saturated = RequestHedger()
+                blocker = threading.Thread(target=saturated.call, args=(lambda: time.sleep(0.5),))
+                blocker.start()
+                time.sleep(0.05)
+                start = time.perf_counter()
+                assert saturated.call(lambda: "inline") == "inline"
+                assert time.perf_counter() - start < 0.1
+                blocker.join()
+                stats = saturated.get_stats()
+                assert stats['ran_inline'] == 1 and stats['hedged'] == 0
+            print("✅ Saturated pool runs requests inline")
+            
+            # Only the winning attempt's usage is recorded
+            hedger.reset()
+            attempts = itertools.count()
+            
+            def create(**kwargs):
+                reply = MagicMock()
+                if next(attempts) == 0:
+                    time.sleep(0.5)
+                    reply.choices = [MagicMock(message=MagicMock(content="slow"))]
+                else:
+                    reply.choices = [MagicMock(message=MagicMock(content="fast"))]
+                return reply
+            
+            client = MagicMock()
+            client.chat.completions.create.side_effect = create
+            with patch('chatbot.chatbot.request_hedger', hedger), \
+                    patch('chatbot.chatbot.token_budget') as budget, \
+                    patch('chatbot.chatbot.circuit_breaker') as breaker:
+                assert Chatbot._guarded_complete(client, {"messages": []}, "ai") == "fast"
+                time.sleep(0.6)
+                assert budget.record.call_count == 1
+                assert breaker.record_success.call_count == 1
+            print("✅ Losing attempt records no usage")
+            
+            async def run_async():
+                cancelled = []
+                attempts = itertools.count()
+                
+                async def upstream():
+                    if next(attempts) == 0:
+                        try:
+                            await asyncio.sleep(1.0)
+                        except asyncio.CancelledError:
+                            cancelled.append(True)
+                            raise
+                        return "slow"
+                    return "fast"
+                
+                result = await hedger.call_async(upstream)
+                await asyncio.sleep(0)
+                return result, cancelled
+            
+            hedger.reset()
+            result, cancelled = asyncio.run(run_async())
+            assert result == "fast" and cancelled == [True]
+            print("✅ Async loser cancelled")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Request hedging test failed: {str(e)}")
+        return False
+
+def test_request_deadline():
+    """Test per-request deadlines bounding retries and upstream calls"""
+    print("\nTesting request deadlines...")
+    try:
+        import asyncio
+        import httpx
+        from openai import APIConnectionError
+        from chatbot.async_chatbot import AsyncChatbot
+        from chatbot.chatbot import Chatbot
+        from chatbot.deadline import Deadline, DeadlineExceeded
+        
+        deadline = Deadline(5)
+        assert 4.9 < deadline.remaining() <= 5 and not deadline.expired
+        assert deadline.timeout(1.0) == 1.0
+        expired = Deadline(0)
+        try:
+            expired.check("validation")
+            assert False, "expired deadline passed the check"
+        except DeadlineExceeded as e:
+            assert e.stage == "validation"
+        print("✅ Deadline tracks the remaining budget")
+        
+        # Each retry gets only the remaining budget and the client's own retries are disabled
+        client = MagicMock()
+        response = MagicMock()
+        response.choices = [MagicMock(message=MagicMock(content="Recovered"))]
+        attempts = []
+        
+        def with_options(timeout, max_retries):
+            attempts.append((timeout, max_retries))
+            attempt = MagicMock()
+            if len(attempts) == 1:
+                attempt.chat.completions.create.side_effect = APIConnectionError(
+                    request=httpx.Request("POST", "http://upstream")
+                )
+            else:
+                attempt.chat.completions.create.return_value = response
+            return attempt
+        
+        client.with_options.side_effect = with_options
+        with patch.object(Chatbot, '_retry_backoff', return_value=0.05):
+            content = Chatbot._complete(client, {"messages": []}, "ai", Deadline(2.0))
+        assert content == "Recovered"
+        assert [retries for _, retries in attempts] == [0, 0]
+        assert attempts[1][0] < attempts[0][0] <= 2.0
+        print("✅ Retries share the deadline")
+        
+        try:
+            Chatbot._complete(client, {"messages": []}, "ai", Deadline(0))
+            assert False, "call made after the deadline"
+        except DeadlineExceeded:
+            pass
+        print("✅ No upstream call once the deadline has passed")
+        
+        async def slow_create(**kwargs):
+            await asyncio.sleep(2)
+        
+        async_client = MagicMock()
+        async_client.with_options.return_value.chat.completions.create = slow_create
+        start = time.perf_counter()
+        try:
+            asyncio.run(AsyncChatbot._complete(async_client, {"messages": []}, "ai", Deadline(0.2)))
+            assert False, "slow async call was not cut off"
+        except DeadlineExceeded:
+            assert time.perf_counter() - start < 1.0
+        print("✅ Async upstream call cancelled at the deadline")
+        
+        # A per-attempt timeout inside the deadline is an upstream failure, not a deadline miss
+        from config import current_config
+        config = current_config()
+        with patch.object(config, 'OPENAI_TIMEOUT', 0.1), patch.object(config, 'OPENAI_MAX_RETRIES', 1), \
+                patch.object(Chatbot, '_retry_backoff', return_value=0.01), \
+                patch('chatbot.async_chatbot.circuit_breaker') as breaker:
+            try:
+                asyncio.run(AsyncChatbot._guarded_complete(async_client, {"messages": []}, "ai", Deadline(5)))
+                assert False, "hung async call succeeded"
+            except DeadlineExceeded:
+                assert False, "attempt timeout reported as a deadline miss"
+            except RuntimeError:
+                pass
+            assert breaker.record_failure.call_count == 1
+            try:
+                asyncio.run(AsyncChatbot._guarded_complete(async_client, {"messages": []}, "ai", Deadline(0.15)))
+                assert False, "hung async call succeeded"
+            except DeadlineExceeded:
+                pass
+            assert breaker.record_failure.call_count == 2
+            breaker.record_success.assert_not_called()
+        print("✅ Hung async upstream calls count against the circuit breaker")
+        
+        # A sync call cut off by the deadline is a deadline miss (504), not an upstream error (503)
+        from benchmarks.stub_llm_server import StubLLMServer
+        from chatbot.client_pool import OpenAIClientPool
+        server = StubLLMServer(latency=2.0, seed=1).start()
+        try:
+            with patch.object(config, 'OPENAI_BASE_URL', server.base_url), \
+                    patch.object(config, 'OPENAI_MAX_RETRIES', 0), \
+                    patch.object(config, 'RESPONSE_CACHE_ENABLED', False), \
+                    patch('chatbot.chatbot.circuit_breaker') as breaker:
+                OpenAIClientPool.reset()
+                client = OpenAIClientPool.get_client('test-key')
+                for call in (lambda deadline: Chatbot._guarded_complete(client, {"model": "stub", "messages": []},
+                                                                        "ai", deadline),
+                             lambda deadline: Chatbot.stream_response('ai', 'zzzz qqqq', api_key='test-key',
+                                                                      deadline=deadline)):
+                    start = time.perf_counter()
+                    try:
+                        call(Deadline(0.3))
+                        assert False, "slow sync call was not cut off"
+                    except DeadlineExceeded:
+                        assert time.perf_counter() - start < 1.5
+                assert breaker.record_failure.call_count == 2
+        finally:
+            OpenAIClientPool.reset()
+            server.shutdown()
+        print("✅ Sync upstream timeouts at the deadline raise DeadlineExceeded")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Request deadline test failed: {str(e)}")
+        return False
+
+def test_stub_llm_server():
+    """Test the real chat path against the local OpenAI-compatible stub server"""
+    print("\nTesting stub LLM server...")
+    server = None
+    try:
+        import asyncio
+        from config import current_config
+        from benchmarks.stub_llm_server import StubLLMServer
+        from chatbot.async_chatbot import AsyncChatbot
+        from chatbot.bulkhead import bulkhead
+        from chatbot.chatbot import Chatbot
+        from chatbot.circuit_breaker import circuit_breaker
+        from chatbot.client_pool import AsyncOpenAIClientPool, OpenAIClientPool
+        
+        server = StubLLMServer(latency=0.01, reply_tokens=12, seed=1).start()
+        config = current_config()
+        message = "How many drinks is too many?"
+        with patch.object(config, 'OPENAI_BASE_URL', server.base_url), \
+                patch.object(config, 'OPENAI_MAX_RETRIES', 0), \
+                patch.object(config, 'RESPONSE_CACHE_ENABLED', False), \
+                patch.object(config, 'REQUEST_COALESCING_ENABLED', False):
+            OpenAIClientPool.reset()
+            try:
+                first = Chatbot.get_response('ai', message, api_key='test-key')
+                second = Chatbot.get_response('ai', message, api_key='test-key')
+                assert first and first == second
+                assert Chatbot.get_response('doctor', message, api_key='test-key') != first
+                print("✅ Deterministic replies through the configured base URL")
+                
+                streamed = "".join(Chatbot.stream_response('ai', message, api_key='test-key'))
+                assert streamed.strip() == first
+                assert server.stats["streamed"] == 1
+                print("✅ Streamed reply matches the non-streamed one")
+                
+                async_reply = asyncio.run(AsyncChatbot.get_response('ai', message, api_key='test-key'))
+                assert async_reply == first
+                print("✅ Async client reaches the stub")
+                
+                server.rate_limit_rate = 1.0
+                bulkhead.reset()
+                try:
+                    Chatbot.get_response('ai', message, api_key='test-key')
+                    assert False, "429 was not surfaced"
+                except RuntimeError:
+                    pass
+                assert server.stats["rate_limited"] == 1
+                assert bulkhead.get_stats()['ai']['throttled'] == 1
+                
+                server.rate_limit_rate, server.error_rate = 0.0, 1.0
+                try:
+                    Chatbot.get_response('ai', message, api_key='test-key')
+                    assert False, "500 was not surfaced"
+                except RuntimeError:
+                    pass
+                assert server.stats["errors"] == 1
+                print("✅ Injected 429 and 500 errors reach the chat path")
+            finally:
+                circuit_breaker.reset()
+                bulkhead.reset()
+                OpenAIClientPool.reset()
+                AsyncOpenAIClientPool.reset()
+        
+        return True
+    except Exception as e:
+        print(f"❌ Stub LLM server test failed: {str(e)}")
+        return False
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
 def test_logger_integration():
     """Test logging modules integration"""
     print("\nTesting logger integration...")
@@ -64,8 +989,9 @@ def test_logger_integration():
         config = current_config()
         
         # Test custom logger (without actual file write)
-        with patch('builtins.open', MagicMock()):
+        with patch('logger.custom_logger.log_writer') as mock_writer:
             Logger.log_conversation('ai', 'test message', 'test response', '127.0.0.1')
+            assert mock_writer.append.called == config.LOG_TO_FILE
             print("✅ Custom logger integration working")
         
         # Test session logger
@@ -166,8 +1092,8 @@ def test_session_management():
         print("✅ Session creation working")
         
         # Test session data structure
-        assert isinstance(logger.sessions[session_id], list)
-        assert len(logger.sessions[session_id]) == 0
+        assert logger.sessions[session_id].turns == 0
+        assert not hasattr(logger.sessions[session_id], '__dict__')
         print("✅ Session data structure correct")
         
         # Test getting all sessions
@@ -181,6 +1107,612 @@ def test_session_management():
         print(f"❌ Session management test failed: {str(e)}")
         return False
 
+def test_session_csv_append():
+    """Test that session turns are appended to the CSV instead of rewritten"""
+    print("\nTesting append-only session CSV...")
+    try:
+        import csv
+        import tempfile
+        from pathlib import Path
+        from config import current_config
+        from logger.session_logger import SessionLogger
+        from logger.write_behind import log_writer
+        
+        config = current_config()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            active = Path(tmpdir) / "active"
+            active.mkdir()
+            with patch.object(config, 'ACTIVE_SESSION_DIR', active):
+                logger = SessionLogger()
+                session_id = logger.create_session('127.0.0.1')
+                for i in range(3):
+                    logger.log_conversation(session_id, 'ai', f'Question, "{i}"\nline two', 'Answer', '127.0.0.1')
+                
+                # A new logger (e.g. another worker) continues the same file
+                reloaded = SessionLogger()
+                reloaded.log_conversation(session_id, 'doctor', 'After reload', 'Answer', '127.0.0.1')
+                log_writer.flush()
+                
+                csv_path = active / f"{session_id}.csv"
+                raw = csv_path.read_bytes()
+                assert raw.count(b'\xef\xbb\xbf') == 1
+                assert raw.count(b'timestamp,conversation_number') == 1
+                with open(csv_path, 'r', encoding='utf-8-sig') as f:
+                    rows = list(csv.DictReader(f))
+                assert [row['conversation_number'] for row in rows] == ['1', '2', '3', '4']
+                assert rows[1]['user_message'] == 'Question, "1"\nline two'
+                print("✅ Rows appended with a single header")
+                
+                with patch.object(reloaded.store, 'append_turn', wraps=reloaded.store.append_turn) as append:
+                    reloaded.log_conversation(session_id, 'ai', 'One more', 'Answer', '127.0.0.1')
+                assert append.call_args[0][1]['conversation_number'] == 5
+                print("✅ Each turn writes only its own row")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Append-only session CSV test failed: {str(e)}")
+        return False
+
+def test_streaming_export():
+    """Test the streaming k-way merge export of session CSVs"""
+    print("\nTesting streaming session export...")
+    try:
+        import csv
+        import tempfile
+        from pathlib import Path
+        from config import current_config
+        from logger import session_store
+        from logger.session_logger import SessionLogger
+        from logger.session_store import EXPORT_CSV_FIELDS, SESSION_CSV_FIELDS
+        
+        config = current_config()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            active = Path(tmpdir) / "active"
+            completed = Path(tmpdir) / "completed"
+            active.mkdir()
+            completed.mkdir()
+            with patch.object(config, 'SESSION_STORE', 'csv'), \
+                    patch.object(config, 'ACTIVE_SESSION_DIR', active), \
+                    patch.object(config, 'COMPLETED_SESSION_DIR', completed):
+                # Interleaved sessions, each in time order, with quoted multi-line fields
+                for n, (folder, seconds) in enumerate([(active, [1, 4, 9]), (completed, [2, 3, 8]),
+                                                       (active, [5]), (completed, [])]):
+                    with open(folder / f"s{n}.csv", "w", newline="", encoding="utf-8-sig") as f:
+                        writer = csv.DictWriter(f, fieldnames=SESSION_CSV_FIELDS)
+                        writer.writeheader()
+                        for i, second in enumerate(seconds):
+                            writer.writerow({'timestamp': f'2024-05-01 10:00:{second:02d}',
+                                             'conversation_number': i + 1, 'chatbot_type': 'ai',
+                                             'user_message': f'line one, "{n}"\nline two ü', 'risk_score': second})
+                
+                logger = SessionLogger()
+                rows = logger.iter_all_sessions()
+                first = next(rows)
+                assert first['session_id'] == 's0' and first['session_status'] == 'active'
+                
+                # A session finished mid-export is followed into completed/
+                (active / "s0.csv").rename(completed / "s0.csv")
+                rows = [first] + list(rows)
+                assert [row['timestamp'][-2:] for row in rows] == ['01', '02', '03', '04', '05', '08', '09']
+                assert [row['session_id'] for row in rows] == ['s0', 's1', 's1', 's0', 's2', 's1', 's0']
+                assert rows[3]['user_message'] == 'line one, "0"\nline two ü'
+                assert list(rows[0]) == SESSION_CSV_FIELDS + ['session_id', 'session_status']
+                print("✅ Sessions merged in timestamp order, multi-line fields intact")
+                
+                filtered = list(logger.iter_all_sessions(min_risk_score=5, until='2024-05-01 10:00:08'))
+                assert [row['timestamp'][-2:] for row in filtered] == ['05', '08']
+                
+                # The process pool yields exactly what the in-process merge does
+                merged = list(logger.iter_all_sessions())
+                with patch.object(config, 'SESSION_EXPORT_WORKERS', 2), \
+                        patch.object(config, 'SESSION_EXPORT_CHUNK_SIZE', 1):
+                    # Too few session files for the pool: merged in-process
+                    with patch.object(config, 'SESSION_EXPORT_PARALLEL_MIN_SESSIONS', 5), \
+                            patch('logger.session_store._get_export_pool', side_effect=AssertionError("pool used")):
+                        assert list(logger.iter_all_sessions()) == merged
+                    with patch.object(config, 'SESSION_EXPORT_PARALLEL_MIN_SESSIONS', 4):
+                        assert list(logger.iter_all_sessions()) == merged
+                        pool = session_store._export_pool
+                        assert pool is not None
+                        assert list(logger.iter_all_sessions(min_risk_score=5, until='2024-05-01 10:00:08')) == filtered
+                        assert session_store._export_pool is pool  # started once, shared by exports
+                print("✅ Parallel ingestion matches the in-process merge")
+                
+                output = os.path.join(tmpdir, 'export.csv')
+                assert logger.export_all_sessions_to_csv(output) == 7
+                with open(output, 'r', encoding='utf-8-sig') as f:
+                    reader = csv.DictReader(f)
+                    assert reader.fieldnames == EXPORT_CSV_FIELDS
+                    assert len(list(reader)) == 7
+                assert logger.export_all_sessions_to_csv(output, chatbot_type='doctor') == 0
+                print("✅ Filtered and file exports")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Streaming export test failed: {str(e)}")
+        return False
+
+def test_sqlite_session_store():
+    """Test the SQLite (WAL) session store"""
+    print("\nTesting SQLite session store...")
+    try:
+        import csv
+        import io
+        import sqlite3
+        import tempfile
+        from pathlib import Path
+        from config import current_config
+        from logger.session_logger import SessionLogger
+        
+        config = current_config()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with patch.object(config, 'SESSION_STORE', 'sqlite'), \
+                    patch.object(config, 'SESSION_LOG_DIR', Path(tmpdir)), \
+                    patch.object(config, 'SESSION_DB_PATH', ''):
+                logger = SessionLogger()
+                first = logger.create_session('127.0.0.1')
+                second = logger.create_session('127.0.0.1')
+                empty = logger.create_session('127.0.0.1')
+                logger.log_conversation(first, 'ai', 'Question, "1"\nline two', 'Answer', '127.0.0.1', risk_score=2)
+                logger.log_conversation(second, 'doctor', 'Hi doctor', 'Answer', '127.0.0.1', risk_score=8)
+                logger.log_conversation(first, 'ai', 'No score', 'Answer', '127.0.0.1')
+                
+                # Another worker continues the same active session
+                reloaded = SessionLogger()
+                assert reloaded.log_conversation(first, 'ai', 'After reload', 'Answer', '127.0.0.1')
+                assert reloaded.sessions[first].turns == 3
+                logger.end_session(second)
+                assert not reloaded.log_conversation(second, 'ai', 'Too late', 'Answer', '127.0.0.1')
+                
+                sessions = logger.get_all_sessions()
+                assert sessions == {'active': [first], 'completed': [second]}
+                assert empty not in sessions['active']
+                print("✅ Sessions listed by status, empty sessions skipped")
+                
+                db = sqlite3.connect(str(Path(tmpdir) / 'sessions.db'))
+                assert db.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+                indexes = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+                assert {'idx_turns_session', 'idx_turns_timestamp', 'idx_turns_chatbot_type',
+                        'idx_turns_risk_score'} <= indexes
+                plan = db.execute("EXPLAIN QUERY PLAN SELECT * FROM turns WHERE chatbot_type = ?", ('ai',)).fetchall()
+                assert 'idx_turns_chatbot_type' in str(plan)
+                db.close()
+                print("✅ WAL mode with indexed turns")
+                
+                text = ''.join(logger.iter_session_csv(first))
+                assert text.startswith('\ufeff')
+                rows = list(csv.DictReader(io.StringIO(text[1:], newline='')))
+                assert [row['conversation_number'] for row in rows] == ['1', '2', '3']
+                assert rows[0]['user_message'] == 'Question, "1"\nline two'
+                assert rows[1]['risk_score'] == ''
+                assert logger.iter_session_csv(empty) is None
+                # Streamed from the database: no per-session file is left behind
+                assert logger.get_session_csv_path(first) is None
+                assert not os.path.exists(os.path.join(tmpdir, 'exports'))
+                print("✅ Per-session CSV in the CSV store's format")
+                
+                output = os.path.join(tmpdir, 'export.csv')
+                assert logger.export_all_sessions_to_csv(output) == 4
+                assert logger.export_all_sessions_to_csv(output, chatbot_type='doctor') == 1
+                with open(output, 'r', encoding='utf-8-sig') as f:
+                    rows = list(csv.DictReader(f))
+                assert rows[0]['session_id'] == second and rows[0]['session_status'] == 'completed'
+                assert logger.export_all_sessions_to_csv(output, min_risk_score=5) == 1
+                assert logger.export_all_sessions_to_csv(output, since='2999-01-01 00:00:00') == 0
+                assert logger.export_all_sessions_to_csv(output, until='2999-01-01 00:00:00') == 4
+                print("✅ Filtered export")
+        
+        return True
+    except Exception as e:
+        print(f"❌ SQLite session store test failed: {str(e)}")
+        return False
+
+def test_session_manifest():
+    """Test the session manifest and its paginated queries"""
+    print("\nTesting session manifest...")
+    try:
+        import tempfile
+        from pathlib import Path
+        from config import current_config
+        from logger.session_logger import SessionLogger
+        from logger.session_store import SESSION_CSV_FIELDS
+        
+        config = current_config()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / "active").mkdir()
+            (root / "completed").mkdir()
+            with patch.object(config, 'SESSION_STORE', 'csv'), \
+                    patch.object(config, 'SESSION_LOG_DIR', root), \
+                    patch.object(config, 'ACTIVE_SESSION_DIR', root / "active"), \
+                    patch.object(config, 'COMPLETED_SESSION_DIR', root / "completed"), \
+                    patch.object(config, 'SESSION_MANIFEST_PATH', ''):
+                logger = SessionLogger()
+                ids = []
+                for n in range(5):
+                    session_id = logger.create_session('127.0.0.1')
+                    ids.append(session_id)
+                    for i in range(n):
+                        logger.log_conversation(session_id, 'doctor' if n % 2 else 'ai', f'Question {i}',
+                                                'Answer', '127.0.0.1', risk_score=n * 2 + i)
+                logger.end_session(ids[4])
+                
+                # fresh=True waits for the turns still queued on the log writer
+                page = logger.list_sessions(limit=10, fresh=True)
+                assert page['total'] == 4 and page['next_cursor'] is None
+                records = {record['session_id']: record for record in page['sessions']}
+                assert ids[0] not in records  # no turns yet
+                assert records[ids[3]]['turns'] == 3
+                assert records[ids[3]]['chatbot_type'] == 'doctor'
+                assert records[ids[3]]['risk_score'] == 8
+                assert records[ids[4]]['status'] == 'completed' and records[ids[4]]['end_time']
+                header_bytes = len(('\ufeff' + ','.join(SESSION_CSV_FIELDS) + '\r\n').encode('utf-8'))
+                assert records[ids[3]]['bytes'] == os.path.getsize(root / "active" / f"{ids[3]}.csv") - header_bytes
+                print("✅ Records kept up to date per turn and on end")
+                
+                # Keyset pages cover every session exactly once, in order
+                seen, cursor = [], None
+                while True:
+                    page = logger.list_sessions(sort='turns', descending=False, limit=1, cursor=cursor)
+                    seen.extend(record['session_id'] for record in page['sessions'])
+                    cursor = page['next_cursor']
+                    if cursor is None:
+                        break
+                assert seen == ids[1:]
+                assert [r['session_id'] for r in logger.list_sessions(status='completed')['sessions']] == [ids[4]]
+                assert logger.list_sessions(chatbot_type='doctor')['total'] == 2
+                assert logger.list_sessions(min_risk_score=7)['total'] == 2
+                for bad in ({'sort': 'user_ip'}, {'cursor': 'not-a-cursor'}):
+                    try:
+                        logger.list_sessions(**bad)
+                        assert False, bad
+                    except ValueError:
+                        pass
+                print("✅ Cursor pagination, sorting and filters")
+                
+                # A missing manifest is rebuilt from the session files
+                expected = logger.list_sessions(limit=10)['sessions']
+                logger.manifest._db.close()
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(root / f"manifest.db{suffix}"):
+                        os.remove(root / f"manifest.db{suffix}")
+                rebuilt = SessionLogger()
+                assert rebuilt.list_sessions(limit=10)['sessions'] == expected
+                rebuilt.manifest._db.close()
+                print("✅ Manifest rebuilt from disk")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Session manifest test failed: {str(e)}")
+        return False
+
+def test_session_memory_bounds():
+    """Test LRU eviction and idle-session reaping in the session logger"""
+    print("\nTesting session memory bounds...")
+    try:
+        import json
+        import tempfile
+        from datetime import datetime, timedelta
+        from pathlib import Path
+        from config import current_config
+        from logger.session_logger import SessionLogger
+        
+        config = current_config()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / "active").mkdir()
+            (root / "completed").mkdir()
+            with patch.object(config, 'SESSION_STORE', 'csv'), \
+                    patch.object(config, 'SESSION_LOG_DIR', root), \
+                    patch.object(config, 'ACTIVE_SESSION_DIR', root / "active"), \
+                    patch.object(config, 'COMPLETED_SESSION_DIR', root / "completed"), \
+                    patch.object(config, 'SESSION_MANIFEST_PATH', ''), \
+                    patch.object(config, 'SESSION_MAX_RESIDENT', 2), \
+                    patch.object(config, 'SESSION_IDLE_TIMEOUT', 600), \
+                    patch.object(config, 'SESSION_REAP_INTERVAL', 3600):
+                logger = SessionLogger()
+                ids = [logger.create_session('127.0.0.1') for _ in range(3)]
+                assert list(logger.sessions) == ids[1:]
+                logger.log_conversation(ids[1], 'ai', 'First', 'Answer', '127.0.0.1')
+                
+                # The evicted session without turns is reloaded and keeps numbering from disk
+                assert logger.log_conversation(ids[0], 'ai', 'Back again', 'Answer', '127.0.0.1')
+                assert logger.log_conversation(ids[0], 'ai', 'Once more', 'Answer', '127.0.0.1')
+                assert logger.sessions[ids[0]].turns == 2
+                assert list(logger.sessions) == [ids[1], ids[0]]
+                stats = logger.get_stats()
+                assert stats['resident_sessions'] == 2 and stats['resident_turns'] == 3
+                assert stats['evictions'] == 2 and stats['rehydrations'] == 1
+                assert stats['resident_bytes'] > 0
+                print("✅ LRU cap with reload on demand")
+                
+                # Nothing is idle yet; an hour later every session is
+                assert logger.reap_idle_sessions() == 0
+                assert logger.reap_idle_sessions(now=datetime.now() + timedelta(hours=1)) == 3
+                assert not logger.sessions and not logger.is_active(ids[0])
+                assert not logger.log_conversation(ids[1], 'ai', 'Too late', 'Answer', '127.0.0.1')
+                assert not os.listdir(root / "active")
+                with open(root / "completed" / f"{ids[0]}_metadata.json", encoding='utf-8') as f:
+                    metadata = json.load(f)
+                assert metadata['status'] == 'completed' and metadata['total_conversations'] == 2
+                assert os.path.exists(root / "completed" / f"{ids[0]}.csv")
+                assert logger.list_sessions(status='completed', fresh=True)['total'] == 2
+                stats = logger.get_stats()
+                assert stats['reaped'] == 3 and stats['reap_runs'] == 2 and stats['reap_errors'] == 0
+                print("✅ Idle sessions reaped into completed with metadata")
+                logger.manifest._db.close()
+        
+        return True
+    except Exception as e:
+        print(f"❌ Session memory bounds test failed: {str(e)}")
+        return False
+
+def test_session_concurrency():
+    """Stress the session logger from many threads"""
+    print("\nTesting concurrent session logging...")
+    try:
+        import sys
+        import tempfile
+        import threading
+        from collections import Counter
+        from pathlib import Path
+        from config import current_config
+        from logger.session_logger import SessionLogger
+        
+        config = current_config()
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)  # switch threads as often as possible
+        try:
+            for store in ('csv', 'sqlite'):
+                with tempfile.TemporaryDirectory() as tmpdir:
+                    root = Path(tmpdir)
+                    (root / "active").mkdir()
+                    (root / "completed").mkdir()
+                    with patch.object(config, 'SESSION_STORE', store), \
+                            patch.object(config, 'SESSION_LOG_DIR', root), \
+                            patch.object(config, 'ACTIVE_SESSION_DIR', root / "active"), \
+                            patch.object(config, 'COMPLETED_SESSION_DIR', root / "completed"), \
+                            patch.object(config, 'SESSION_DB_PATH', ''), \
+                            patch.object(config, 'SESSION_MANIFEST_PATH', ''), \
+                            patch.object(config, 'SESSION_MAX_RESIDENT', 8):
+                        logger = SessionLogger()
+                        hot = logger.create_session('127.0.0.1')
+                        cold = [logger.create_session('127.0.0.1') for _ in range(24)]
+                        threads, rounds = 12, 20
+                        expected = Counter()
+                        errors = []
+                        
+                        def hammer(worker):
+                            try:
+                                for i in range(rounds):
+                                    for session_id in (hot, cold[(worker + i) % len(cold)]):
+                                        context = {'party_scenario': 1, 'chat_history': [f'{worker}/{i}'] * 5}
+                                        assert logger.log_conversation(session_id, 'ai', f'Question, "{worker}/{i}"\nline two',
+                                                                       'Answer', '127.0.0.1', conversation_context=context)
+                            except Exception as e:
+                                errors.append(e)
+                        
+                        for worker in range(threads):
+                            for i in range(rounds):
+                                expected[hot] += 1
+                                expected[cold[(worker + i) % len(cold)]] += 1
+                        workers = [threading.Thread(target=hammer, args=(n,)) for n in range(threads)]
+                        for worker in workers:
+                            worker.start()
+                        for worker in workers:
+                            worker.join()
+                        assert not errors, errors
+                        
+                        for session_id in [hot] + cold:
+                            rows = _session_rows(logger, session_id)
+                            assert len(rows) == expected[session_id], (session_id, len(rows))
+                            assert sorted(int(row['conversation_number']) for row in rows) == \
+                                list(range(1, expected[session_id] + 1))
+                            assert all(row['user_message'].endswith('\nline two') for row in rows)
+                        if store == 'csv':
+                            raw = (root / "active" / f"{hot}.csv").read_bytes()
+                            assert raw.count(b'\xef\xbb\xbf') == 1
+                            assert raw.count(b'timestamp,conversation_number') == 1
+                        records = {record['session_id']: record['turns']
+                                   for record in logger.list_sessions(limit=100, fresh=True)['sessions']}
+                        assert records == dict(expected)
+                        stats = logger.get_stats()
+                        assert stats['evictions'] > 0 and stats['resident_sessions'] <= 8
+                        
+                        # Ending the hot session while turns arrive loses none of the accepted turns
+                        accepted = []
+                        workers = [threading.Thread(target=lambda: accepted.append(
+                            logger.log_conversation(hot, 'ai', 'Late', 'Answer', '127.0.0.1'))) for _ in range(8)]
+                        for worker in workers:
+                            worker.start()
+                        assert logger.end_session(hot)
+                        for worker in workers:
+                            worker.join()
+                        rows = _session_rows(logger, hot)
+                        assert len(rows) == expected[hot] + accepted.count(True)
+                        logger.manifest._db.close()
+                    print(f"✅ {store}: {threads} threads, every turn numbered once, files intact")
+        finally:
+            sys.setswitchinterval(switch_interval)
+        
+        return True
+    except Exception as e:
+        print(f"❌ Concurrent session logging test failed: {repr(e)}")
+        return False
+
+def _session_rows(logger, session_id):
+    """A session's turns as CSV dict rows, read the way its download is served."""
+    import csv
+    import io
+    text = ''.join(logger.iter_session_csv(session_id))
+    return list(csv.DictReader(io.StringIO(text.lstrip('\ufeff'), newline='')))
+
+def _log_turns_in_worker(log_dir, store, session_ids, worker, turns):
+    """Worker process for test_multiprocess_sessions: log turns into sessions shared with other workers."""
+    from pathlib import Path
+    from config import current_config
+    from logger.session_logger import SessionLogger
+    from logger.write_behind import log_writer
+    
+    config = current_config()
+    root = Path(log_dir)
+    config.SESSION_STORE = store
+    config.SESSION_LOG_DIR = root
+    config.ACTIVE_SESSION_DIR = root / "active"
+    config.COMPLETED_SESSION_DIR = root / "completed"
+    config.SESSION_DB_PATH = ''
+    config.SESSION_MANIFEST_PATH = ''
+    config.SESSION_MAX_RESIDENT = 2  # reload (already stale) turn counts all the time
+    config.SESSION_IDLE_TIMEOUT = 0
+    logger = SessionLogger()
+    for i in range(turns):
+        for session_id in session_ids:
+            if not logger.log_conversation(session_id, 'ai', f'{worker}/{i}', 'Answer', '127.0.0.1'):
+                raise RuntimeError(f"turn {worker}/{i} rejected")
+    log_writer.flush()
+
+def test_multiprocess_sessions():
+    """Test that worker processes sharing sessions lose no turns"""
+    print("\nTesting multi-process session logging...")
+    try:
+        import json
+        import multiprocessing
+        import tempfile
+        from pathlib import Path
+        from config import current_config
+        from logger.session_logger import SessionLogger
+        from logger.write_behind import log_writer
+        
+        config = current_config()
+        workers, turns = 4, 25
+        for store in ('csv', 'sqlite'):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                root = Path(tmpdir)
+                (root / "active").mkdir()
+                (root / "completed").mkdir()
+                with patch.object(config, 'SESSION_STORE', store), \
+                        patch.object(config, 'SESSION_LOG_DIR', root), \
+                        patch.object(config, 'ACTIVE_SESSION_DIR', root / "active"), \
+                        patch.object(config, 'COMPLETED_SESSION_DIR', root / "completed"), \
+                        patch.object(config, 'SESSION_DB_PATH', ''), \
+                        patch.object(config, 'SESSION_MANIFEST_PATH', ''):
+                    logger = SessionLogger()
+                    session_ids = [logger.create_session('127.0.0.1') for _ in range(5)]
+                    log_writer.flush()
+                    
+                    context = multiprocessing.get_context("spawn")
+                    processes = [context.Process(target=_log_turns_in_worker,
+                                                 args=(tmpdir, store, session_ids, worker, turns))
+                                 for worker in range(workers)]
+                    for process in processes:
+                        process.start()
+                    for process in processes:
+                        process.join(120)
+                    assert [process.exitcode for process in processes] == [0] * workers
+                    
+                    expected = sorted(f'{worker}/{i}' for worker in range(workers) for i in range(turns))
+                    for session_id in session_ids:
+                        rows = _session_rows(logger, session_id)
+                        assert sorted(row['user_message'] for row in rows) == expected
+                        assert [int(row['conversation_number']) for row in rows] == list(range(1, len(expected) + 1))
+                    if store == 'csv':
+                        raw = (root / "active" / f"{session_ids[0]}.csv").read_bytes()
+                        assert raw.count(b'\xef\xbb\xbf') == 1
+                        assert raw.count(b'timestamp,conversation_number') == 1
+                    page = logger.list_sessions(limit=10, fresh=True)
+                    assert sorted(record['turns'] for record in page['sessions']) == [len(expected)] * 5
+                    
+                    # A worker whose own count is stale still ends the session with the full count
+                    assert logger.end_session(session_ids[0])
+                    if store == 'csv':
+                        with open(root / "completed" / f"{session_ids[0]}_metadata.json", encoding='utf-8') as f:
+                            assert json.load(f)['total_conversations'] == len(expected)
+                    log_writer.flush()
+                    logger.manifest._db.close()
+                print(f"✅ {store}: {workers} processes x {turns} turns per session, none lost or renumbered twice")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Multi-process session logging test failed: {repr(e)}")
+        return False
+
+def test_log_writer():
+    """Test the write-behind log writer"""
+    print("\nTesting write-behind log writer...")
+    try:
+        import tempfile
+        import threading
+        from config import current_config
+        from logger.session_store import CsvSessionStore
+        from logger.write_behind import LogWriter
+        
+        config = current_config()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            first = os.path.join(tmpdir, "first.csv")
+            second = os.path.join(tmpdir, "second.log")
+            with patch.object(config, 'LOG_WRITE_BEHIND_ENABLED', True), \
+                    patch.object(config, 'LOG_FSYNC_MODE', 'batch'):
+                writer = LogWriter()
+                for i in range(50):
+                    writer.append(first, f"{i}\n", header="n\n", encoding="utf-8-sig")
+                    writer.append(second, f"line {i}\n")
+                writer.replace(os.path.join(tmpdir, "meta.json"), '{"a": 1}')
+                assert writer.flush(timeout=5)
+                with open(first, "rb") as f:
+                    assert f.read() == b"\xef\xbb\xbfn\n" + "".join(f"{i}\n" for i in range(50)).encode()
+                with open(second, "r", encoding="utf-8") as f:
+                    assert f.read().splitlines()[-1] == "line 49"
+                with open(os.path.join(tmpdir, "meta.json"), "r", encoding="utf-8") as f:
+                    assert json.load(f) == {"a": 1}
+                stats = writer.get_stats()
+                assert stats["written"] == 101 and stats["dropped"] == 0
+                assert stats["fsyncs"] >= 1 and stats["batches"] < 101
+                print("✅ Entries batched per file in order, with header once and fsync")
+                writer.close()
+            
+            # A stalled disk fills the queue; requests drop entries instead of waiting
+            with patch.object(config, 'LOG_WRITE_BEHIND_ENABLED', True), \
+                    patch.object(config, 'LOG_WRITE_QUEUE_SIZE', 3):
+                writer = LogWriter()
+                release = threading.Event()
+                real_write = writer._write
+                
+                def stalled_write(entries):
+                    release.wait(5)
+                    real_write(entries)
+                
+                with patch.object(writer, '_write', side_effect=stalled_write):
+                    start = time.perf_counter()
+                    results = [writer.append(second, "x\n") for _ in range(10)]
+                    assert time.perf_counter() - start < 0.5
+                    assert results.count(False) == writer.get_stats()["dropped"] > 0
+                    
+                    # Reads wait LOG_READ_FLUSH_TIMEOUT at most, then go on with what has landed
+                    with patch('logger.session_store.log_writer', writer), \
+                            patch.object(config, 'LOG_READ_FLUSH_TIMEOUT', 0.1):
+                        start = time.perf_counter()
+                        assert CsvSessionStore(config).count_turns("missing") is None
+                        assert time.perf_counter() - start < 1.0
+                    assert writer.get_stats()["flush_timeouts"] == 1
+                    release.set()
+                    writer.close()
+                assert writer.get_stats()["written"] == results.count(True)
+                print("✅ Full queue drops entries and bounds reads without blocking; close() flushes the rest")
+            
+            # Disabled: written synchronously in the caller
+            with patch.object(config, 'LOG_WRITE_BEHIND_ENABLED', False):
+                writer = LogWriter()
+                path = os.path.join(tmpdir, "sync.log")
+                writer.append(path, "now\n")
+                with open(path, "r", encoding="utf-8") as f:
+                    assert f.read() == "now\n"
+                print("✅ Synchronous writes when write-behind is disabled")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Log writer test failed: {str(e)}")
+        return False
+
 def test_validation_integration():
     """Test validation integration with config"""
     print("\nTesting validation integration...")
@@ -223,10 +1755,30 @@ def run_all_tests():
     
     tests = [
         test_chatbot_integration,
+        test_client_pool,
+        test_async_client_pool,
+        test_response_cache,
+        test_semantic_cache,
+        test_request_coalescing,
+        test_scenario_registry,
+        test_token_budget,
+        test_circuit_breaker,
+        test_bulkhead,
+        test_request_hedging,
+        test_request_deadline,
+        test_stub_llm_server,
         test_logger_integration,
         test_config_integration,
         test_error_propagation,
         test_session_management,
+        test_session_csv_append,
+        test_streaming_export,
+        test_sqlite_session_store,
+        test_session_manifest,
+        test_session_memory_bounds,
+        test_session_concurrency,
+        test_multiprocess_sessions,
+        test_log_writer,
         test_validation_integration
     ]
     
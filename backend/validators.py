@@ -5,6 +5,7 @@ import html
 import re
 from typing import Dict, Any, Optional
 from config import current_config
+from chatbot.scenarios import scenario_registry
 
 
 class InputValidator:
@@ -121,8 +122,8 @@ class InputValidator:
         for key in allowed_keys:
             if key in context:
                 value = context[key]
-                # Validate party_scenario value
-                if key == 'party_scenario' and isinstance(value, int) and 1 <= value <= 3:
+                # Validate party_scenario value against the registered scenarios
+                if key == 'party_scenario' and isinstance(value, int) and value in scenario_registry:
                     sanitized[key] = value
         
         return sanitized
\ No newline at end of file
@@ -208,8 +208,40 @@ export default function ChatBox() {
   };
 
 
+  // SSE 스트림 읽기: 텍스트 조각이 도착할 때마다 onDelta 호출
+  const readEventStream = async (res, onDelta) => {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let text = "";
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split("\n\n");
+      buffer = events.pop();
+      for (const rawEvent of events) {
+        let eventName = "message";
+        let dataLine = "";
+        for (const line of rawEvent.split("\n")) {
+          if (line.startsWith("event:")) eventName = line.slice(6).trim();
+          else if (line.startsWith("data:")) dataLine += line.slice(5).trim();
+        }
+        if (!dataLine) continue;
+        const payload = JSON.parse(dataLine);
+        if (eventName === "error") return `Error: ${payload.error || "Unknown error"}`;
+        if (eventName === "done") return payload.bot_response ?? text;
+        if (payload.delta) {
+          text += payload.delta;
+          onDelta?.(text);
+        }
+      }
+    }
+    return text || "Error: Empty response";
+  };
+
   // 채팅 메시지 처리 (AI 채팅)
-  const sendToFlask = async (userInput) => {
+  const sendToFlask = async (userInput, onDelta) => {
     const roleMapping = { ai: "ai", student: "student", doctor: "doctor" };
     const chatbotType = roleMapping[params.role] || "ai";
     try {
@@ -229,6 +261,7 @@ export default function ChatBox() {
               timestamp: msg.timestamp
             }))
           },
+          stream: true,
         }),
       });
       
@@ -237,6 +270,11 @@ export default function ChatBox() {
         return `Error: ${errorData.error || `HTTP ${res.status}`}`;
       }
       
+      const contentType = res.headers?.get?.("content-type") || "";
+      if (contentType.includes("text/event-stream") && res.body) {
+        return await readEventStream(res, onDelta);
+      }
+      
       const data = await res.json();
       return data.bot_response || `Error: ${data.error || "Unknown error"}`;
     } catch (err) {
@@ -260,17 +298,40 @@ export default function ChatBox() {
     setMessages((prev) => [...prev, newUserMessage]);
     setInputValue("");
     setLoading(true);
-    const assistantResponse = await sendToFlask(newUserMessage.text);
-    const newAssistantMessage = {
-      id: Date.now() + 1,
-      type: "assistant",
-      text: assistantResponse,
-      timestamp: new Date().toLocaleTimeString([], {
-        hour: "2-digit",
-        minute: "2-digit",
-      }),
-    };
-    setMessages((prev) => [...prev, newAssistantMessage]);
+    const assistantId = Date.now() + 1;
+    const assistantTimestamp = new Date().toLocaleTimeString([], {
+      hour: "2-digit",
+      minute: "2-digit",
+    });
+    // 첫 토큰이 도착하면 로딩 표시를 숨기고 메시지를 점진적으로 갱신
+    let streamStarted = false;
+    const assistantResponse = await sendToFlask(newUserMessage.text, (partialText) => {
+      if (!streamStarted) {
+        streamStarted = true;
+        setLoading(false);
+        setMessages((prev) => [
+          ...prev,
+          { id: assistantId, type: "assistant", text: partialText, timestamp: assistantTimestamp },
+        ]);
+      } else {
+        setMessages((prev) =>
+          prev.map((msg) => (msg.id === assistantId ? { ...msg, text: partialText } : msg))
+        );
+      }
+    });
+    if (streamStarted) {
+      setMessages((prev) =>
+        prev.map((msg) => (msg.id === assistantId ? { ...msg, text: assistantResponse } : msg))
+      );
+    } else {
+      const newAssistantMessage = {
+        id: assistantId,
+        type: "assistant",
+        text: assistantResponse,
+        timestamp: assistantTimestamp,
+      };
+      setMessages((prev) => [...prev, newAssistantMessage]);
+    }
     setLoading(false);
     
     // Handle scenario progression
@@ -2,10 +2,40 @@ import { NextResponse } from "next/server";
 
 export async function POST(req) {
   try {
-    const { message, chatbot_type, risk_score, conversation_context } = await req.json();
+    const { message, chatbot_type, risk_score, conversation_context, stream } = await req.json();
+    const backendUrl = process.env.BACKEND_API_URL || 'http://localhost:8000';
+
+    // 스트리밍 요청: Flask SSE 응답을 버퍼링 없이 그대로 전달
+    if (stream) {
+      const flaskRes = await fetch(`${backendUrl}/chat/stream`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "Accept": "text/event-stream" },
+        body: JSON.stringify({ message, chatbot_type, risk_score, conversation_context }),
+      });
+
+      if (!flaskRes.ok || !flaskRes.body) {
+        const data = await flaskRes.json().catch(() => ({ error: "Server error" }));
+        // 과부하(503) 시 Retry-After 헤더 전달
+        const retryAfter = flaskRes.headers?.get?.("retry-after");
+        return NextResponse.json(data, {
+          status: flaskRes.status || 500,
+          ...(retryAfter && { headers: { "Retry-After": retryAfter } }),
+        });
+      }
+
+      const headers = {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache, no-transform",
+        "X-Accel-Buffering": "no",
+      };
+      const setCookie = flaskRes.headers.get("set-cookie");
+      if (setCookie) headers["Set-Cookie"] = setCookie;
+
+      return new Response(flaskRes.body, { status: flaskRes.status, headers });
+    }
 
     // Flask 서버로 요청
-    const flaskRes = await fetch(`${process.env.BACKEND_API_URL || 'http://localhost:8000'}/`, {
+    const flaskRes = await fetch(`${backendUrl}/`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({ message, chatbot_type, risk_score, conversation_context }),
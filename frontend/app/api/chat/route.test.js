@@ -155,4 +155,37 @@ describe('/api/chat Route Handler', () => {
       })
     )
   })
-})
\ No newline at end of file
+
+  test('passes the SSE stream through when streaming is requested', async () => {
+    const backendStream = { sentinel: 'stream-body' }
+
+    global.fetch.mockResolvedValueOnce({
+      ok: true,
+      status: 200,
+      body: backendStream,
+      headers: new Headers({ 'set-cookie': 'apt_session=abc' }),
+    })
+
+    const request = {
+      json: async () => ({
+        message: 'Hello',
+        chatbot_type: 'ai',
+        stream: true,
+      })
+    }
+
+    const response = await POST(request)
+
+    expect(fetch).toHaveBeenCalledWith(
+      'http://localhost:8080/chat/stream',
+      expect.objectContaining({
+        method: 'POST',
+        body: JSON.stringify({ message: 'Hello', chatbot_type: 'ai' })
+      })
+    )
+    // The backend body is handed through without being read or buffered
+    expect(response.body).toBe(backendStream)
+    expect(response.headers.get('Content-Type')).toBe('text/event-stream')
+    expect(response.headers.get('Set-Cookie')).toBe('apt_session=abc')
+  })
+})